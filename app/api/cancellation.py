@@ -0,0 +1,41 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request
+
+from app.core.cancellation import CancelToken, request_token
+
+TIMEOUT_HEADER = 'X-Request-Timeout'
+
+
+def request_cancel_token(request: Request) -> CancelToken:
+    """A token carrying the request's deadline: ``X-Request-Timeout`` seconds, capped by the server's limit."""
+    raw = request.headers.get(TIMEOUT_HEADER)
+    if raw is None:
+        return request_token()
+    try:
+        timeout = float(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f'{TIMEOUT_HEADER} must be a number of seconds') from None
+    return request_token(timeout)
+
+
+@asynccontextmanager
+async def request_scope(request: Request) -> AsyncIterator[CancelToken]:
+    """Yield the request's token and cancel it if the client disconnects before the handler returns."""
+    token = request_cancel_token(request)
+
+    async def watch_disconnect() -> None:
+        # The body has been read by now, so the next message is the disconnect.
+        while not token.is_set():
+            message = await request.receive()
+            if message['type'] == 'http.disconnect':
+                token.cancel('client disconnected')
+                return
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        yield token
+    finally:
+        watcher.cancel()
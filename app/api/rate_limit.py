@@ -0,0 +1,63 @@
+import hashlib
+import hmac
+import math
+
+from fastapi import Depends, HTTPException, Request
+
+from app.core.config import settings
+from app.core.rate_limit import get_rate_limiter
+
+
+def client_ip(request: Request) -> str:
+    if settings.rate_limit_trust_forwarded_for:
+        forwarded = request.headers.get('X-Forwarded-For')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.client.host if request.client else 'unknown'
+
+
+def client_api_key(request: Request) -> str | None:
+    """The request's API key if it is one of ``api_keys``; an unknown key must not buy a fresh
+    identity, or sending a new one per request would escape the limits."""
+    api_key = request.headers.get(settings.rate_limit_key_header)
+    if not api_key:
+        return None
+    presented = api_key.encode('utf-8')
+    if any(hmac.compare_digest(presented, known.encode('utf-8')) for known in settings.api_keys):
+        return api_key
+    return None
+
+
+def client_identity(request: Request) -> str:
+    """The client a request is accounted to: its API key (hashed, never stored) or else its IP."""
+    api_key = client_api_key(request)
+    if api_key:
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    return 'ip:' + client_ip(request)
+
+
+def client_weight(request: Request) -> float:
+    """The client's share weight in the job scheduler (``job_tenant_weights``, by API key or IP)."""
+    weights = settings.job_tenant_weights
+    api_key = client_api_key(request)
+    if api_key and api_key in weights:
+        return weights[api_key]
+    return weights.get(client_ip(request), 1.0)
+
+
+def rate_limited(group: str):
+    """A router dependency that admits each client at the rate configured for ``group``."""
+
+    async def check(request: Request) -> None:
+        if not settings.rate_limit_enabled:
+            return
+        decision = get_rate_limiter().check(group, client_identity(request))
+        if decision is None or decision.allowed:
+            return
+        raise HTTPException(
+            status_code=429,
+            detail=f'Rate limit exceeded for {group}',
+            headers={'Retry-After': str(max(1, math.ceil(decision.retry_after)))},
+        )
+
+    return Depends(check)
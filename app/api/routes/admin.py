@@ -0,0 +1,38 @@
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel, Field
+
+from app.background.tasks import drain_coordinator
+from app.core.config import settings
+
+LOOPBACK_HOSTS = {'127.0.0.1', '::1', 'localhost'}
+
+
+def require_admin(request: Request) -> None:
+    if settings.admin_token:
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), settings.admin_token.encode('utf-8')):
+            raise HTTPException(status_code=403, detail='Invalid admin token')
+    elif request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail='Admin endpoints are loopback-only without ADMIN_TOKEN')
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+class DrainRequest(BaseModel):
+    grace_seconds: float | None = Field(default=None, ge=0)
+
+
+@router.post('/drain')
+async def admin_drain(payload: DrainRequest | None = None):
+    # Returns at once; the drain continues in the background (poll GET /admin/drain).
+    grace = payload.grace_seconds if payload and payload.grace_seconds is not None else settings.shutdown_grace_seconds
+    drain_coordinator.start(grace, reason='admin request')
+    return drain_coordinator.snapshot()
+
+
+@router.get('/drain')
+async def admin_drain_status():
+    return drain_coordinator.snapshot()
@@ -1,11 +1,26 @@
+import asyncio
 import time
 
-from fastapi import APIRouter
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel, Field
 
+from app.api.cancellation import request_cancel_token, request_scope
+from app.api.routes.admin import require_admin
+from app.api.routes.rag import (
+    MetadataFilterRequest,
+    collection_field,
+    metadata_filter_of,
+    mmr_field,
+    resolve_retriever,
+)
+from app.api.routes.stream import pipeline_stream_response
 from app.chains.state import get_orchestrator
 from app.core.config import settings
 from app.core.metrics import route_latency_registry
+from app.tools.lookup import get_lookup
+from app.tools.lookup_store import normalize_key
 
 router = APIRouter()
 
@@ -15,6 +30,14 @@ class ChainAskRequest(BaseModel):
     top_k: int = Field(default=settings.rag_default_top_k, ge=1, le=20)
     use_rag: bool = True
     use_tools: bool = True
+    filter: MetadataFilterRequest | None = None
+    collection: str = collection_field()
+    mmr_lambda: float | None = mmr_field()
+
+
+class LookupLoadRequest(BaseModel):
+    items: dict[str, str] = Field(..., min_length=1)
+    replace: bool = False
 
 
 @router.get("/status")
@@ -28,7 +51,8 @@ async def chain_status():
 
 
 @router.post("/ask-sync")
-def chain_ask_sync(payload: ChainAskRequest):
+def chain_ask_sync(payload: ChainAskRequest, request: Request):
+    resolve_retriever(payload.collection)
     started = time.perf_counter()
     orchestrator = get_orchestrator()
     result = orchestrator.run_sync(
@@ -36,6 +60,10 @@ def chain_ask_sync(payload: ChainAskRequest):
         top_k=payload.top_k,
         use_rag=payload.use_rag,
         use_tools=payload.use_tools,
+        metadata_filter=metadata_filter_of(payload.filter),
+        collection=payload.collection,
+        mmr_lambda=payload.mmr_lambda,
+        cancel_event=request_cancel_token(request),
     )
     elapsed = time.perf_counter() - started
     route_latency_registry.observe("chains.ask_sync", elapsed)
@@ -44,22 +72,89 @@ def chain_ask_sync(payload: ChainAskRequest):
 
 
 @router.post("/ask-async")
-async def chain_ask_async(payload: ChainAskRequest):
+async def chain_ask_async(payload: ChainAskRequest, request: Request):
+    resolve_retriever(payload.collection)
     started = time.perf_counter()
     orchestrator = get_orchestrator()
-    result = await orchestrator.run_async(
+    async with request_scope(request) as token:
+        result = await orchestrator.run_async(
+            prompt=payload.prompt,
+            top_k=payload.top_k,
+            use_rag=payload.use_rag,
+            use_tools=payload.use_tools,
+            metadata_filter=metadata_filter_of(payload.filter),
+            collection=payload.collection,
+            mmr_lambda=payload.mmr_lambda,
+            cancel_event=token,
+        )
+    elapsed = time.perf_counter() - started
+    route_latency_registry.observe("chains.ask_async", elapsed)
+    result["elapsed_seconds"] = round(elapsed, 3)
+    return result
+
+
+@router.post("/ask-stream")
+async def chain_ask_stream(payload: ChainAskRequest, request: Request):
+    resolve_retriever(payload.collection)
+    cancel_event = request_cancel_token(request)
+    events = get_orchestrator().run_stream(
         prompt=payload.prompt,
         top_k=payload.top_k,
         use_rag=payload.use_rag,
         use_tools=payload.use_tools,
+        metadata_filter=metadata_filter_of(payload.filter),
+        collection=payload.collection,
+        mmr_lambda=payload.mmr_lambda,
+        cancel_event=cancel_event,
     )
-    elapsed = time.perf_counter() - started
-    route_latency_registry.observe("chains.ask_async", elapsed)
-    result["elapsed_seconds"] = round(elapsed, 3)
-    return result
+    return pipeline_stream_response(events, request, cancel_event, "chains.ask_stream")
 
 
 @router.get("/tools/logs")
 async def chain_tool_logs(limit: int = 50):
     orchestrator = get_orchestrator()
     return {"logs": orchestrator.get_logs(limit=limit)}
+
+
+@router.get("/tools/lookup")
+def chain_tool_lookup(
+    key: str = Query(..., min_length=1),
+    mode: Literal["exact", "prefix", "fuzzy"] = "exact",
+    limit: int = Query(default=10, ge=1, le=100),
+):
+    started = time.perf_counter()
+    lookup = get_lookup()
+    if mode == "exact":
+        value = lookup.get(key)
+        matches = [] if value is None else [{"key": normalize_key(key), "value": value}]
+    elif mode == "prefix":
+        matches = [{"key": k, "value": v} for k, v in lookup.backend.prefix(key, limit=limit)]
+    else:
+        matches = [
+            {"key": k, "value": v, "score": score}
+            for k, v, score in lookup.backend.fuzzy(key, limit=limit, min_score=settings.lookup_fuzzy_min_score)
+        ]
+    elapsed = time.perf_counter() - started
+    route_latency_registry.observe(f"chains.lookup_{mode}", elapsed)
+    return {"mode": mode, "matches": matches, "elapsed_seconds": round(elapsed, 6)}
+
+
+@router.get("/tools/lookup/stats")
+async def chain_tool_lookup_stats():
+    return await asyncio.to_thread(get_lookup().stats)
+
+
+@router.post("/tools/lookup/load", dependencies=[Depends(require_admin)])
+def chain_tool_lookup_load(payload: LookupLoadRequest):
+    if len(payload.items) > settings.lookup_bulk_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.lookup_bulk_max_items} items per load",
+        )
+    started = time.perf_counter()
+    lookup = get_lookup()
+    loaded = lookup.backend.bulk_load(payload.items.items(), replace=payload.replace)
+    lookup.invalidate()
+    elapsed = time.perf_counter() - started
+    route_latency_registry.observe("chains.lookup_load", elapsed)
+    return {"loaded": loaded, "replace": payload.replace, "stats": lookup.stats(), "elapsed_seconds": round(elapsed, 3)}
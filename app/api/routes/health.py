@@ -1,8 +1,11 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
-from app.background.tasks import job_store, job_worker
+from app.background.tasks import drain_coordinator, job_store, job_worker
 from app.chains.state import get_orchestrator
 from app.core.config import settings
+from app.core.rate_limit import get_rate_limiter
+from app.llm.lifecycle import provider_monitor
 from app.rag.state import get_retriever
 
 router = APIRouter()
@@ -17,15 +20,28 @@ async def health_check():
         'status': 'ok',
         'service': 'llm-backend',
         'mode': 'async',
+        'ready': not drain_coordinator.draining,
+        'drain': drain_coordinator.snapshot(),
         'worker_running': job_worker.is_running,
         'queue_size': job_worker.queue_size,
         'job_stats': stats,
+        'job_scheduler': job_worker.stats(),
+        'rate_limits': {'enabled': settings.rate_limit_enabled, **get_rate_limiter().stats()},
         'rag': {
             'embedding_model': rag.embedding_model_name,
             'indexed_chunks': rag.index_size,
         },
+        'llm': provider_monitor.snapshot(),
         'chains': {
             'chain_mode': settings.chain_mode,
             'tools': chains.tool_names,
         },
     }
+
+
+@router.get('/ready')
+async def readiness_check():
+    # Fails as soon as a drain starts, so the load balancer stops routing here while in-flight work finishes.
+    if drain_coordinator.draining:
+        return JSONResponse(status_code=503, content={'ready': False, 'drain': drain_coordinator.snapshot()})
+    return {'ready': True}
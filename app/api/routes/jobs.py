@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
+from app.api.rate_limit import client_identity, client_weight
 from app.background.tasks import job_store, job_worker
+from app.background.worker import TenantQueueFull, WorkerDraining
 
 router = APIRouter()
 
@@ -11,8 +13,18 @@ class SubmitJobRequest(BaseModel):
 
 
 @router.post('/submit')
-async def submit_job(payload: SubmitJobRequest):
-    job = await job_worker.submit(prompt=payload.prompt)
+async def submit_job(payload: SubmitJobRequest, request: Request):
+    try:
+        job = await job_worker.submit(
+            prompt=payload.prompt,
+            tenant=client_identity(request),
+            weight=client_weight(request),
+        )
+    except TenantQueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={'Retry-After': '1'}) from None
+    except WorkerDraining as exc:
+        # Another instance takes it once the load balancer has stopped sending traffic here.
+        raise HTTPException(status_code=503, detail=str(exc), headers={'Retry-After': '1'}) from None
     return {'job_id': job.id, 'status': job.status}
 
 
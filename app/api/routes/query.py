@@ -1,14 +1,16 @@
 import time
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from pydantic import BaseModel, Field
 
+from app.api.cancellation import request_cancel_token, request_scope
+from app.api.routes.rag import collection_field, resolve_retriever
+from app.api.routes.stream import pipeline_stream_response
 from app.chains.state import get_orchestrator
 from app.core.config import settings
 from app.core.metrics import route_latency_registry
 from app.llm.inference import run_completion, run_completion_sync
-from app.rag.pipeline import rag_answer_async, rag_answer_sync
-from app.rag.state import get_retriever
+from app.rag.pipeline import rag_answer_async, rag_answer_stream, rag_answer_sync
 
 router = APIRouter()
 
@@ -20,6 +22,7 @@ class QueryRequest(BaseModel):
 class RagQueryRequest(BaseModel):
     prompt: str = Field(..., min_length=1)
     top_k: int = Field(default=settings.rag_default_top_k, ge=1, le=20)
+    collection: str = collection_field()
 
 
 class ChainQueryRequest(BaseModel):
@@ -27,31 +30,38 @@ class ChainQueryRequest(BaseModel):
     top_k: int = Field(default=settings.rag_default_top_k, ge=1, le=20)
     use_rag: bool = True
     use_tools: bool = True
+    collection: str = collection_field()
 
 
 @router.post('/sync')
-def query_sync(payload: QueryRequest):
+def query_sync(payload: QueryRequest, request: Request):
     started = time.perf_counter()
-    output = run_completion_sync(payload.prompt)
+    output = run_completion_sync(payload.prompt, cancel_event=request_cancel_token(request))
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('query.sync', elapsed)
     return {'mode': 'sync', 'output': output, 'elapsed_seconds': round(elapsed, 3)}
 
 
 @router.post('/async')
-async def query_async(payload: QueryRequest):
+async def query_async(payload: QueryRequest, request: Request):
     started = time.perf_counter()
-    output = await run_completion(payload.prompt)
+    async with request_scope(request) as token:
+        output = await run_completion(payload.prompt, cancel_event=token)
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('query.async', elapsed)
     return {'mode': 'async', 'output': output, 'elapsed_seconds': round(elapsed, 3)}
 
 
 @router.post('/rag-sync')
-def query_rag_sync(payload: RagQueryRequest):
+def query_rag_sync(payload: RagQueryRequest, request: Request):
     started = time.perf_counter()
-    retriever = get_retriever()
-    answer = rag_answer_sync(retriever=retriever, prompt=payload.prompt, top_k=payload.top_k)
+    retriever = resolve_retriever(payload.collection)
+    answer = rag_answer_sync(
+        retriever=retriever,
+        prompt=payload.prompt,
+        top_k=payload.top_k,
+        cancel_event=request_cancel_token(request),
+    )
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('query.rag_sync', elapsed)
     answer['mode'] = 'rag-sync'
@@ -60,10 +70,16 @@ def query_rag_sync(payload: RagQueryRequest):
 
 
 @router.post('/rag-async')
-async def query_rag_async(payload: RagQueryRequest):
+async def query_rag_async(payload: RagQueryRequest, request: Request):
     started = time.perf_counter()
-    retriever = get_retriever()
-    answer = await rag_answer_async(retriever=retriever, prompt=payload.prompt, top_k=payload.top_k)
+    retriever = resolve_retriever(payload.collection)
+    async with request_scope(request) as token:
+        answer = await rag_answer_async(
+            retriever=retriever,
+            prompt=payload.prompt,
+            top_k=payload.top_k,
+            cancel_event=token,
+        )
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('query.rag_async', elapsed)
     answer['mode'] = 'rag-async'
@@ -71,8 +87,22 @@ async def query_rag_async(payload: RagQueryRequest):
     return answer
 
 
+@router.post('/rag-stream')
+async def query_rag_stream(payload: RagQueryRequest, request: Request):
+    retriever = resolve_retriever(payload.collection)
+    cancel_event = request_cancel_token(request)
+    events = rag_answer_stream(
+        retriever=retriever,
+        prompt=payload.prompt,
+        top_k=payload.top_k,
+        cancel_event=cancel_event,
+    )
+    return pipeline_stream_response(events, request, cancel_event, 'query.rag_stream')
+
+
 @router.post('/chain-sync')
-def query_chain_sync(payload: ChainQueryRequest):
+def query_chain_sync(payload: ChainQueryRequest, request: Request):
+    resolve_retriever(payload.collection)
     started = time.perf_counter()
     orchestrator = get_orchestrator()
     answer = orchestrator.run_sync(
@@ -80,6 +110,8 @@ def query_chain_sync(payload: ChainQueryRequest):
         top_k=payload.top_k,
         use_rag=payload.use_rag,
         use_tools=payload.use_tools,
+        collection=payload.collection,
+        cancel_event=request_cancel_token(request),
     )
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('query.chain_sync', elapsed)
@@ -89,17 +121,36 @@ def query_chain_sync(payload: ChainQueryRequest):
 
 
 @router.post('/chain-async')
-async def query_chain_async(payload: ChainQueryRequest):
+async def query_chain_async(payload: ChainQueryRequest, request: Request):
+    resolve_retriever(payload.collection)
     started = time.perf_counter()
     orchestrator = get_orchestrator()
-    answer = await orchestrator.run_async(
-        prompt=payload.prompt,
-        top_k=payload.top_k,
-        use_rag=payload.use_rag,
-        use_tools=payload.use_tools,
-    )
+    async with request_scope(request) as token:
+        answer = await orchestrator.run_async(
+            prompt=payload.prompt,
+            top_k=payload.top_k,
+            use_rag=payload.use_rag,
+            use_tools=payload.use_tools,
+            collection=payload.collection,
+            cancel_event=token,
+        )
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('query.chain_async', elapsed)
     answer['mode'] = 'chain-async'
     answer['elapsed_seconds'] = round(elapsed, 3)
     return answer
+
+
+@router.post('/chain-stream')
+async def query_chain_stream(payload: ChainQueryRequest, request: Request):
+    resolve_retriever(payload.collection)
+    cancel_event = request_cancel_token(request)
+    events = get_orchestrator().run_stream(
+        prompt=payload.prompt,
+        top_k=payload.top_k,
+        use_rag=payload.use_rag,
+        use_tools=payload.use_tools,
+        collection=payload.collection,
+        cancel_event=cancel_event,
+    )
+    return pipeline_stream_response(events, request, cancel_event, 'query.chain_stream')
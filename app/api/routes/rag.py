@@ -1,30 +1,119 @@
+import asyncio
+import json
 import time
+from dataclasses import asdict
+from typing import Literal
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
+from app.api.cancellation import request_cancel_token, request_scope
+from app.api.routes.admin import require_admin
+from app.api.routes.stream import SSE_HEADERS, pipeline_stream_response
+from app.background.eval_jobs import EvalJobRecord, EvalRunner
+from app.background.tasks import eval_jobs
 from app.core.config import settings
 from app.core.metrics import route_latency_registry
-from app.rag.evaluation import RetrievalEvalCase, evaluate_retrieval
-from app.rag.ingestion import build_chunks
-from app.rag.pipeline import rag_answer_async, rag_answer_sync
-from app.rag.state import get_retriever, index_documents
+from app.rag.evaluation import (
+    ProgressCallback,
+    RetrievalEvalCase,
+    benchmark_chunking,
+    compare_retrieval,
+    evaluate_retrieval,
+)
+from app.rag.collection_manager import COLLECTION_NAME_PATTERN, CollectionConfig, UnknownCollectionError
+from app.rag.filters import MetadataFilter, RangeCondition
+from app.rag.ingestion import iter_chunks
+from app.rag.pipeline import rag_answer_async, rag_answer_stream, rag_answer_sync
+from app.rag.retriever import RagRetriever
+from app.rag.state import build_scratch_retriever, get_collections, get_retriever, get_watcher, index_documents
 
 router = APIRouter()
 
 
+def collection_field():
+    return Field(default=settings.rag_default_collection, pattern=COLLECTION_NAME_PATTERN.pattern)
+
+
+def mmr_field():
+    # Set to re-rank with Maximal Marginal Relevance: 1.0 = pure relevance, lower = more diverse.
+    return Field(default=None, ge=0.0, le=1.0)
+
+
+def resolve_retriever(collection: str) -> RagRetriever:
+    try:
+        return get_retriever(collection)
+    except UnknownCollectionError:
+        raise HTTPException(status_code=404, detail=f'Unknown collection: {collection}') from None
+
+
 class IndexRequest(BaseModel):
     rebuild: bool = True
+    collection: str = collection_field()
+
+
+class CollectionRequest(BaseModel):
+    data_dir: str = Field(..., min_length=1)
+    # Defaults to <rag_collections_dir>/<name>/vector_store.json.
+    vector_store_path: str | None = None
+    chunk_size: int | None = Field(default=None, ge=50)
+    chunk_overlap: int | None = Field(default=None, ge=0)
+    chunking: Literal['fixed', 'content', 'structured'] | None = None
+    embedding_dimension: int | None = Field(default=None, ge=8, le=8192)
+    quantization: Literal['none', 'int8', 'pq'] | None = None
+
+
+class RangeFilterRequest(BaseModel):
+    gte: float | None = None
+    gt: float | None = None
+    lte: float | None = None
+    lt: float | None = None
+
+
+class MetadataFilterRequest(BaseModel):
+    # A path prefix such as "app/rag/", or a glob such as "*.md" when it contains *, ? or [.
+    source_path: str | None = None
+    equals: dict[str, str | int | float | bool] = Field(default_factory=dict)
+    ranges: dict[str, RangeFilterRequest] = Field(default_factory=dict)
+
+    def to_filter(self) -> MetadataFilter:
+        return MetadataFilter(
+            source_path=self.source_path,
+            equals=dict(self.equals),
+            ranges={name: RangeCondition(**condition.model_dump()) for name, condition in self.ranges.items()},
+        )
+
+
+def metadata_filter_of(request: MetadataFilterRequest | None) -> MetadataFilter | None:
+    return request.to_filter() if request is not None else None
 
 
 class SearchRequest(BaseModel):
     query: str = Field(..., min_length=1)
     top_k: int = Field(default=settings.rag_default_top_k, ge=1, le=20)
+    filter: MetadataFilterRequest | None = None
+    collection: str = collection_field()
+    mmr_lambda: float | None = mmr_field()
 
 
 class AskRequest(BaseModel):
     prompt: str = Field(..., min_length=1)
     top_k: int = Field(default=settings.rag_default_top_k, ge=1, le=20)
+    filter: MetadataFilterRequest | None = None
+    collection: str = collection_field()
+    mmr_lambda: float | None = mmr_field()
+
+
+class DeleteRequest(BaseModel):
+    record_ids: list[str] = Field(default_factory=list)
+    # Deletes every record matching the filter, e.g. {"equals": {"source_path": "docs/old.md"}}.
+    filter: MetadataFilterRequest | None = None
+    collection: str = collection_field()
+
+
+class CompactRequest(BaseModel):
+    collection: str = collection_field()
 
 
 class EvalCaseRequest(BaseModel):
@@ -32,28 +121,55 @@ class EvalCaseRequest(BaseModel):
     expected_terms: list[str] = Field(default_factory=list)
 
 
+class ChunkingBenchmarkRequest(BaseModel):
+    top_k: int = Field(default=settings.rag_default_top_k, ge=1, le=20)
+    cases: list[EvalCaseRequest]
+    strategies: list[Literal['fixed', 'content', 'structured']] = Field(
+        default_factory=lambda: ['fixed', 'content', 'structured'],
+        min_length=1,
+    )
+    chunk_size: int | None = Field(default=None, ge=50)
+    chunk_overlap: int | None = Field(default=None, ge=0)
+    collection: str = collection_field()
+
+
+class IndexConfigRequest(BaseModel):
+    chunk_size: int | None = Field(default=None, ge=50)
+    chunk_overlap: int | None = Field(default=None, ge=0)
+    embedding_dimension: int | None = Field(default=None, ge=8, le=8192)
+    quantization: Literal['none', 'int8', 'pq'] | None = None
+
+
 class EvalRequest(BaseModel):
     top_k: int = Field(default=settings.rag_default_top_k, ge=1, le=20)
     cases: list[EvalCaseRequest]
+    # When set, the live index is compared against a scratch index built with this config.
+    compare_with: IndexConfigRequest | None = None
+    collection: str = collection_field()
 
 
 @router.get('/status')
-async def rag_status():
-    retriever = get_retriever()
+async def rag_status(collection: str = settings.rag_default_collection):
+    retriever = resolve_retriever(collection)
     return {
+        'collection': collection,
         'embedding_model': retriever.embedding_model_name,
         'indexed_chunks': retriever.index_size,
+        'embedding_cache': retriever.embedding_cache_stats,
+        'vector_store': retriever.vector_store_stats,
     }
 
 
 @router.post('/index')
 async def rag_index(payload: IndexRequest):
+    resolve_retriever(payload.collection)
     started = time.perf_counter()
-    stats = index_documents(rebuild=payload.rebuild)
+    stats = index_documents(rebuild=payload.rebuild, collection=payload.collection)
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('rag.index', elapsed)
 
     return {
+        'collection': payload.collection,
         'indexed_chunks': stats.indexed_chunks,
         'embedding_model': stats.embedding_model,
         'embedding_dimension': stats.embedding_dimension,
@@ -64,8 +180,13 @@ async def rag_index(payload: IndexRequest):
 @router.post('/search')
 async def rag_search(payload: SearchRequest):
     started = time.perf_counter()
-    retriever = get_retriever()
-    results = retriever.retrieve(payload.query, top_k=payload.top_k)
+    retriever = resolve_retriever(payload.collection)
+    results = retriever.retrieve(
+        payload.query,
+        top_k=payload.top_k,
+        metadata_filter=metadata_filter_of(payload.filter),
+        mmr_lambda=payload.mmr_lambda,
+    )
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('rag.search', elapsed)
 
@@ -74,7 +195,9 @@ async def rag_search(payload: SearchRequest):
         'top_k': payload.top_k,
         'results': [
             {
+                'record_id': item.record_id,
                 'score': round(item.score, 4),
+                'fused_score': round(item.fused_score, 4) if item.fused_score is not None else None,
                 'source_path': item.metadata.get('source_path'),
                 'chunk_index': item.metadata.get('chunk_index'),
                 'text': item.text,
@@ -85,11 +208,53 @@ async def rag_search(payload: SearchRequest):
     }
 
 
+@router.post('/records/delete', dependencies=[Depends(require_admin)])
+async def rag_delete_records(payload: DeleteRequest):
+    metadata_filter = metadata_filter_of(payload.filter)
+    if not payload.record_ids and (metadata_filter is None or metadata_filter.is_empty):
+        raise HTTPException(status_code=400, detail='Provide record_ids and/or a non-empty filter')
+
+    retriever = resolve_retriever(payload.collection)
+    started = time.perf_counter()
+    deleted: list[str] = []
+    if payload.record_ids:
+        deleted.extend(await asyncio.to_thread(retriever.delete_records, payload.record_ids))
+    if metadata_filter is not None and not metadata_filter.is_empty:
+        deleted.extend(await asyncio.to_thread(retriever.delete_where, metadata_filter))
+    elapsed = time.perf_counter() - started
+    route_latency_registry.observe('rag.delete', elapsed)
+
+    return {
+        'collection': payload.collection,
+        'deleted': len(deleted),
+        'record_ids': deleted,
+        'indexed_chunks': retriever.index_size,
+        'elapsed_seconds': round(elapsed, 4),
+    }
+
+
+@router.post('/compact', dependencies=[Depends(require_admin)])
+async def rag_compact(payload: CompactRequest):
+    retriever = resolve_retriever(payload.collection)
+    started = time.perf_counter()
+    stats = await asyncio.to_thread(retriever.compact)
+    elapsed = time.perf_counter() - started
+    route_latency_registry.observe('rag.compact', elapsed)
+    return {'collection': payload.collection, **stats, 'elapsed_seconds': round(elapsed, 3)}
+
+
 @router.post('/ask-sync')
-def rag_ask_sync(payload: AskRequest):
+def rag_ask_sync(payload: AskRequest, request: Request):
     started = time.perf_counter()
-    retriever = get_retriever()
-    answer = rag_answer_sync(retriever=retriever, prompt=payload.prompt, top_k=payload.top_k)
+    retriever = resolve_retriever(payload.collection)
+    answer = rag_answer_sync(
+        retriever=retriever,
+        prompt=payload.prompt,
+        top_k=payload.top_k,
+        metadata_filter=metadata_filter_of(payload.filter),
+        mmr_lambda=payload.mmr_lambda,
+        cancel_event=request_cancel_token(request),
+    )
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('rag.ask_sync', elapsed)
     answer['elapsed_seconds'] = round(elapsed, 3)
@@ -97,30 +262,226 @@ def rag_ask_sync(payload: AskRequest):
 
 
 @router.post('/ask-async')
-async def rag_ask_async(payload: AskRequest):
+async def rag_ask_async(payload: AskRequest, request: Request):
     started = time.perf_counter()
-    retriever = get_retriever()
-    answer = await rag_answer_async(retriever=retriever, prompt=payload.prompt, top_k=payload.top_k)
+    retriever = resolve_retriever(payload.collection)
+    async with request_scope(request) as token:
+        answer = await rag_answer_async(
+            retriever=retriever,
+            prompt=payload.prompt,
+            top_k=payload.top_k,
+            metadata_filter=metadata_filter_of(payload.filter),
+            mmr_lambda=payload.mmr_lambda,
+            cancel_event=token,
+        )
     elapsed = time.perf_counter() - started
     route_latency_registry.observe('rag.ask_async', elapsed)
     answer['elapsed_seconds'] = round(elapsed, 3)
     return answer
 
 
+@router.post('/ask-stream')
+async def rag_ask_stream(payload: AskRequest, request: Request):
+    retriever = resolve_retriever(payload.collection)
+    cancel_event = request_cancel_token(request)
+    events = rag_answer_stream(
+        retriever=retriever,
+        prompt=payload.prompt,
+        top_k=payload.top_k,
+        metadata_filter=metadata_filter_of(payload.filter),
+        mmr_lambda=payload.mmr_lambda,
+        cancel_event=cancel_event,
+    )
+    return pipeline_stream_response(events, request, cancel_event, 'rag.ask_stream')
+
+
+def _eval_runner(payload: EvalRequest) -> EvalRunner:
+    retriever = resolve_retriever(payload.collection)
+    cases = [RetrievalEvalCase(query=item.query, expected_terms=item.expected_terms) for item in payload.cases]
+    config = payload.compare_with
+
+    def run(progress: ProgressCallback | None) -> dict:
+        if config is None:
+            report = evaluate_retrieval(retriever=retriever, cases=cases, top_k=payload.top_k, progress=progress)
+        else:
+            candidate = build_scratch_retriever(
+                chunk_size=config.chunk_size,
+                overlap=config.chunk_overlap,
+                embedding_dimension=config.embedding_dimension,
+                quantization=config.quantization,
+                collection=payload.collection,
+            )
+            report = compare_retrieval(
+                baseline=retriever,
+                candidate=candidate,
+                cases=cases,
+                top_k=payload.top_k,
+                progress=progress,
+            )
+            report['candidate_config'] = config.model_dump()
+        report['top_k'] = payload.top_k
+        report['collection'] = payload.collection
+        report['indexed_chunks'] = retriever.index_size
+        return report
+
+    return run
+
+
+def _eval_job_payload(job: EvalJobRecord) -> dict:
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'completed_cases': job.completed_cases,
+        'total_cases': job.total_cases,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'completed_at': job.completed_at,
+        'report': job.report,
+        'error': job.error,
+    }
+
+
 @router.post('/analyze')
 async def rag_analyze(payload: EvalRequest):
-    retriever = get_retriever()
-    cases = [RetrievalEvalCase(query=item.query, expected_terms=item.expected_terms) for item in payload.cases]
-    report = evaluate_retrieval(retriever=retriever, cases=cases, top_k=payload.top_k)
-    report['top_k'] = payload.top_k
-    report['indexed_chunks'] = retriever.index_size
+    if len(payload.cases) > settings.rag_eval_max_sync_cases:
+        raise HTTPException(
+            status_code=413,
+            detail=f'More than {settings.rag_eval_max_sync_cases} cases; submit them via /rag/analyze/jobs',
+        )
+
+    started = time.perf_counter()
+    report = await asyncio.to_thread(_eval_runner(payload), None)
+    elapsed = time.perf_counter() - started
+    route_latency_registry.observe('rag.analyze', elapsed)
+    report['elapsed_seconds'] = round(elapsed, 3)
     return report
 
 
+@router.post('/analyze/chunking')
+async def rag_analyze_chunking(payload: ChunkingBenchmarkRequest):
+    if len(payload.cases) > settings.rag_eval_max_sync_cases:
+        raise HTTPException(
+            status_code=413,
+            detail=f'More than {settings.rag_eval_max_sync_cases} cases; use a smaller benchmark suite',
+        )
+
+    resolve_retriever(payload.collection)
+    cases = [RetrievalEvalCase(query=item.query, expected_terms=item.expected_terms) for item in payload.cases]
+    started = time.perf_counter()
+    report = await asyncio.to_thread(
+        benchmark_chunking,
+        cases,
+        payload.top_k,
+        list(dict.fromkeys(payload.strategies)),
+        payload.chunk_size,
+        payload.chunk_overlap,
+        payload.collection,
+    )
+    elapsed = time.perf_counter() - started
+    route_latency_registry.observe('rag.analyze_chunking', elapsed)
+    return {
+        'collection': payload.collection,
+        'top_k': payload.top_k,
+        'cases': len(cases),
+        'strategies': report,
+        'elapsed_seconds': round(elapsed, 3),
+    }
+
+
+@router.post('/analyze/jobs')
+async def rag_analyze_submit(payload: EvalRequest):
+    total = len(payload.cases) * (2 if payload.compare_with else 1)
+    job = await eval_jobs.submit(_eval_runner(payload), total_cases=total)
+    return {'job_id': job.id, 'status': job.status, 'total_cases': job.total_cases}
+
+
+@router.get('/analyze/jobs/{job_id}')
+async def rag_analyze_status(job_id: str):
+    job = eval_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail='Evaluation job not found')
+    return _eval_job_payload(job)
+
+
+@router.get('/analyze/jobs/{job_id}/stream')
+async def rag_analyze_stream(job_id: str, request: Request):
+    if not eval_jobs.get(job_id):
+        raise HTTPException(status_code=404, detail='Evaluation job not found')
+
+    async def event_generator():
+        async for job in eval_jobs.watch(job_id):
+            if await request.is_disconnected():
+                break
+            if not job.finished:
+                progress = {'completed_cases': job.completed_cases, 'total_cases': job.total_cases}
+                yield f'event: progress\ndata: {json.dumps(progress)}\n\n'
+                continue
+
+            yield f'event: result\ndata: {json.dumps(_eval_job_payload(job))}\n\n'
+            yield 'event: done\ndata: [DONE]\n\n'
+
+    return StreamingResponse(event_generator(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
 @router.get('/sources')
-async def rag_sources_preview():
-    chunks = build_chunks()
+async def rag_sources_preview(collection: str = settings.rag_default_collection):
+    try:
+        config = get_collections().config(collection)
+    except UnknownCollectionError:
+        raise HTTPException(status_code=404, detail=f'Unknown collection: {collection}') from None
+
+    files: set[str] = set()
+    chunk_count = 0
+    for chunk in iter_chunks(
+        data_dir=config.data_dir,
+        chunk_size=config.chunk_size,
+        overlap=config.chunk_overlap,
+        strategy=config.chunking,
+    ):
+        files.add(chunk.metadata.get('source_path'))
+        chunk_count += 1
     return {
-        'files_detected': len({chunk.metadata.get('source_path') for chunk in chunks}),
-        'chunks_if_indexed': len(chunks),
+        'files_detected': len(files),
+        'chunks_if_indexed': chunk_count,
     }
+
+
+@router.get('/watcher')
+async def rag_watcher():
+    return {'enabled': settings.rag_watch_enabled, **get_watcher().stats()}
+
+
+@router.get('/collections')
+async def rag_collections():
+    return get_collections().stats()
+
+
+@router.put('/collections/{name}', dependencies=[Depends(require_admin)])
+async def rag_collection_put(name: str, payload: CollectionRequest):
+    manager = get_collections()
+    config = CollectionConfig(
+        name=name,
+        data_dir=payload.data_dir,
+        vector_store_path=payload.vector_store_path or manager.default_store_path(name),
+        chunk_size=payload.chunk_size,
+        chunk_overlap=payload.chunk_overlap,
+        chunking=payload.chunking,
+        embedding_dimension=payload.embedding_dimension,
+        quantization=payload.quantization,
+    )
+    try:
+        manager.register(config)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from None
+    return {'collection': name, 'config': asdict(config)}
+
+
+@router.delete('/collections/{name}', dependencies=[Depends(require_admin)])
+async def rag_collection_delete(name: str, delete_files: bool = False):
+    try:
+        get_collections().remove(name, delete_files=delete_files)
+    except UnknownCollectionError:
+        raise HTTPException(status_code=404, detail=f'Unknown collection: {name}') from None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from None
+    return {'collection': name, 'removed': True, 'files_deleted': delete_files}
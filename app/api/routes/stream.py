@@ -1,46 +1,114 @@
-import threading
+import json
+from typing import AsyncIterator
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 
-from app.core.metrics import StreamMetrics
+from app.api.cancellation import request_cancel_token
+from app.background.tasks import drain_coordinator
+from app.core.cancellation import CancelToken, RequestCancelled
+from app.core.metrics import StreamMetrics, route_latency_registry
 from app.llm.streaming import stream_completion
 
 router = APIRouter()
 
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def sse_event(event: str, data) -> str:
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def ensure_accepting_streams() -> None:
+    if drain_coordinator.draining:
+        raise HTTPException(status_code=503, detail='Server is draining', headers={'Retry-After': '1'})
+
+
+def pipeline_stream_response(
+    events: AsyncIterator[tuple[str, object]],
+    request: Request,
+    cancel_event: CancelToken,
+    route: str,
+) -> StreamingResponse:
+    """Serve ``(kind, payload)`` pipeline events as SSE.
+
+    Early events (``sources``, ``tool``) are forwarded as they arrive; answer tokens become
+    ``token`` events carrying ``{"text": ...}``. Time to first token and total time are sent as
+    ``metrics`` events and recorded as ``<route>.ttft`` and ``<route>`` latencies. A pipeline
+    stopped by its deadline, or cut at the end of a drain, ends with an ``error`` event naming the
+    stage it was in.
+    """
+    ensure_accepting_streams()
+    metrics = StreamMetrics()
+
+    async def event_generator():
+        with drain_coordinator.track_stream(cancel_event):
+            try:
+                async for kind, payload in events:
+                    if await request.is_disconnected():
+                        cancel_event.set()
+                        break
+
+                    if kind != 'token':
+                        yield sse_event(kind, payload)
+                        continue
+
+                    if metrics.first_token_at is None:
+                        metrics.mark_first_token()
+                        ttft = metrics.ttft_seconds or 0.0
+                        route_latency_registry.observe(f'{route}.ttft', ttft)
+                        yield sse_event('metrics', {'ttft_seconds': round(ttft, 3)})
+
+                    yield sse_event('token', {'text': payload})
+
+                if not await request.is_disconnected():
+                    total = metrics.total_seconds
+                    route_latency_registry.observe(route, total)
+                    yield sse_event('metrics', {'total_seconds': round(total, 3)})
+                    yield 'event: done\ndata: [DONE]\n\n'
+            except RequestCancelled as exc:
+                if not await request.is_disconnected():
+                    yield sse_event('error', {'detail': exc.reason, 'stage': exc.stage})
+            finally:
+                cancel_event.set()
+                await events.aclose()
+
+    return StreamingResponse(event_generator(), media_type='text/event-stream', headers=SSE_HEADERS)
+
 
 @router.get('/stream')
 async def stream(prompt: str, request: Request):
+    ensure_accepting_streams()
     metrics = StreamMetrics()
-    cancel_event = threading.Event()
+    cancel_event = request_cancel_token(request)
 
     async def event_generator():
-        try:
-            async for token in stream_completion(prompt, cancel_event=cancel_event):
-                if await request.is_disconnected():
-                    cancel_event.set()
-                    break
-
-                if metrics.first_token_at is None:
-                    metrics.mark_first_token()
-                    ttft = metrics.ttft_seconds or 0.0
-                    yield f'event: metrics\ndata: {{"ttft_seconds": {ttft:.3f}}}\n\n'
-
-                yield f'data: {token}\n\n'
-
-            if not await request.is_disconnected():
-                total = metrics.total_seconds
-                yield f'event: metrics\ndata: {{"total_seconds": {total:.3f}}}\n\n'
-                yield 'event: done\ndata: [DONE]\n\n'
-        finally:
-            cancel_event.set()
-
-    return StreamingResponse(
-        event_generator(),
-        media_type='text/event-stream',
-        headers={
-            'Cache-Control': 'no-cache',
-            'Connection': 'keep-alive',
-            'X-Accel-Buffering': 'no',
-        },
-    )
+        with drain_coordinator.track_stream(cancel_event):
+            try:
+                async for token in stream_completion(prompt, cancel_event=cancel_event):
+                    if await request.is_disconnected():
+                        cancel_event.set()
+                        break
+
+                    if metrics.first_token_at is None:
+                        metrics.mark_first_token()
+                        ttft = metrics.ttft_seconds or 0.0
+                        yield f'event: metrics\ndata: {{"ttft_seconds": {ttft:.3f}}}\n\n'
+
+                    yield f'data: {token}\n\n'
+
+                if not await request.is_disconnected():
+                    total = metrics.total_seconds
+                    yield f'event: metrics\ndata: {{"total_seconds": {total:.3f}}}\n\n'
+                    yield 'event: done\ndata: [DONE]\n\n'
+            except RequestCancelled as exc:
+                if not await request.is_disconnected():
+                    yield sse_event('error', {'detail': exc.reason, 'stage': exc.stage})
+            finally:
+                cancel_event.set()
+
+    return StreamingResponse(event_generator(), media_type='text/event-stream', headers=SSE_HEADERS)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from app.background.job_spool import JobSpool
+from app.background.worker import InMemoryJobWorker
+from app.core.cancellation import CancelToken
+
+logger = logging.getLogger(__name__)
+
+# How long streams cut at the end of the grace period get to send their final event.
+_STREAM_CLOSE_SECONDS = 1.0
+
+
+class DrainCoordinator:
+    """Takes the instance out of service without dropping work.
+
+    Once draining (from the lifespan shutdown or ``POST /admin/drain``), readiness fails, new jobs
+    and streams are refused, and in-flight jobs and streams get the grace period to finish. Jobs
+    that do not are handed off through the spool; streams still open are cancelled, so clients get
+    a final ``error`` event instead of a cut connection.
+    """
+
+    def __init__(self, worker: InMemoryJobWorker, spool: JobSpool | None = None) -> None:
+        self._worker = worker
+        self._spool = spool
+        self._streams: set[CancelToken] = set()
+        self._streams_idle = asyncio.Event()
+        self._streams_idle.set()
+        self._task: asyncio.Task[dict] | None = None
+        self._reason: str | None = None
+        self._grace_seconds: float | None = None
+        self._started_at: float | None = None
+        self._finished_at: float | None = None
+        self._result: dict | None = None
+
+    @property
+    def draining(self) -> bool:
+        return self._task is not None
+
+    @contextmanager
+    def track_stream(self, token: CancelToken) -> Iterator[None]:
+        self._streams.add(token)
+        self._streams_idle.clear()
+        try:
+            yield
+        finally:
+            self._streams.discard(token)
+            if not self._streams:
+                self._streams_idle.set()
+
+    def start(self, grace_seconds: float, reason: str) -> asyncio.Task[dict]:
+        """Begin draining; later calls return the drain already under way."""
+        if self._task is None:
+            logger.info('Draining (%s) with a %.1fs grace period', reason, grace_seconds)
+            self._reason = reason
+            self._grace_seconds = grace_seconds
+            self._started_at = time.time()
+            self._task = asyncio.create_task(self._drain(grace_seconds))
+        return self._task
+
+    async def drain(self, grace_seconds: float, reason: str) -> dict:
+        return await asyncio.shield(self.start(grace_seconds, reason))
+
+    async def _drain(self, grace_seconds: float) -> dict:
+        streams = asyncio.create_task(self._wait_for_streams(grace_seconds))
+        jobs = await self._worker.drain(grace_seconds, self._spool)
+        streams_cut = await streams
+        self._result = {'jobs': jobs, 'streams_cut': streams_cut}
+        self._finished_at = time.time()
+        logger.info('Drained: %s', self._result)
+        return self._result
+
+    async def _wait_for_streams(self, grace_seconds: float) -> int:
+        try:
+            await asyncio.wait_for(self._streams_idle.wait(), grace_seconds)
+            return 0
+        except asyncio.TimeoutError:
+            pass
+        remaining = list(self._streams)
+        for token in remaining:
+            token.cancel('server is shutting down')
+        try:
+            await asyncio.wait_for(self._streams_idle.wait(), _STREAM_CLOSE_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning('%d streams still open after the drain', len(self._streams))
+        return len(remaining)
+
+    def snapshot(self) -> dict:
+        if self._task is None:
+            state = 'serving'
+        else:
+            state = 'drained' if self._task.done() else 'draining'
+        return {
+            'state': state,
+            'reason': self._reason,
+            'grace_seconds': self._grace_seconds,
+            'started_at': self._started_at,
+            'finished_at': self._finished_at,
+            'open_streams': len(self._streams),
+            'result': self._result,
+        }
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Callable
+
+from app.background.worker import JobStatus
+
+ProgressCallback = Callable[[int, int], None]
+EvalRunner = Callable[[ProgressCallback], dict]
+
+
+@dataclass
+class EvalJobRecord:
+    id: str
+    status: JobStatus
+    total_cases: int
+    completed_cases: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    completed_at: float | None = None
+    report: dict | None = None
+    error: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+
+class EvalJobManager:
+    """Runs retrieval evaluations off the event loop and broadcasts their progress."""
+
+    def __init__(self, max_jobs: int = 100) -> None:
+        self._jobs: dict[str, EvalJobRecord] = {}
+        self._changed: dict[str, asyncio.Event] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._max_jobs = max(1, max_jobs)
+
+    async def submit(self, run: EvalRunner, total_cases: int) -> EvalJobRecord:
+        job = EvalJobRecord(id=str(uuid.uuid4()), status='queued', total_cases=total_cases)
+        self._evict_finished()
+        self._jobs[job.id] = job
+        self._changed[job.id] = asyncio.Event()
+
+        task = asyncio.create_task(self._run(job, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> EvalJobRecord | None:
+        return self._jobs.get(job_id)
+
+    async def watch(self, job_id: str) -> AsyncGenerator[EvalJobRecord, None]:
+        """Yield the job on every progress change until it finishes."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+
+        while True:
+            event = self._changed.get(job_id)
+            yield job
+            if event is None or job.finished:
+                return
+            await event.wait()
+
+    async def _run(self, job: EvalJobRecord, run: EvalRunner) -> None:
+        loop = asyncio.get_running_loop()
+
+        def progress(done: int, total: int) -> None:
+            loop.call_soon_threadsafe(self._update, job, done, total)
+
+        job.status = 'running'
+        job.started_at = time.time()
+        self._notify(job.id)
+        try:
+            job.report = await asyncio.to_thread(run, progress)
+            job.status = 'completed'
+        except Exception as exc:
+            job.error = str(exc)
+            job.status = 'failed'
+        job.completed_at = time.time()
+        self._notify(job.id)
+
+    def _update(self, job: EvalJobRecord, done: int, total: int) -> None:
+        job.completed_cases = done
+        job.total_cases = total
+        self._notify(job.id)
+
+    def _notify(self, job_id: str) -> None:
+        # Swap in a fresh event so every current watcher wakes exactly once.
+        event = self._changed.get(job_id)
+        if event is not None:
+            self._changed[job_id] = asyncio.Event()
+            event.set()
+
+    def _evict_finished(self) -> None:
+        if len(self._jobs) < self._max_jobs:
+            return
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.created_at)
+        for job in finished[: len(self._jobs) - self._max_jobs + 1]:
+            self._jobs.pop(job.id, None)
+            self._changed.pop(job.id, None)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class JobSpool:
+    """Unfinished jobs handed from a draining instance to the next one, as JSON lines.
+
+    Writers append, so instances sharing the path (e.g. on a volume) never overwrite each other's
+    jobs; a reader claims the whole file by renaming it first, so each job is picked up once.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def write(self, entries: list[dict]) -> None:
+        if not entries:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open('a', encoding='utf-8') as handle:
+            handle.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def claim(self) -> list[dict]:
+        claimed = self.path.with_name(f'{self.path.name}.{uuid.uuid4().hex}.claimed')
+        try:
+            os.replace(self.path, claimed)
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        with claimed.open(encoding='utf-8') as handle:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A writer killed mid-line loses that job only.
+                    logger.warning('Skipping malformed job spool line %d in %s', line_number, self.path)
+        claimed.unlink()
+        return entries
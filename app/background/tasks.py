@@ -1,5 +1,15 @@
+from app.background.drain import DrainCoordinator
+from app.background.eval_jobs import EvalJobManager
+from app.background.job_spool import JobSpool
 from app.background.worker import InMemoryJobStore, InMemoryJobWorker
 from app.core.config import settings
 
 job_store = InMemoryJobStore()
-job_worker = InMemoryJobWorker(store=job_store, concurrency=settings.worker_concurrency)
+job_worker = InMemoryJobWorker(
+    store=job_store,
+    concurrency=settings.worker_concurrency,
+    max_queued_per_tenant=settings.job_max_queued_per_tenant,
+)
+job_spool = JobSpool(settings.job_spool_path) if settings.job_spool_path else None
+drain_coordinator = DrainCoordinator(job_worker, job_spool)
+eval_jobs = EvalJobManager()
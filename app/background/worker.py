@@ -1,21 +1,27 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
+import math
 import time
 import uuid
 from dataclasses import dataclass, field
 from typing import Literal
 
+from app.background.job_spool import JobSpool
 from app.llm.inference import run_completion
 
 JobStatus = Literal['queued', 'running', 'completed', 'failed']
 
+_SHUTDOWN = '__shutdown__'
+
 
 @dataclass
 class JobRecord:
     id: str
     prompt: str
     status: JobStatus
+    tenant: str = 'default'
     created_at: float = field(default_factory=time.time)
     started_at: float | None = None
     completed_at: float | None = None
@@ -28,12 +34,16 @@ class InMemoryJobStore:
         self._jobs: dict[str, JobRecord] = {}
         self._lock = asyncio.Lock()
 
-    async def create(self, prompt: str) -> JobRecord:
-        job = JobRecord(id=str(uuid.uuid4()), prompt=prompt, status='queued')
+    async def create(self, prompt: str, tenant: str = 'default') -> JobRecord:
+        job = JobRecord(id=str(uuid.uuid4()), prompt=prompt, status='queued', tenant=tenant)
         async with self._lock:
             self._jobs[job.id] = job
         return job
 
+    async def restore(self, job: JobRecord) -> None:
+        async with self._lock:
+            self._jobs[job.id] = job
+
     async def get(self, job_id: str) -> JobRecord | None:
         async with self._lock:
             return self._jobs.get(job_id)
@@ -44,6 +54,12 @@ class InMemoryJobStore:
             job.status = 'running'
             job.started_at = time.time()
 
+    async def set_queued(self, job_id: str) -> None:
+        async with self._lock:
+            job = self._jobs[job_id]
+            job.status = 'queued'
+            job.started_at = None
+
     async def set_completed(self, job_id: str, result: str) -> None:
         async with self._lock:
             job = self._jobs[job_id]
@@ -66,13 +82,51 @@ class InMemoryJobStore:
             return counts
 
 
+class WorkerDraining(Exception):
+    """``submit`` was called after the worker stopped taking jobs."""
+
+
+class TenantQueueFull(Exception):
+    def __init__(self, tenant: str, limit: int) -> None:
+        super().__init__(f'{tenant} already has {limit} queued jobs')
+        self.tenant = tenant
+        self.limit = limit
+
+
+@dataclass
+class _Tenant:
+    weight: float
+    last_finish: float = 0.0
+    queued: int = 0
+    running: int = 0
+
+
 class InMemoryJobWorker:
-    def __init__(self, store: InMemoryJobStore, concurrency: int = 4) -> None:
+    """Runs jobs on ``concurrency`` workers, dispatching them by weighted fair queuing.
+
+    Each job gets a virtual finish tag ``max(virtual time, tenant's last tag) + 1 / weight``
+    (self-clocked fair queuing) and workers always take the smallest tag. A client that floods
+    the queue only pushes its own tags further out, so every tenant with work waiting gets a share
+    of the freed worker slots proportional to its weight, and an idle tenant's next job starts
+    promptly. ``max_queued_per_tenant`` bounds how much one tenant can have waiting.
+
+    ``drain`` stops it without losing work: jobs it will not run are handed to a ``JobSpool``
+    that the next instance ``restore``s from.
+    """
+
+    def __init__(self, store: InMemoryJobStore, concurrency: int = 4, max_queued_per_tenant: int = 0) -> None:
         self._store = store
         self._concurrency = max(1, concurrency)
-        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._max_queued_per_tenant = max_queued_per_tenant
+        self._heap: list[tuple[float, int, str, str]] = []  # (finish tag, seq, tenant, job id)
+        self._available = asyncio.Semaphore(0)
+        self._seq = 0
+        self._virtual_time = 0.0
+        self._tenants: dict[str, _Tenant] = {}
         self._workers: list[asyncio.Task[None]] = []
+        self._interrupted: list[str] = []
         self._running = False
+        self._accepting = True
 
     @property
     def is_running(self) -> bool:
@@ -80,12 +134,13 @@ class InMemoryJobWorker:
 
     @property
     def queue_size(self) -> int:
-        return self._queue.qsize()
+        return sum(tenant.queued for tenant in self._tenants.values())
 
     async def start(self) -> None:
         if self._running:
             return
         self._running = True
+        self._accepting = True
         for _ in range(self._concurrency):
             self._workers.append(asyncio.create_task(self._worker_loop()))
 
@@ -93,29 +148,151 @@ class InMemoryJobWorker:
         if not self._running:
             return
         self._running = False
+        # Shutdown markers sort after every queued job, so the queue drains first.
         for _ in self._workers:
-            await self._queue.put('__shutdown__')
+            self._push(math.inf, '', _SHUTDOWN)
         await asyncio.gather(*self._workers, return_exceptions=True)
         self._workers.clear()
 
-    async def submit(self, prompt: str) -> JobRecord:
-        job = await self._store.create(prompt=prompt)
-        await self._queue.put(job.id)
+    async def drain(self, grace_seconds: float, spool: JobSpool | None = None) -> dict[str, int]:
+        """Stop taking jobs and give running ones ``grace_seconds`` to finish.
+
+        With a spool, queued jobs are not started here: they, and any job still running when the
+        grace period ends, are written to the spool and left ``queued``. Without one the queue
+        keeps draining until the grace period ends and whatever is left fails.
+        """
+        self._accepting = False
+        if not self._running:
+            return {'interrupted': 0, 'spooled': 0, 'failed': 0}
+        self._running = False
+
+        # Stop markers go ahead of the queue when handing off, behind it otherwise.
+        marker = -math.inf if spool is not None else math.inf
+        for _ in self._workers:
+            self._push(marker, '', _SHUTDOWN)
+        _, unfinished = await asyncio.wait(self._workers, timeout=max(0.0, grace_seconds))
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+        interrupted = len(self._interrupted)
+        leftover = self._interrupted + [job_id for _, _, _, job_id in sorted(self._heap) if job_id != _SHUTDOWN]
+        weights = {name: state.weight for name, state in self._tenants.items()}
+        self._interrupted = []
+        self._heap.clear()
+        self._available = asyncio.Semaphore(0)
+        self._tenants.clear()
+
+        entries = []
+        failed = 0
+        for job_id in leftover:
+            job = await self._store.get(job_id)
+            if job is None:
+                continue
+            if spool is None:
+                await self._store.set_failed(job_id, 'Server shut down before the job finished')
+                failed += 1
+                continue
+            await self._store.set_queued(job_id)
+            entries.append(
+                {
+                    'id': job.id,
+                    'prompt': job.prompt,
+                    'tenant': job.tenant,
+                    'weight': weights.get(job.tenant, 1.0),
+                    'created_at': job.created_at,
+                }
+            )
+        if entries:
+            await asyncio.to_thread(spool.write, entries)
+        return {'interrupted': interrupted, 'spooled': len(entries), 'failed': failed}
+
+    async def restore(self, spool: JobSpool) -> int:
+        """Queue the jobs a previous instance handed off, keeping their ids."""
+        entries = await asyncio.to_thread(spool.claim)
+        for entry in entries:
+            job = JobRecord(
+                id=entry['id'],
+                prompt=entry['prompt'],
+                status='queued',
+                tenant=entry.get('tenant', 'default'),
+                created_at=entry.get('created_at', time.time()),
+            )
+            await self._store.restore(job)
+            self._enqueue(job.id, job.tenant, entry.get('weight', 1.0))
+        return len(entries)
+
+    async def submit(self, prompt: str, tenant: str = 'default', weight: float = 1.0) -> JobRecord:
+        if not self._accepting:
+            raise WorkerDraining('The job worker is draining and not taking new jobs')
+        state = self._tenants.get(tenant)
+        if state is not None and 0 < self._max_queued_per_tenant <= state.queued:
+            raise TenantQueueFull(tenant, self._max_queued_per_tenant)
+
+        job = await self._store.create(prompt=prompt, tenant=tenant)
+        self._enqueue(job.id, tenant, weight)
         return job
 
+    def stats(self) -> dict:
+        return {
+            'virtual_time': round(self._virtual_time, 3),
+            'tenants': {
+                name: {'weight': state.weight, 'queued': state.queued, 'running': state.running}
+                for name, state in self._tenants.items()
+            },
+        }
+
+    def _enqueue(self, job_id: str, tenant: str, weight: float) -> None:
+        state = self._tenants.setdefault(tenant, _Tenant(weight=1.0))
+        state.weight = max(float(weight), 1e-6)
+        state.queued += 1
+        finish = max(self._virtual_time, state.last_finish) + 1.0 / state.weight
+        state.last_finish = finish
+        self._push(finish, tenant, job_id)
+
+    def _push(self, finish: float, tenant: str, job_id: str) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (finish, self._seq, tenant, job_id))
+        self._available.release()
+
+    def _release(self, tenant: str) -> None:
+        state = self._tenants.get(tenant)
+        if state is None:
+            return
+        state.running -= 1
+        # An idle tenant whose tags are behind virtual time would be tagged the same way afresh.
+        if not state.queued and not state.running and state.last_finish <= self._virtual_time:
+            del self._tenants[tenant]
+
     async def _worker_loop(self) -> None:
         while True:
-            job_id = await self._queue.get()
-            if job_id == '__shutdown__':
+            await self._available.acquire()
+            finish, _, tenant, job_id = heapq.heappop(self._heap)
+            if job_id == _SHUTDOWN:
                 break
 
-            job = await self._store.get(job_id)
-            if not job:
-                continue
-
-            await self._store.set_running(job_id)
+            self._virtual_time = max(self._virtual_time, finish)
+            state = self._tenants[tenant]
+            state.queued -= 1
+            state.running += 1
             try:
-                result = await run_completion(job.prompt)
-                await self._store.set_completed(job_id, result)
-            except Exception as exc:
-                await self._store.set_failed(job_id, str(exc))
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                # Cut off by the end of a drain's grace period; handed off with the queued jobs.
+                self._interrupted.append(job_id)
+                raise
+            finally:
+                self._release(tenant)
+
+    async def _run(self, job_id: str) -> None:
+        job = await self._store.get(job_id)
+        if not job:
+            return
+
+        await self._store.set_running(job_id)
+        try:
+            result = await run_completion(job.prompt)
+            await self._store.set_completed(job_id, result)
+        except Exception as exc:
+            await self._store.set_failed(job_id, str(exc))
@@ -1,15 +1,29 @@
 from __future__ import annotations
 
+import threading
+
 from app.core.config import settings
+from app.rag.filters import MetadataFilter
 from app.rag.state import get_retriever
 
 
-def retrieve_context(query: str, top_k: int | None = None, max_chars: int | None = None) -> tuple[str, list[dict]]:
-    retriever = get_retriever()
+def retrieve_context(
+    query: str,
+    top_k: int | None = None,
+    max_chars: int | None = None,
+    metadata_filter: MetadataFilter | None = None,
+    collection: str | None = None,
+    mmr_lambda: float | None = None,
+    cancel_event: threading.Event | None = None,
+) -> tuple[str, list[dict]]:
+    retriever = get_retriever(collection)
     context, results = retriever.build_context(
         query=query,
         top_k=top_k or settings.rag_default_top_k,
         max_chars=max_chars or settings.chain_max_context_chars,
+        metadata_filter=metadata_filter,
+        mmr_lambda=mmr_lambda,
+        cancel_event=cancel_event,
     )
 
     retrieved = [
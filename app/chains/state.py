@@ -14,3 +14,9 @@ def get_orchestrator() -> ToolOrchestrator:
         if _orchestrator is None:
             _orchestrator = ToolOrchestrator()
         return _orchestrator
+
+
+def shutdown_orchestrator() -> None:
+    with _orchestrator_lock:
+        if _orchestrator is not None:
+            _orchestrator.shutdown()
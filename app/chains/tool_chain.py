@@ -1,18 +1,23 @@
 from __future__ import annotations
 
 import asyncio
-import re
+import functools
+import multiprocessing
 import threading
 import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import asdict, dataclass
+from typing import AsyncIterator
 
 from app.chains.langchain_adapter import detect_langchain_support, try_format_with_langchain
 from app.chains.prompts import build_tool_augmented_prompt
 from app.chains.rag_chain import retrieve_context
+from app.core.cancellation import await_cancellable, check_cancelled, remaining_seconds
 from app.core.config import settings
-from app.llm.inference import run_completion_sync
-from app.tools.calculator import calculate
-from app.tools.lookup import lookup_key, semantic_lookup
+from app.llm.inference import run_completion, run_completion_sync, stream_completion
+from app.rag.filters import MetadataFilter
+from app.tools.registry import ToolCall, ToolContext, build_registry
 
 
 @dataclass
@@ -22,6 +27,8 @@ class ToolInvocation:
     success: bool
     output: str
     ts: float
+    latency_seconds: float = 0.0
+    timed_out: bool = False
 
 
 class ToolInvocationLog:
@@ -41,102 +48,177 @@ class ToolInvocationLog:
 
 
 class ToolOrchestrator:
+    """Plans tool calls from the prompt through the tool registry (``chain_tools``) and runs them,
+    and the RAG retrieval, concurrently.
+
+    Every call gets its own timeout (``tool_timeout_seconds``, overridable per tool through
+    ``tool_timeouts_seconds``); a call that misses it is cancelled if it has not started and its
+    result is ignored otherwise, so a chain waits for the slowest tool at most, not their sum.
+    """
+
     def __init__(self) -> None:
         self._log = ToolInvocationLog()
+        self._registry = build_registry(settings.chain_tools)
+        self._io_executor = ThreadPoolExecutor(max_workers=settings.tool_io_workers, thread_name_prefix="tool-io")
+        self._cpu_executor: Executor | None = None
+        self._cpu_lock = threading.Lock()
 
     @property
     def tool_names(self) -> list[str]:
-        return ["calculator", "lookup_key", "semantic_lookup"]
+        return self._registry.names
 
     def get_logs(self, limit: int = 50) -> list[dict]:
         return self._log.latest(limit=limit)
 
-    def _extract_math_expression(self, prompt: str) -> str | None:
-        match = re.search(r"([-+*/(). 0-9]{3,})", prompt)
-        if not match:
-            return None
-        expr = match.group(1).strip()
-        if any(ch.isdigit() for ch in expr):
-            return expr
-        return None
-
-    def _extract_lookup_key(self, prompt: str) -> str | None:
-        lowered = prompt.lower()
-        prefixes = ["lookup", "find key", "what is key", "db key"]
-        for prefix in prefixes:
-            if prefix in lowered:
-                idx = lowered.find(prefix) + len(prefix)
-                candidate = prompt[idx:].strip(" :?")
-                if candidate:
-                    return candidate
-        return None
-
-    def _invoke_tools(self, prompt: str, top_k: int) -> list[str]:
-        notes: list[str] = []
-        calls = 0
-
-        expr = self._extract_math_expression(prompt)
-        if expr and calls < settings.tool_max_invocations_per_request:
-            result = calculate(expr)
-            calls += 1
-            if result.ok:
-                text = f"calculator({expr}) = {result.result}"
-                self._log.add(ToolInvocation("calculator", expr, True, text, time.time()))
-            else:
-                text = f"calculator({expr}) failed: {result.error}"
-                self._log.add(ToolInvocation("calculator", expr, False, text, time.time()))
-            notes.append(text)
-
-        lookup_key_candidate = self._extract_lookup_key(prompt)
-        if lookup_key_candidate and calls < settings.tool_max_invocations_per_request:
-            hit = lookup_key(lookup_key_candidate)
-            calls += 1
-            if hit.found:
-                text = f"lookup_key({hit.key}) -> {hit.value}"
-                self._log.add(ToolInvocation("lookup_key", hit.key, True, text, time.time()))
-            else:
-                text = f"lookup_key({hit.key}) -> not found"
-                self._log.add(ToolInvocation("lookup_key", hit.key, False, text, time.time()))
-            notes.append(text)
-
-        if calls < settings.tool_max_invocations_per_request:
-            semantic_hits = semantic_lookup(prompt, top_k=min(top_k, 3))
-            if semantic_hits:
-                top = semantic_hits[0]
-                text = f"semantic_lookup(top1) score={top['score']} source={top['source_path']}"
-                self._log.add(ToolInvocation("semantic_lookup", prompt, True, text, time.time()))
-                notes.append(text)
-
-        return notes
-
-    def run_sync(self, prompt: str, top_k: int, use_rag: bool, use_tools: bool) -> dict:
-        context = ""
-        retrieved: list[dict] = []
-        tool_notes: list[str] = []
+    def shutdown(self) -> None:
+        self._io_executor.shutdown(wait=False, cancel_futures=True)
+        with self._cpu_lock:
+            if self._cpu_executor is not None:
+                self._cpu_executor.shutdown(wait=False, cancel_futures=True)
+                self._cpu_executor = None
 
-        if use_rag:
-            context, retrieved = retrieve_context(prompt, top_k=top_k)
+    def _get_cpu_executor(self) -> Executor:
+        with self._cpu_lock:
+            if self._cpu_executor is None:
+                if settings.tool_cpu_executor.lower() == "process":
+                    # Separate processes keep CPU-heavy tools from holding the GIL over request handling.
+                    # Never fork this process: it holds locks, pools, SQLite handles and the loaded
+                    # index, so workers start fresh from a forkserver (or spawn) instead.
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                    self._cpu_executor = ProcessPoolExecutor(max_workers=settings.tool_cpu_workers, mp_context=context)
+                else:
+                    self._cpu_executor = ThreadPoolExecutor(
+                        max_workers=settings.tool_cpu_workers,
+                        thread_name_prefix="tool-cpu",
+                    )
+            return self._cpu_executor
+
+    def _reset_cpu_executor(self, broken: Executor) -> None:
+        with self._cpu_lock:
+            if self._cpu_executor is broken:
+                self._cpu_executor = None
+
+    def _timeout_for(self, tool_name: str) -> float:
+        return settings.tool_timeouts_seconds.get(tool_name, settings.tool_timeout_seconds)
+
+    def _plan_tools(
+        self,
+        prompt: str,
+        top_k: int,
+        metadata_filter: MetadataFilter | None = None,
+        collection: str | None = None,
+        mmr_lambda: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> list[ToolCall]:
+        context = ToolContext(prompt, top_k, metadata_filter, collection, mmr_lambda, cancel_event)
+        return self._registry.plan(context, limit=settings.tool_max_invocations_per_request)
 
+    async def _execute(self, call: ToolCall, cancel_event: threading.Event | None = None) -> str | None:
+        """Run one call on its executor within its timeout (never past the request's deadline);
+        failures become notes, never exceptions."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_cpu_executor() if call.kind == "cpu" else self._io_executor
+        timeout = remaining_seconds(cancel_event, self._timeout_for(call.name))
+        timed_out = False
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(loop.run_in_executor(executor, call.func, *call.args), timeout)
+            success, note = call.describe(result)
+        except asyncio.TimeoutError:
+            timed_out = True
+            success, note = False, f"{call.name}({call.tool_input}) timed out after {timeout:g}s"
+        except BrokenProcessPool as exc:
+            self._reset_cpu_executor(executor)
+            success, note = False, f"{call.name}({call.tool_input}) failed: {exc}"
+        except Exception as exc:
+            success, note = False, f"{call.name}({call.tool_input}) failed: {exc}"
+        latency = time.perf_counter() - started
+
+        if note is not None:
+            self._log.add(
+                ToolInvocation(call.name, call.tool_input, success, note, time.time(), latency, timed_out)
+            )
+        return note
+
+    def _start(
+        self,
+        prompt: str,
+        top_k: int,
+        use_rag: bool,
+        use_tools: bool,
+        metadata_filter: MetadataFilter | None,
+        collection: str | None,
+        mmr_lambda: float | None,
+        cancel_event: threading.Event | None,
+    ) -> tuple[asyncio.Future | None, list[asyncio.Task]]:
+        """Start retrieval and every planned tool at once; must be called on a running loop."""
+        check_cancelled(cancel_event, "tools")
+        retrieval = None
+        if use_rag:
+            retrieval = asyncio.get_running_loop().run_in_executor(
+                self._io_executor,
+                functools.partial(
+                    retrieve_context,
+                    prompt,
+                    top_k=top_k,
+                    metadata_filter=metadata_filter,
+                    collection=collection,
+                    mmr_lambda=mmr_lambda,
+                    cancel_event=cancel_event,
+                ),
+            )
+        tools = []
         if use_tools:
-            tool_notes = self._invoke_tools(prompt, top_k=top_k)
+            plan = self._plan_tools(prompt, top_k, metadata_filter, collection, mmr_lambda, cancel_event)
+            tools = [asyncio.create_task(self._execute(call, cancel_event)) for call in plan]
+        return retrieval, tools
+
+    async def _prepare(
+        self,
+        prompt: str,
+        top_k: int,
+        use_rag: bool,
+        use_tools: bool,
+        metadata_filter: MetadataFilter | None,
+        collection: str | None,
+        mmr_lambda: float | None,
+        cancel_event: threading.Event | None = None,
+    ) -> tuple[str, list[dict], list[str]]:
+        retrieval, tools = self._start(
+            prompt, top_k, use_rag, use_tools, metadata_filter, collection, mmr_lambda, cancel_event
+        )
 
+        async def gather() -> tuple[str, list[dict], list[str | None]]:
+            notes = await asyncio.gather(*tools)
+            context, retrieved = await retrieval if retrieval is not None else ("", [])
+            return context, retrieved, notes
+
+        try:
+            context, retrieved, notes = await await_cancellable(gather(), cancel_event, "tools")
+        finally:
+            for task in tools:
+                task.cancel()
+        # Notes keep the planned tool order, whichever finished first.
+        return context, retrieved, [note for note in notes if note is not None]
+
+    def _final_prompt(self, prompt: str, context: str, tool_notes: list[str]) -> str:
         final_prompt = build_tool_augmented_prompt(
             user_prompt=prompt,
             context=context,
             tool_notes="\n".join(tool_notes),
         )
-
-        lc = detect_langchain_support()
         if settings.chain_mode.lower() == "langchain":
             final_prompt = try_format_with_langchain(
                 system_prompt="You are a tool-aware RAG assistant.",
                 user_prompt=final_prompt,
             )
+        return final_prompt
 
-        output = run_completion_sync(final_prompt)
-
+    def _result(self, mode: str, output: str, retrieved: list[dict], tool_notes: list[str]) -> dict:
+        lc = detect_langchain_support()
         return {
-            "mode": "chain-sync",
+            "mode": mode,
             "chain_mode": "langchain" if settings.chain_mode.lower() == "langchain" else "native",
             "langchain_available": lc.available,
             "langchain_reason": lc.reason,
@@ -146,5 +228,80 @@ class ToolOrchestrator:
             "tools_used": len(tool_notes),
         }
 
-    async def run_async(self, prompt: str, top_k: int, use_rag: bool, use_tools: bool) -> dict:
-        return await asyncio.to_thread(self.run_sync, prompt, top_k, use_rag, use_tools)
+    def run_sync(
+        self,
+        prompt: str,
+        top_k: int,
+        use_rag: bool,
+        use_tools: bool,
+        metadata_filter: MetadataFilter | None = None,
+        collection: str | None = None,
+        mmr_lambda: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> dict:
+        # Called from worker threads (sync routes), which have no event loop of their own.
+        context, retrieved, tool_notes = asyncio.run(
+            self._prepare(prompt, top_k, use_rag, use_tools, metadata_filter, collection, mmr_lambda, cancel_event)
+        )
+        output = run_completion_sync(self._final_prompt(prompt, context, tool_notes), cancel_event=cancel_event)
+        return self._result("chain-sync", output, retrieved, tool_notes)
+
+    async def run_async(
+        self,
+        prompt: str,
+        top_k: int,
+        use_rag: bool,
+        use_tools: bool,
+        metadata_filter: MetadataFilter | None = None,
+        collection: str | None = None,
+        mmr_lambda: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> dict:
+        context, retrieved, tool_notes = await self._prepare(
+            prompt, top_k, use_rag, use_tools, metadata_filter, collection, mmr_lambda, cancel_event
+        )
+        output = await run_completion(self._final_prompt(prompt, context, tool_notes), cancel_event=cancel_event)
+        return self._result("chain-async", output, retrieved, tool_notes)
+
+    async def run_stream(
+        self,
+        prompt: str,
+        top_k: int,
+        use_rag: bool,
+        use_tools: bool,
+        metadata_filter: MetadataFilter | None = None,
+        collection: str | None = None,
+        mmr_lambda: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> AsyncIterator[tuple[str, object]]:
+        """Like ``run_async``, but yields ``('sources', ...)`` and one ``('tool', ...)`` per tool note
+        in completion order as each is ready, then ``('token', text)`` while the answer streams."""
+        retrieval, tools = self._start(
+            prompt, top_k, use_rag, use_tools, metadata_filter, collection, mmr_lambda, cancel_event
+        )
+        pending: set[asyncio.Future] = set(tools)
+        if retrieval is not None:
+            pending.add(retrieval)
+        context = ""
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=remaining_seconds(cancel_event),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                check_cancelled(cancel_event, "tools")
+                for finished in done:
+                    if finished is retrieval:
+                        context, retrieved = finished.result()
+                        yield "sources", {"retrieved": retrieved}
+                    elif finished.result() is not None:
+                        yield "tool", {"note": finished.result()}
+        finally:
+            for unfinished in pending:
+                unfinished.cancel()
+
+        tool_notes = [task.result() for task in tools if task.result() is not None]
+        final_prompt = self._final_prompt(prompt, context, tool_notes)
+        async for token in stream_completion(final_prompt, cancel_event=cancel_event):
+            yield "token", token
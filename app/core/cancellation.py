@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar('T')
+
+
+class RequestCancelled(RuntimeError):
+    """The request was abandoned (client gone, server draining) before ``stage`` could finish."""
+
+    def __init__(self, stage: str, reason: str = 'cancelled') -> None:
+        super().__init__(f'{stage}: {reason}')
+        self.stage = stage
+        self.reason = reason
+
+
+class DeadlineExceeded(RequestCancelled):
+    def __init__(self, stage: str) -> None:
+        super().__init__(stage, 'deadline exceeded')
+
+
+class CancelToken(threading.Event):
+    """Request-scoped cancellation plus an optional deadline.
+
+    It is a ``threading.Event``, so it goes wherever the pipeline already takes a ``cancel_event``;
+    ``is_set`` is also true once the deadline has passed. ``on_cancel`` callbacks run when it is
+    set explicitly; deadline expiry is noticed by polling (``check``) or by bounding waits with
+    ``remaining``.
+    """
+
+    def __init__(self, timeout: float | None = None) -> None:
+        super().__init__()
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.reason: str | None = None
+        self._callbacks: list[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def is_set(self) -> bool:
+        return super().is_set() or self.expired
+
+    def set(self, reason: str = 'cancelled') -> None:
+        with self._callbacks_lock:
+            if super().is_set():
+                return
+            self.reason = reason
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    cancel = set
+
+    def wait(self, timeout: float | None = None) -> bool:
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return super().wait(timeout) or self.expired
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run ``callback`` (from whichever thread cancels) once the token is set; returns an unregister function."""
+        with self._callbacks_lock:
+            if not super().is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback: Callable[[], None]) -> None:
+        with self._callbacks_lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def request_token(timeout: float | None = None) -> CancelToken:
+    """A token for one request; ``timeout`` is capped by (and defaults to) ``request_timeout_seconds``."""
+    limit = settings.request_timeout_seconds
+    if timeout is None or timeout <= 0:
+        return CancelToken(limit if limit > 0 else None)
+    return CancelToken(min(timeout, limit) if limit > 0 else timeout)
+
+
+def check_cancelled(cancel_event: threading.Event | None, stage: str) -> None:
+    """Refuse to start ``stage`` for a request that was cancelled or is past its deadline."""
+    if cancel_event is None:
+        return
+    if isinstance(cancel_event, CancelToken) and cancel_event.expired:
+        raise DeadlineExceeded(stage)
+    if cancel_event.is_set():
+        raise RequestCancelled(stage, getattr(cancel_event, 'reason', None) or 'cancelled')
+
+
+def remaining_seconds(cancel_event: threading.Event | None, default: float | None = None) -> float | None:
+    """The smaller of ``default`` and the time left before the token's deadline."""
+    remaining = cancel_event.remaining() if isinstance(cancel_event, CancelToken) else None
+    if remaining is None:
+        return default
+    return remaining if default is None else min(default, remaining)
+
+
+async def await_cancellable(awaitable: Awaitable[T], cancel_event: threading.Event | None, stage: str) -> T:
+    """Await ``awaitable`` but give up as soon as the request is cancelled or its deadline passes.
+
+    Work already handed to a thread keeps running to completion in the background; the caller
+    stops waiting for it and does not start the stages after it.
+    """
+    check_cancelled(cancel_event, stage)
+    if not isinstance(cancel_event, CancelToken):
+        return await awaitable
+    loop = asyncio.get_running_loop()
+    future = asyncio.ensure_future(awaitable)
+    unregister = cancel_event.on_cancel(lambda: loop.call_soon_threadsafe(future.cancel))
+    try:
+        return await asyncio.wait_for(future, cancel_event.remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(stage) from None
+    except asyncio.CancelledError:
+        if cancel_event.is_set():
+            check_cancelled(cancel_event, stage)
+        raise
+    finally:
+        unregister()
@@ -1,3 +1,4 @@
+from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,24 +12,130 @@ class Settings(BaseSettings):
     llm_provider: str = 'gemini'
     llm_model: str = 'gemini-2.5-flash'
     gemini_api_key: str | None = None
-    llm_timeout_seconds: int = 60
+    llm_timeout_seconds: float = 60
+    # More than one (e.g. ["gemini", "simulated"]) enables routing with hedging and circuit breakers.
+    llm_providers: list[str] = []
+    llm_routing_workers: int = 32
+    llm_hedge_enabled: bool = True
+    llm_hedge_percentile: float = 95.0
+    llm_hedge_min_delay_seconds: float = 0.05
+    llm_hedge_min_samples: int = 20
+    llm_latency_window: int = 200
+    llm_breaker_failure_threshold: int = 5
+    llm_breaker_cooldown_seconds: float = 30.0
+    llm_breaker_slow_call_seconds: float = 20.0  # successful calls slower than this count as failures; 0 disables
+    llm_stream_buffer_tokens: int = 256
+    fake_llm_latency_seconds: float = 0.05
+    fake_llm_jitter_seconds: float = 0.0
+    fake_llm_error_rate: float = 0.0
+    gemini_transport: str = 'grpc'  # grpc | rest
+    llm_warmup_completion: bool = False  # also send a 1-token completion at startup
+    llm_health_probe_interval_seconds: float = 30.0  # 0 disables the periodic probe
+    llm_health_probe_timeout_seconds: float = 5.0
+    llm_health_failure_threshold: int = 3
+
+    # Deadline for one request, end to end; clients may ask for less with X-Request-Timeout. 0 disables.
+    request_timeout_seconds: float = 120.0
+
+    # Token buckets per client (API key, else IP) and route group: {group: [requests per second, burst]}.
+    rate_limit_enabled: bool = True
+    rate_limits: dict[str, tuple[float, float]] = {
+        'query': (20.0, 40.0),
+        'rag': (20.0, 40.0),
+        'chains': (20.0, 40.0),
+        'stream': (10.0, 20.0),
+        'jobs': (5.0, 20.0),
+    }
+    rate_limit_key_header: str = 'X-API-Key'
+    # Keys that identify a client in that header; any other value is ignored and the client keyed by IP.
+    api_keys: list[str] = []
+    rate_limit_trust_forwarded_for: bool = False  # only behind a proxy that sets X-Forwarded-For
+    rate_limit_store: str = 'memory'  # or package.module:ATTRIBUTE naming a RateLimitStore (factory)
+    rate_limit_max_clients: int = 100_000
 
     worker_concurrency: int = 4
+    # Jobs are dispatched by weighted fair queuing across clients: {API key or IP: weight}, default 1.
+    job_tenant_weights: dict[str, float] = {}
+    job_max_queued_per_tenant: int = 100  # 0 = unbounded
+    # Draining (shutdown or POST /admin/drain): in-flight jobs and streams get this long to finish.
+    shutdown_grace_seconds: float = 30.0
+    # Jobs a draining instance does not finish are appended here for the next one; '' fails them instead.
+    job_spool_path: str = 'app/background/job_spool.jsonl'
+    admin_token: str | None = None  # required as X-Admin-Token on /admin; unset = loopback clients only
     simulated_inference_delay_seconds: float = 0.0
 
     # Phase 5 (RAG)
     embedding_model: str = 'hashing-embed-v1'
     embedding_dimension: int = 384
+    embedding_cache_max_entries: int = 20_000  # about 36 MB per collection at 384 dimensions
     rag_default_top_k: int = 4
     rag_chunk_size: int = 800
     rag_chunk_overlap: int = 120
+    # structured | content | fixed; RAG_CHUNK_BOUNDARIES is the deprecated name (content | fixed).
+    rag_chunking: str = Field('structured', validation_alias=AliasChoices('rag_chunking', 'rag_chunk_boundaries'))
+    rag_python_ast_max_chars: int = 2_000_000
     rag_data_dir: str = 'app/rag/data'
     vector_store_path: str = 'app/rag/vector_store.json'
+    vector_quantization: str = 'none'  # none | int8 | pq
+    vector_pq_subspaces: int = 48
+    vector_pq_train_size: int = 20_000
+    vector_rerank_candidates: int = 100
+    vector_search_shards: int = 0  # 0 = one per CPU core
+    vector_shard_min_rows: int = 65_536
+    vector_wal_compact_min_bytes: int = 8 * 1024 * 1024
+    vector_wal_compact_ratio: float = 1.0
+    vector_shared_index: bool = False  # memory-map one published index across worker processes
+    rag_default_collection: str = 'default'
+    rag_collections_dir: str = 'app/rag/indexes'
+    # Named collections' data dirs and index files must lie under rag_collections_dir or one of these.
+    rag_collection_roots: list[str] = []
+    rag_collections_registry_path: str = 'app/rag/indexes/collections.json'
+    rag_collections_max_loaded: int = 8
+    rag_collections_memory_budget_mb: int = 512
+    rag_watch_enabled: bool = False
+    rag_watch_backend: str = 'auto'  # auto | native | polling
+    rag_watch_interval_seconds: float = 2.0
+    rag_watch_debounce_seconds: float = 1.0
+    rag_watch_max_delay_seconds: float = 10.0
+    rag_watch_max_files_per_cycle: int = 64
+    rag_read_buffer_chars: int = 65536
+    rag_index_batch_size: int = 256
+    rag_retrieval_mode: str = 'hybrid'  # hybrid | vector
+    rag_fusion: str = 'rrf'  # rrf | weighted
+    rag_rrf_k: int = 60
+    rag_hybrid_alpha: float = 0.5
+    rag_hybrid_candidates: int = 50
+    rag_mmr_pool_factor: int = 4
+    rag_lexical_prefilter_min_records: int = 50_000
+    rag_context_max_tokens: int = 750
+    rag_context_tokenizer: str = 'heuristic'  # heuristic | tiktoken
+    rag_context_sentence_filter: bool = False
+    rag_eval_batch_size: int = 256
+    rag_eval_max_sync_cases: int = 1000
 
     # Phase 6 (chains and tool calling)
     chain_mode: str = 'native'  # native | langchain
     chain_max_context_chars: int = 3000
+    # Built-in tool names or 'package.module:ATTRIBUTE' paths to a ToolSpec; order is priority.
+    chain_tools: list[str] = ['calculator', 'lookup_key', 'semantic_lookup']
     tool_max_invocations_per_request: int = 2
+    tool_timeout_seconds: float = 2.0
+    calculator_max_expression_chars: int = 256
+    calculator_max_nodes: int = 64
+    calculator_max_magnitude: float = 1e15
+    calculator_time_budget_seconds: float = 0.05
+    calculator_cache_size: int = 1024
+    lookup_backend: str = 'memory'  # memory | sqlite
+    lookup_sqlite_path: str = 'app/tools/lookup.sqlite3'
+    lookup_cache_size: int = 4096
+    lookup_cache_check_seconds: float = 1.0
+    lookup_fuzzy_min_score: float = 0.3
+    lookup_suggestions: int = 3
+    lookup_bulk_max_items: int = 500_000
+    tool_timeouts_seconds: dict[str, float] = {}  # per-tool overrides, e.g. {'calculator': 0.5}
+    tool_cpu_executor: str = 'thread'  # thread | process (opt-in: worker processes started via forkserver/spawn)
+    tool_cpu_workers: int = 2
+    tool_io_workers: int = 8
 
 
 settings = Settings()
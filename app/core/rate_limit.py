@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import importlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    rate: float  # tokens added per second; positive
+    burst: float  # bucket capacity: requests a quiet client may send at once
+
+
+@dataclass(frozen=True)
+class RateDecision:
+    allowed: bool
+    remaining: float
+    retry_after: float  # seconds until the request would be admitted; 0 when allowed
+
+
+class RateLimitStore(ABC):
+    """Where token buckets live.
+
+    ``take`` must refill and debit a bucket atomically: in process that is a lock, in a shared
+    backend (e.g. a Redis script) a single server-side operation, so every replica sees one bucket
+    per client.
+    """
+
+    name: str
+
+    @abstractmethod
+    def take(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> RateDecision:
+        raise NotImplementedError
+
+    def size(self) -> int:
+        return 0
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Buckets in a dict, for one process. The least recently seen clients are dropped beyond
+    ``max_keys``; a dropped bucket comes back full, which only errs towards admitting."""
+
+    name = 'memory'
+
+    def __init__(self, max_keys: int = 100_000, clock=time.monotonic) -> None:
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._max_keys = max(1, max_keys)
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> RateDecision:
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (rule.burst, now))
+            tokens = min(rule.burst, tokens + (now - updated) * rule.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (cost - tokens) / rule.rate
+        return RateDecision(allowed=allowed, remaining=tokens, retry_after=retry_after)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+
+class RateLimiter:
+    """Token buckets per (route group, client) over a pluggable store."""
+
+    def __init__(self, store: RateLimitStore, rules: dict[str, RateLimitRule]) -> None:
+        self.store = store
+        self.rules = dict(rules)
+        self._admitted: dict[str, int] = {}
+        self._rejected: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def check(self, group: str, client: str, cost: float = 1.0) -> RateDecision | None:
+        """Debit ``client``'s bucket for ``group``; ``None`` when the group is not limited."""
+        rule = self.rules.get(group)
+        if rule is None:
+            return None
+        decision = self.store.take(f'{group}:{client}', rule, cost)
+        counts = self._admitted if decision.allowed else self._rejected
+        with self._lock:
+            counts[group] = counts.get(group, 0) + 1
+        return decision
+
+    def stats(self) -> dict:
+        with self._lock:
+            groups = {
+                group: {
+                    'rate_per_second': rule.rate,
+                    'burst': rule.burst,
+                    'admitted': self._admitted.get(group, 0),
+                    'rejected': self._rejected.get(group, 0),
+                }
+                for group, rule in self.rules.items()
+            }
+        return {'store': self.store.name, 'tracked_buckets': self.store.size(), 'groups': groups}
+
+
+def _build_store(entry: str) -> RateLimitStore:
+    """``memory``, or a ``RateLimitStore`` (or a factory for one) by ``package.module:ATTRIBUTE``."""
+    if entry == 'memory':
+        return MemoryRateLimitStore(max_keys=settings.rate_limit_max_clients)
+    module_name, sep, attr = entry.partition(':')
+    if not sep or not module_name or not attr:
+        raise ValueError(f"Unknown rate limit store {entry!r}; use 'memory' or 'package.module:ATTRIBUTE'")
+    store = getattr(importlib.import_module(module_name), attr)
+    if not isinstance(store, RateLimitStore):
+        store = store()
+    if not isinstance(store, RateLimitStore):
+        raise ValueError(f'{entry!r} is not a RateLimitStore')
+    return store
+
+
+def _configured_rules() -> dict[str, RateLimitRule]:
+    # A rate of 0 (or less) leaves the group unlimited.
+    return {
+        group: RateLimitRule(rate=float(rate), burst=max(1.0, float(burst)))
+        for group, (rate, burst) in settings.rate_limits.items()
+        if rate > 0
+    }
+
+
+_limiter_lock = threading.Lock()
+_limiter: RateLimiter | None = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(_build_store(settings.rate_limit_store), _configured_rules())
+        return _limiter
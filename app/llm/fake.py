@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import random
+import threading
+from typing import Callable, Generator
+
+from app.llm.provider import BaseLLMProvider, interruptible_sleep
+
+
+class FakeLLMProvider(BaseLLMProvider):
+    """Local provider with injectable latency and failures, for exercising routing, hedging and
+    circuit breaking without an upstream.
+
+    ``latency`` is seconds per call, or a callable returning them (e.g. to model a degradation);
+    ``error_rate`` is the probability a call raises. Both can be changed while it serves.
+    """
+
+    def __init__(
+        self,
+        name: str = 'fake',
+        latency: float | Callable[[], float] = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self, cancel_event: threading.Event | None) -> float:
+        base = self.latency() if callable(self.latency) else self.latency
+        with self._lock:
+            self.calls += 1
+            extra = self._random.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+            fail = self._random.random() < self.error_rate
+        interruptible_sleep(max(0.0, base + extra), cancel_event)
+        if fail:
+            raise RuntimeError(f'{self.name}: injected failure')
+        return base + extra
+
+    def complete(self, prompt: str, cancel_event: threading.Event | None = None) -> str:
+        self._delay(cancel_event)
+        return f'[{self.name.upper()}] Completion for: {prompt}'
+
+    def stream(self, prompt: str, cancel_event: threading.Event | None = None) -> Generator[str, None, None]:
+        self._delay(cancel_event)
+        for token in f'[{self.name.upper()}] Completion for: {prompt}'.split(' '):
+            yield token + ' '
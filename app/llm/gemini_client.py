@@ -1,27 +1,41 @@
 from __future__ import annotations
 
-import time
+import logging
+import threading
 from typing import Generator
 
+from app.core.cancellation import check_cancelled, remaining_seconds
 from app.core.config import settings
-from app.llm.provider import BaseLLMProvider
+from app.llm.fake import FakeLLMProvider
+from app.llm.provider import BaseLLMProvider, interruptible_sleep
+from app.llm.routing import RoutingLLMProvider
+
+logger = logging.getLogger(__name__)
 
 
 class SimulatedLLMProvider(BaseLLMProvider):
-    def complete(self, prompt: str) -> str:
+    name = 'simulated'
+
+    def __init__(self, fallback_reason: str | None = None) -> None:
+        self.fallback_reason = fallback_reason
+
+    def complete(self, prompt: str, cancel_event: threading.Event | None = None) -> str:
+        check_cancelled(cancel_event, 'llm')
         if settings.simulated_inference_delay_seconds > 0:
-            time.sleep(settings.simulated_inference_delay_seconds)
+            interruptible_sleep(settings.simulated_inference_delay_seconds, cancel_event)
         return f'[SIMULATED] Completion for: {prompt}'
 
-    def stream(self, prompt: str) -> Generator[str, None, None]:
-        text = self.complete(prompt)
+    def stream(self, prompt: str, cancel_event: threading.Event | None = None) -> Generator[str, None, None]:
+        text = self.complete(prompt, cancel_event)
         for token in text.split(' '):
             if settings.simulated_inference_delay_seconds > 0:
-                time.sleep(min(settings.simulated_inference_delay_seconds, 0.1))
+                interruptible_sleep(min(settings.simulated_inference_delay_seconds, 0.1), cancel_event)
             yield token + ' '
 
 
 class GeminiLLMProvider(BaseLLMProvider):
+    name = 'gemini'
+
     def __init__(self) -> None:
         if not settings.gemini_api_key:
             print("GEMINI_API_KEY is not set")
@@ -34,29 +48,79 @@ class GeminiLLMProvider(BaseLLMProvider):
                 'google-generativeai package is required for Gemini provider'
             ) from exc
 
-        genai.configure(api_key=settings.gemini_api_key)
+        # One client per process: the transport keeps its channel (gRPC) or session (REST) open
+        # and every request reuses it instead of reconnecting.
+        genai.configure(api_key=settings.gemini_api_key, transport=settings.gemini_transport)
+        self._genai = genai
         self._model = genai.GenerativeModel(settings.llm_model)
 
-    def complete(self, prompt: str) -> str:
-        response = self._model.generate_content(prompt)
+    def _fetch_model_info(self) -> None:
+        self._genai.get_model(
+            f'models/{settings.llm_model}',
+            request_options={'timeout': settings.llm_health_probe_timeout_seconds},
+        )
+
+    def warm_up(self) -> None:
+        # A metadata call authenticates and opens the connection without spending tokens.
+        self._fetch_model_info()
+        if settings.llm_warmup_completion:
+            self._model.generate_content('ping', generation_config={'max_output_tokens': 1})
+
+    def probe(self) -> None:
+        # Also keeps an otherwise idle connection from being dropped by the server or proxies.
+        self._fetch_model_info()
+
+    def complete(self, prompt: str, cancel_event: threading.Event | None = None) -> str:
+        check_cancelled(cancel_event, 'llm')
+        response = self._model.generate_content(
+            prompt,
+            request_options={'timeout': remaining_seconds(cancel_event, settings.llm_timeout_seconds)},
+        )
         text = getattr(response, 'text', None)
         return text or ''
 
-    def stream(self, prompt: str) -> Generator[str, None, None]:
-        response = self._model.generate_content(prompt, stream=True)
+    def stream(self, prompt: str, cancel_event: threading.Event | None = None) -> Generator[str, None, None]:
+        check_cancelled(cancel_event, 'llm')
+        response = self._model.generate_content(
+            prompt,
+            stream=True,
+            request_options={'timeout': remaining_seconds(cancel_event, settings.llm_timeout_seconds)},
+        )
         for chunk in response:
+            if cancel_event is not None and cancel_event.is_set():
+                return
             text = getattr(chunk, 'text', None)
             if text:
                 yield text
 
 
-def build_llm_provider() -> BaseLLMProvider:
-    provider_name = settings.llm_provider.lower()
+def _build_named_provider(provider_name: str) -> BaseLLMProvider:
+    provider_name = provider_name.lower()
+
+    if provider_name == 'fake':
+        return FakeLLMProvider(
+            latency=settings.fake_llm_latency_seconds,
+            jitter=settings.fake_llm_jitter_seconds,
+            error_rate=settings.fake_llm_error_rate,
+        )
 
     if provider_name == 'gemini':
         try:
             return GeminiLLMProvider()
-        except Exception:
-            return SimulatedLLMProvider()
+        except Exception as exc:
+            logger.warning('Gemini provider unavailable, using the simulated provider: %s', exc)
+            return SimulatedLLMProvider(fallback_reason=f'gemini: {exc}')
 
+    if provider_name != 'simulated':
+        logger.warning('Unknown LLM provider %r, using the simulated provider', provider_name)
+        return SimulatedLLMProvider(fallback_reason=f'unknown provider {provider_name!r}')
     return SimulatedLLMProvider()
+
+
+def build_llm_provider() -> BaseLLMProvider:
+    # Several providers, in order of preference, are routed with hedging and circuit breakers.
+    if len(settings.llm_providers) > 1:
+        return RoutingLLMProvider([_build_named_provider(name) for name in settings.llm_providers])
+    if settings.llm_providers:
+        return _build_named_provider(settings.llm_providers[0])
+    return _build_named_provider(settings.llm_provider)
@@ -4,6 +4,7 @@ import asyncio
 import threading
 from typing import AsyncGenerator
 
+from app.core.cancellation import CancelToken, RequestCancelled, await_cancellable, check_cancelled
 from app.llm.gemini_client import build_llm_provider
 from app.llm.provider import BaseLLMProvider
 
@@ -20,25 +21,41 @@ def get_provider() -> BaseLLMProvider:
         return _provider
 
 
-def run_completion_sync(prompt: str) -> str:
-    return get_provider().complete(prompt)
+def run_completion_sync(prompt: str, cancel_event: threading.Event | None = None) -> str:
+    check_cancelled(cancel_event, 'llm')
+    return get_provider().complete(prompt, cancel_event=cancel_event)
 
 
-async def run_completion(prompt: str) -> str:
-    return await asyncio.to_thread(run_completion_sync, prompt)
+async def run_completion(prompt: str, cancel_event: threading.Event | None = None) -> str:
+    # Stops waiting as soon as the request is cancelled; the provider call sees the same token.
+    return await await_cancellable(asyncio.to_thread(run_completion_sync, prompt, cancel_event), cancel_event, 'llm')
 
 
 async def stream_completion(prompt: str, cancel_event: threading.Event | None = None) -> AsyncGenerator[str, None]:
+    """Yield the provider's tokens as they arrive.
+
+    A stream cut short by its token raises after the tokens produced so far: ``DeadlineExceeded``
+    past the request's deadline, ``RequestCancelled`` (with the reason) when cancelled, e.g. by a
+    drain. Consumers that stopped reading because the client left never see it.
+    """
     loop = asyncio.get_running_loop()
     queue: asyncio.Queue[str | None] = asyncio.Queue()
+    interrupted = False
+
+    check_cancelled(cancel_event, 'llm')
 
     def producer() -> None:
+        nonlocal interrupted
         try:
-            for token in get_provider().stream(prompt):
+            for token in get_provider().stream(prompt, cancel_event=cancel_event):
                 if cancel_event and cancel_event.is_set():
                     break
                 loop.call_soon_threadsafe(queue.put_nowait, token)
+        except RequestCancelled:
+            pass
         finally:
+            # Providers may also end a cancelled stream quietly.
+            interrupted = cancel_event is not None and cancel_event.is_set()
             loop.call_soon_threadsafe(queue.put_nowait, None)
 
     producer_task = asyncio.to_thread(producer)
@@ -50,6 +67,8 @@ async def stream_completion(prompt: str, cancel_event: threading.Event | None =
             if token is None:
                 break
             yield token
+        if interrupted and isinstance(cancel_event, CancelToken):
+            check_cancelled(cancel_event, 'llm')
     finally:
         if cancel_event:
             cancel_event.set()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.llm.inference import get_provider
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderMonitor:
+    """Builds and warms the LLM provider at startup, then probes it periodically.
+
+    Construction and warm-up happen before the app takes traffic, so the first request does not
+    pay for SDK imports, authentication or connection setup. The probe loop keeps the connection
+    busy and records whether the provider answers; ``snapshot`` is what ``/health`` reports.
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task[None] | None = None
+        self._warmed_up = False
+        self._warmup_seconds: float | None = None
+        self._status = 'unknown'
+        self._last_probe_at: float | None = None
+        self._last_probe_latency: float | None = None
+        self._last_error: str | None = None
+        self._consecutive_failures = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+        await self.warm_up()
+        if settings.llm_health_probe_interval_seconds > 0:
+            self._task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        provider = get_provider()
+        await asyncio.to_thread(provider.close)
+
+    async def warm_up(self) -> None:
+        started = time.perf_counter()
+        try:
+            provider = await asyncio.to_thread(get_provider)
+            await asyncio.wait_for(asyncio.to_thread(provider.warm_up), settings.llm_health_probe_timeout_seconds)
+        except Exception as exc:
+            logger.warning('LLM provider warm-up failed: %s', exc)
+            self._record_failure(exc)
+        else:
+            self._warmed_up = True
+            self._record_success(time.perf_counter() - started)
+        self._warmup_seconds = round(time.perf_counter() - started, 4)
+
+    async def probe(self) -> None:
+        provider = get_provider()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(provider.probe), settings.llm_health_probe_timeout_seconds)
+        except Exception as exc:
+            self._record_failure(exc)
+            return
+        self._record_success(time.perf_counter() - started)
+
+    async def _probe_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.llm_health_probe_interval_seconds)
+            await self.probe()
+
+    def _record_success(self, latency: float) -> None:
+        self._status = 'ok'
+        self._last_probe_at = time.time()
+        self._last_probe_latency = round(latency, 4)
+        self._last_error = None
+        self._consecutive_failures = 0
+
+    def _record_failure(self, exc: BaseException) -> None:
+        self._consecutive_failures += 1
+        self._status = 'down' if self._consecutive_failures >= settings.llm_health_failure_threshold else 'degraded'
+        self._last_probe_at = time.time()
+        self._last_error = f'{type(exc).__name__}: {exc}' if str(exc) else type(exc).__name__
+
+    def snapshot(self) -> dict:
+        provider = get_provider()
+        return {
+            'provider': provider.name,
+            'configured_provider': settings.llm_providers or settings.llm_provider,
+            'fallback_reason': provider.fallback_reason,
+            'model': settings.llm_model,
+            'status': self._status,
+            'warmed_up': self._warmed_up,
+            'warmup_seconds': self._warmup_seconds,
+            'probe_running': self.is_running,
+            'last_probe_at': self._last_probe_at,
+            'last_probe_latency_seconds': self._last_probe_latency,
+            'last_error': self._last_error,
+            'consecutive_failures': self._consecutive_failures,
+            'routing': provider.stats() or None,
+        }
+
+
+provider_monitor = ProviderMonitor()
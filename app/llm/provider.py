@@ -1,14 +1,44 @@
 from __future__ import annotations
 
+import threading
+import time
 from abc import ABC, abstractmethod
 from typing import Generator
 
+from app.core.cancellation import check_cancelled
+
 
 class BaseLLMProvider(ABC):
+    name = 'base'
+    # Set when this provider stands in for the configured one (e.g. simulated because of a missing key).
+    fallback_reason: str | None = None
+
+    # ``cancel_event`` is the request's token: providers stop early once it is set and bound their
+    # upstream calls by its deadline (see app.core.cancellation).
     @abstractmethod
-    def complete(self, prompt: str) -> str:
+    def complete(self, prompt: str, cancel_event: threading.Event | None = None) -> str:
         raise NotImplementedError
 
     @abstractmethod
-    def stream(self, prompt: str) -> Generator[str, None, None]:
+    def stream(self, prompt: str, cancel_event: threading.Event | None = None) -> Generator[str, None, None]:
         raise NotImplementedError
+
+    def warm_up(self) -> None:
+        """Pay one-time costs (imports, auth, connection setup) before the first request does."""
+
+    def probe(self) -> None:
+        """Cheap health check; raises when the provider cannot serve requests."""
+
+    def close(self) -> None:
+        """Release connections held by the provider."""
+
+    def stats(self) -> dict:
+        return {}
+
+
+def interruptible_sleep(seconds: float, cancel_event: threading.Event | None, stage: str = 'llm') -> None:
+    """Sleep like ``time.sleep`` but raise ``RequestCancelled`` as soon as the request is cancelled."""
+    if cancel_event is None:
+        time.sleep(seconds)
+    elif cancel_event.wait(seconds):
+        check_cancelled(cancel_event, stage)
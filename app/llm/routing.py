@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Generator
+
+from app.core.cancellation import (
+    CancelToken,
+    DeadlineExceeded,
+    RequestCancelled,
+    check_cancelled,
+    remaining_seconds,
+)
+from app.core.config import settings
+from app.llm.provider import BaseLLMProvider
+
+logger = logging.getLogger(__name__)
+
+_STREAM_END = object()
+
+
+class CircuitBreaker:
+    """Per-provider breaker: ``failure_threshold`` consecutive failures (errors, timeouts or calls
+    slower than ``slow_call_seconds``) open it; after ``cooldown_seconds`` a single trial call is
+    let through (half-open), and its outcome closes or re-opens the breaker."""
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float, slow_call_seconds: float) -> None:
+        self._failure_threshold = max(1, failure_threshold)
+        self._cooldown_seconds = cooldown_seconds
+        self._slow_call_seconds = slow_call_seconds
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self._cooldown_seconds:
+                return 'half_open'
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == 'closed':
+                return True
+            if self._state == 'open':
+                if time.monotonic() - self._opened_at < self._cooldown_seconds:
+                    return False
+                self._state = 'half_open'
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def release(self) -> None:
+        """Give back a half-open trial that ended without a verdict (e.g. the caller went away)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, ok: bool, latency: float | None = None) -> None:
+        if ok and latency is not None and 0 < self._slow_call_seconds < latency:
+            ok = False
+        with self._lock:
+            self._trial_in_flight = False
+            if ok:
+                self._state = 'closed'
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self._failure_threshold:
+                if self._state != 'open':
+                    self.trips += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+
+
+class _Route:
+    """A provider with its breaker and a window of recent successful latencies."""
+
+    def __init__(self, provider: BaseLLMProvider) -> None:
+        self.provider = provider
+        self.breaker = CircuitBreaker(
+            settings.llm_breaker_failure_threshold,
+            settings.llm_breaker_cooldown_seconds,
+            settings.llm_breaker_slow_call_seconds,
+        )
+        self._latencies: deque[float] = deque(maxlen=settings.llm_latency_window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.wins = 0
+
+    def observe(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, pct: float) -> float | None:
+        with self._lock:
+            if len(self._latencies) < settings.llm_hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+    def stats(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            'provider': self.provider.name,
+            'breaker': self.breaker.state,
+            'breaker_trips': self.breaker.trips,
+            'calls': self.calls,
+            'failures': self.failures,
+            'wins': self.wins,
+            'p50_seconds': round(p50, 4) if p50 is not None else None,
+            'p95_seconds': round(p95, 4) if p95 is not None else None,
+        }
+
+
+class _Attempt:
+    __slots__ = ('route', 'started', 'judged')
+
+    def __init__(self, route: _Route) -> None:
+        self.route = route
+        self.started = time.perf_counter()
+        self.judged = False
+
+
+class RoutingLLMProvider(BaseLLMProvider):
+    """Routes each request over several providers, in order of preference.
+
+    A completion goes to the first provider whose breaker is closed. If it has not answered by
+    its own recent p95 latency (``llm_hedge_percentile``), a duplicate is sent to the next
+    provider and whichever answers first wins; an error fails over to the next provider at once.
+    Everything is bounded by ``llm_timeout_seconds``: past it the call raises ``TimeoutError`` and
+    attempts still running are counted as failures (their threads finish in the background).
+    Streams fail over before their first token and enforce the timeout on every token, but are
+    not hedged: the tokens of two streams cannot be merged. A request's ``cancel_event`` cuts
+    both short and bounds them by its deadline, without counting against any provider.
+    """
+
+    name = 'routing'
+
+    def __init__(self, providers: list[BaseLLMProvider]) -> None:
+        if not providers:
+            raise ValueError('RoutingLLMProvider needs at least one provider')
+        self._routes = [_Route(provider) for provider in providers]
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.llm_routing_workers,
+            thread_name_prefix='llm-route',
+        )
+        self._stats_lock = threading.Lock()
+        self.hedges = 0
+        self.timeouts = 0
+
+    @property
+    def fallback_reason(self) -> str | None:
+        reasons = [route.provider.fallback_reason for route in self._routes if route.provider.fallback_reason]
+        return '; '.join(reasons) or None
+
+    def _next_allowed(self, routes: list[_Route]) -> _Route | None:
+        # Breakers are asked only when a call is about to go out: asking claims a half-open trial.
+        while routes:
+            route = routes.pop(0)
+            if route.breaker.allow():
+                return route
+        return None
+
+    def _hedge_delay(self, route: _Route, remaining: float) -> float:
+        if not settings.llm_hedge_enabled:
+            return remaining
+        observed = route.percentile(settings.llm_hedge_percentile)
+        if observed is None:
+            return remaining
+        return min(remaining, max(settings.llm_hedge_min_delay_seconds, observed))
+
+    def _finish(self, attempt: _Attempt, future: Future) -> None:
+        route = attempt.route
+        latency = time.perf_counter() - attempt.started
+        error = future.exception()
+        if isinstance(error, RequestCancelled):
+            # The request gave up, not the provider: no verdict either way.
+            if not attempt.judged:
+                attempt.judged = True
+                route.breaker.release()
+            return
+        with self._stats_lock:
+            if error is not None:
+                route.failures += 1
+        if error is None:
+            route.observe(latency)
+        if not attempt.judged:
+            attempt.judged = True
+            route.breaker.record(error is None, latency)
+
+    def _launch(
+        self,
+        route: _Route,
+        prompt: str,
+        cancel_event: threading.Event | None,
+        attempts: dict[Future, _Attempt],
+    ) -> Future:
+        attempt = _Attempt(route)
+        with self._stats_lock:
+            route.calls += 1
+        future = self._executor.submit(route.provider.complete, prompt, cancel_event)
+        attempts[future] = attempt
+        future.add_done_callback(lambda done: self._finish(attempt, done))
+        return future
+
+    def complete(self, prompt: str, cancel_event: threading.Event | None = None) -> str:
+        check_cancelled(cancel_event, 'llm')
+        budget = remaining_seconds(cancel_event, settings.llm_timeout_seconds)
+        request_bound = budget < settings.llm_timeout_seconds
+        deadline = time.perf_counter() + budget
+        pending_routes = list(self._routes)
+        attempts: dict[Future, _Attempt] = {}
+        in_flight: set[Future] = set()
+        errors: list[str] = []
+
+        # Completed when the request is cancelled, so waiting on the attempts wakes up at once.
+        cancelled: Future = Future()
+        unregister = (
+            cancel_event.on_cancel(lambda: cancelled.set_result(None))
+            if isinstance(cancel_event, CancelToken)
+            else lambda: None
+        )
+
+        def launch_next() -> bool:
+            route = self._next_allowed(pending_routes)
+            if route is None:
+                return False
+            in_flight.add(self._launch(route, prompt, cancel_event, attempts))
+            return True
+
+        try:
+            launch_next()
+            hedged = False
+            while in_flight:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                wait_for = remaining
+                if not hedged and pending_routes and len(in_flight) == 1:
+                    primary = attempts[next(iter(in_flight))]
+                    elapsed = time.perf_counter() - primary.started
+                    wait_for = max(0.0, self._hedge_delay(primary.route, remaining + elapsed) - elapsed)
+                done, _ = wait(in_flight | {cancelled}, timeout=wait_for, return_when=FIRST_COMPLETED)
+                check_cancelled(cancel_event, 'llm')
+                if not done:
+                    if not hedged and pending_routes and time.perf_counter() < deadline:
+                        hedged = True
+                        with self._stats_lock:
+                            self.hedges += 1
+                        launch_next()
+                    continue
+                for future in done:
+                    in_flight.discard(future)
+                    error = future.exception()
+                    if error is None:
+                        with self._stats_lock:
+                            attempts[future].route.wins += 1
+                        return future.result()
+                    errors.append(f'{attempts[future].route.provider.name}: {error}')
+                if not in_flight:
+                    launch_next()  # fail over
+        finally:
+            unregister()
+
+        if not in_flight:
+            if not attempts:
+                raise RuntimeError('All LLM providers are unavailable (circuit open)')
+            raise RuntimeError(f'All LLM providers failed: {"; ".join(errors)}')
+        if request_bound:
+            # The request's own deadline ran out first; that says nothing about the providers.
+            raise DeadlineExceeded('llm')
+        with self._stats_lock:
+            self.timeouts += 1
+        for future in in_flight:
+            attempt = attempts[future]
+            if not attempt.judged:
+                attempt.judged = True
+                attempt.route.breaker.record(False)
+        raise TimeoutError(f'No LLM provider answered within {settings.llm_timeout_seconds}s')
+
+    def _stream_from(
+        self,
+        route: _Route,
+        prompt: str,
+        cancel_event: threading.Event | None,
+    ) -> Generator[str, None, None]:
+        """Stream from one provider on a worker thread, with the timeout applied to every token."""
+        tokens: queue.Queue = queue.Queue(maxsize=settings.llm_stream_buffer_tokens)
+        stop = threading.Event()
+
+        def produce() -> None:
+            try:
+                for token in route.provider.stream(prompt, cancel_event=cancel_event):
+                    while not stop.is_set():
+                        try:
+                            tokens.put(token, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+                tokens.put(_STREAM_END)
+            except BaseException as exc:
+                tokens.put(exc)
+
+        started = time.perf_counter()
+        with self._stats_lock:
+            route.calls += 1
+        self._executor.submit(produce)
+        first = True
+        judged = False
+        try:
+            while True:
+                token_deadline = time.perf_counter() + settings.llm_timeout_seconds
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return  # the consumer is gone or out of time; stop quietly
+                    try:
+                        item = tokens.get(timeout=min(0.1, max(0.0, token_deadline - time.perf_counter())))
+                        break
+                    except queue.Empty:
+                        if time.perf_counter() < token_deadline:
+                            continue
+                        judged = True
+                        route.breaker.record(False)
+                        with self._stats_lock:
+                            self.timeouts += 1
+                        raise TimeoutError(
+                            f'{route.provider.name}: no token within {settings.llm_timeout_seconds}s'
+                        ) from None
+                if isinstance(item, RequestCancelled):
+                    return
+                if isinstance(item, BaseException):
+                    with self._stats_lock:
+                        route.failures += 1
+                    judged = True
+                    route.breaker.record(False)
+                    raise item
+                if first:
+                    # Time to first token is what the breaker and the latency window judge.
+                    first = False
+                    judged = True
+                    latency = time.perf_counter() - started
+                    route.observe(latency)
+                    route.breaker.record(True, latency)
+                if item is _STREAM_END:
+                    return
+                yield item
+        finally:
+            stop.set()
+            if not judged:
+                route.breaker.release()
+
+    def stream(self, prompt: str, cancel_event: threading.Event | None = None) -> Generator[str, None, None]:
+        errors: list[str] = []
+        routes = list(self._routes)
+        while (route := self._next_allowed(routes)) is not None:
+            produced = False
+            try:
+                for token in self._stream_from(route, prompt, cancel_event):
+                    produced = True
+                    yield token
+                with self._stats_lock:
+                    route.wins += 1
+                return
+            except Exception as exc:
+                if produced:
+                    raise  # tokens already went out; switching providers would garble the answer
+                errors.append(f'{route.provider.name}: {exc}')
+                logger.warning('LLM stream from %s failed before its first token: %s', route.provider.name, exc)
+        if not errors:
+            raise RuntimeError('All LLM providers are unavailable (circuit open)')
+        raise RuntimeError(f'All LLM providers failed: {"; ".join(errors)}')
+
+    def warm_up(self) -> None:
+        for route in self._routes:
+            route.provider.warm_up()
+
+    def probe(self) -> None:
+        # Healthy while at least one provider answers.
+        errors = []
+        for route in self._routes:
+            try:
+                route.provider.probe()
+            except Exception as exc:
+                errors.append(f'{route.provider.name}: {exc}')
+        if len(errors) == len(self._routes):
+            raise RuntimeError('; '.join(errors))
+
+    def close(self) -> None:
+        for route in self._routes:
+            route.provider.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            'hedges': self.hedges,
+            'timeouts': self.timeouts,
+            'providers': [route.stats() for route in self._routes],
+        }
@@ -1,21 +1,36 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.api.routes import chains, demo, health, jobs, query, rag, stream, ui
-from app.background.tasks import job_worker
+from app.api.rate_limit import rate_limited
+from app.api.routes import admin, chains, demo, health, jobs, query, rag, stream, ui
+from app.background.tasks import drain_coordinator, job_spool, job_worker
+from app.chains.state import shutdown_orchestrator
+from app.core.cancellation import DeadlineExceeded, RequestCancelled
 from app.core.config import settings
 from app.core.logging import setup_logging
-from app.rag.state import index_documents
+from app.llm.lifecycle import provider_monitor
+from app.rag.state import get_watcher, index_documents
 
 setup_logging()
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     await job_worker.start()
+    # Pick up jobs a previous instance handed off while draining.
+    if job_spool is not None:
+        restored = await job_worker.restore(job_spool)
+        if restored:
+            logger.info("Restored %d jobs handed off by a previous instance", restored)
+    # Build, warm up and start probing the LLM provider before taking traffic.
+    await provider_monitor.start()
 
     # Phase 5: Best-effort warm index build for RAG startup convenience.
     try:
@@ -23,22 +38,44 @@ async def lifespan(_: FastAPI):
     except Exception:
         pass
 
+    # Optional: keep indexes fresh as files in the collections' data dirs change.
+    if settings.rag_watch_enabled:
+        get_watcher().start()
+
     try:
         yield
     finally:
-        await job_worker.stop()
+        # Joins a drain already started through /admin/drain.
+        await drain_coordinator.drain(settings.shutdown_grace_seconds, reason="shutdown")
+        if settings.rag_watch_enabled:
+            await asyncio.to_thread(get_watcher().stop)
+        await provider_monitor.stop()
+        shutdown_orchestrator()
 
 
 app = FastAPI(title=f"{settings.app_name} - Phase 6", lifespan=lifespan)
 
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(_: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded", "stage": exc.stage})
+
+
+@app.exception_handler(RequestCancelled)
+async def request_cancelled_handler(_: Request, exc: RequestCancelled):
+    # 499: the client went away (nginx's "client closed request"); nobody reads this body.
+    return JSONResponse(status_code=499, content={"detail": exc.reason, "stage": exc.stage})
+
+
 frontend_dir = Path(__file__).resolve().parent / "frontend"
 app.mount("/ui", StaticFiles(directory=str(frontend_dir)), name="ui-static")
 
 app.include_router(ui.router)
 app.include_router(health.router, prefix="/health", tags=["health"])
 app.include_router(demo.router, prefix="/demo", tags=["demo"])
-app.include_router(query.router, prefix="/query", tags=["query"])
-app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
-app.include_router(stream.router, prefix="/stream", tags=["stream"])
-app.include_router(rag.router, prefix="/rag", tags=["rag"])
-app.include_router(chains.router, prefix="/chains", tags=["chains"])
+app.include_router(query.router, prefix="/query", tags=["query"], dependencies=[rate_limited("query")])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"], dependencies=[rate_limited("jobs")])
+app.include_router(stream.router, prefix="/stream", tags=["stream"], dependencies=[rate_limited("stream")])
+app.include_router(rag.router, prefix="/rag", tags=["rag"], dependencies=[rate_limited("rag")])
+app.include_router(chains.router, prefix="/chains", tags=["chains"], dependencies=[rate_limited("chains")])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Callable, Sequence
+
+from app.core.config import settings
+from app.rag.retriever import RagRetriever
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+
+class UnknownCollectionError(KeyError):
+    pass
+
+
+@dataclass
+class CollectionConfig:
+    """Everything that differs between tenants: sources, chunking, embeddings and index files."""
+
+    name: str
+    data_dir: str
+    vector_store_path: str
+    chunk_size: int | None = None
+    chunk_overlap: int | None = None
+    chunking: str | None = None
+    embedding_dimension: int | None = None
+    quantization: str | None = None
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> CollectionConfig:
+        known = {item.name for item in fields(cls)}
+        return cls(**{key: value for key, value in payload.items() if key in known})
+
+
+def default_collection_config() -> CollectionConfig:
+    """The collection served before named collections existed, configured by the global settings."""
+    return CollectionConfig(
+        name=settings.rag_default_collection,
+        data_dir=settings.rag_data_dir,
+        vector_store_path=settings.vector_store_path,
+    )
+
+
+class CollectionManager:
+    """Registry of named collections whose retrievers are loaded lazily and evicted LRU-first.
+
+    A collection is evicted when more than ``max_loaded`` are resident or their estimated memory
+    exceeds ``memory_budget_bytes``; the most recently used one always stays. Evicting only drops
+    the reference, so requests still holding the retriever finish normally; the factory must hand
+    a reload the store instance such a holder still writes through (``app.rag.state`` does).
+
+    A named collection's data dir and index files must resolve (symlinks followed) under
+    ``collections_dir`` or one of ``allowed_roots``, so a client cannot index or delete arbitrary
+    server paths.
+    """
+
+    def __init__(
+        self,
+        registry_path: str,
+        collections_dir: str,
+        factory: Callable[[CollectionConfig], RagRetriever],
+        max_loaded: int = 8,
+        memory_budget_bytes: int = 512 * 1024 * 1024,
+        allowed_roots: Sequence[str] = (),
+    ) -> None:
+        self._registry_path = Path(registry_path)
+        self._collections_dir = Path(collections_dir)
+        self._allowed_roots = [self._collections_dir.resolve(), *(Path(root).resolve() for root in allowed_roots)]
+        self._factory = factory
+        self._max_loaded = max(1, max_loaded)
+        self._memory_budget_bytes = memory_budget_bytes
+        self._lock = threading.Lock()
+        self._configs: dict[str, CollectionConfig] = {}
+        self._loaded: OrderedDict[str, RagRetriever] = OrderedDict()
+        self._load_lock = threading.Lock()
+        self.evictions = 0
+        self._load_registry()
+
+    def _load_registry(self) -> None:
+        default = default_collection_config()
+        configs = {default.name: default}
+        if self._registry_path.exists():
+            payload = json.loads(self._registry_path.read_text(encoding='utf-8'))
+            for item in payload.get('collections', []):
+                config = CollectionConfig.from_dict(item)
+                if config.name == default.name:
+                    continue
+                try:
+                    self._check_confined('data_dir', config.data_dir)
+                    self._check_confined('vector_store_path', config.vector_store_path)
+                except ValueError as exc:
+                    logger.warning('Ignoring registered collection %r: %s', config.name, exc)
+                    continue
+                configs[config.name] = config
+        self._configs = configs
+
+    def _save_registry(self) -> None:
+        named = [asdict(config) for name, config in self._configs.items() if name != settings.rag_default_collection]
+        self._registry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._registry_path.with_name(self._registry_path.name + '.tmp')
+        tmp_path.write_text(json.dumps({'collections': named}, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self._registry_path)
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return list(self._configs)
+
+    def config(self, name: str) -> CollectionConfig:
+        with self._lock:
+            config = self._configs.get(name)
+        if config is None:
+            raise UnknownCollectionError(name)
+        return config
+
+    def default_store_path(self, name: str) -> str:
+        return str(self._collections_dir / name / 'vector_store.json')
+
+    def _check_confined(self, label: str, path: str) -> None:
+        resolved = Path(path).resolve()
+        if not any(resolved.is_relative_to(root) for root in self._allowed_roots):
+            raise ValueError(f'{label} must be inside {", ".join(str(root) for root in self._allowed_roots)}')
+
+    def register(self, config: CollectionConfig) -> None:
+        if not COLLECTION_NAME_PATTERN.match(config.name):
+            raise ValueError(f'Invalid collection name: {config.name!r}')
+        if config.name == settings.rag_default_collection:
+            raise ValueError('The default collection is configured through settings')
+        self._check_confined('data_dir', config.data_dir)
+        self._check_confined('vector_store_path', config.vector_store_path)
+
+        with self._lock:
+            self._configs[config.name] = config
+            # A changed config (e.g. another embedding dimension) needs a fresh retriever.
+            self._loaded.pop(config.name, None)
+            self._save_registry()
+
+    def remove(self, name: str, delete_files: bool = False) -> None:
+        if name == settings.rag_default_collection:
+            raise ValueError('The default collection cannot be removed')
+
+        with self._lock:
+            config = self._configs.get(name)
+            if config is None:
+                raise UnknownCollectionError(name)
+            if delete_files:
+                # Also guards entries registered before paths were confined.
+                self._check_confined('vector_store_path', config.vector_store_path)
+            del self._configs[name]
+            self._loaded.pop(name, None)
+            self._save_registry()
+
+        if delete_files:
+            store_path = Path(config.vector_store_path).resolve()
+            managed_dir = (self._collections_dir / name).resolve()
+            if store_path.parent == managed_dir:
+                shutil.rmtree(managed_dir, ignore_errors=True)
+            else:
+                for path in store_path.parent.glob(f'{store_path.stem}.*'):
+                    if path.is_dir():
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        path.unlink(missing_ok=True)
+
+    def get(self, name: str) -> RagRetriever:
+        with self._lock:
+            retriever = self._loaded.get(name)
+            if retriever is not None:
+                self._loaded.move_to_end(name)
+                return retriever
+            if name not in self._configs:
+                raise UnknownCollectionError(name)
+
+        # Loading reads index files from disk; it is serialized but does not block lookups
+        # of collections that are already resident.
+        with self._load_lock:
+            with self._lock:
+                retriever = self._loaded.get(name)
+                config = self._configs.get(name)
+            if retriever is None:
+                if config is None:
+                    raise UnknownCollectionError(name)
+                retriever = self._factory(config)
+
+            evicted: list[RagRetriever] = []
+            with self._lock:
+                if self._configs.get(name) is config:
+                    self._loaded[name] = retriever
+                    self._loaded.move_to_end(name)
+                    evicted = self._evict_locked()
+            for item in evicted:
+                item.flush()
+            return retriever
+
+    def _evict_locked(self) -> list[RagRetriever]:
+        evicted: list[RagRetriever] = []
+        while len(self._loaded) > 1:
+            used = sum(retriever.estimated_memory_bytes for retriever in self._loaded.values())
+            if len(self._loaded) <= self._max_loaded and used <= self._memory_budget_bytes:
+                break
+            _, retriever = self._loaded.popitem(last=False)
+            evicted.append(retriever)
+            self.evictions += 1
+        return evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = {
+                name: {
+                    'indexed_chunks': retriever.index_size,
+                    'estimated_memory_bytes': retriever.estimated_memory_bytes,
+                }
+                for name, retriever in self._loaded.items()
+            }
+            return {
+                'collections': list(self._configs),
+                'loaded': loaded,
+                'max_loaded': self._max_loaded,
+                'memory_budget_bytes': self._memory_budget_bytes,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import math
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+from app.rag.embeddings import TOKEN_PATTERN
+from app.rag.vector_store import RetrievalResult
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_PIECE_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+class BaseTokenCounter(ABC):
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        raise NotImplementedError
+
+
+class HeuristicTokenCounter(BaseTokenCounter):
+    """Estimate BPE tokens from word/punctuation pieces; long words cost one token per 4 chars."""
+
+    @property
+    def name(self) -> str:
+        return 'heuristic'
+
+    def count(self, text: str) -> int:
+        return sum(max(1, math.ceil(len(piece) / 4)) for piece in _PIECE_PATTERN.findall(text))
+
+
+class TiktokenCounter(BaseTokenCounter):
+    def __init__(self, encoding: str = 'cl100k_base') -> None:
+        import tiktoken
+
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    @property
+    def name(self) -> str:
+        return f'tiktoken:{self._encoding.name}'
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+def build_token_counter() -> BaseTokenCounter:
+    if settings.rag_context_tokenizer.lower() == 'tiktoken':
+        try:
+            return TiktokenCounter()
+        except Exception:
+            pass
+
+    # Safe fallback when tiktoken is not installed or an unknown tokenizer is configured.
+    return HeuristicTokenCounter()
+
+
+@dataclass
+class ContextBlock:
+    source_path: str
+    chunk_indexes: list[int]
+    text: str
+    score: float
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    blocks: list[ContextBlock] = field(default_factory=list)
+
+
+def _overlap_len(left: str, right: str, limit: int) -> int:
+    """Length of the longest suffix of ``left`` that is also a prefix of ``right``."""
+    for size in range(min(len(left), len(right), limit), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_results(results: list[RetrievalResult], max_overlap: int) -> list[ContextBlock]:
+    """Merge chunks that are adjacent in the same source, dropping the text they share.
+
+    Blocks keep the retrieval order of their best chunk, which in hybrid mode is the fused ranking
+    rather than the cosine ``score``.
+    """
+    by_source: dict[str, list[RetrievalResult]] = {}
+    rank_of = {id(res): rank for rank, res in enumerate(results)}
+    for res in results:
+        by_source.setdefault(str(res.metadata.get('source_path', 'unknown')), []).append(res)
+
+    blocks: list[ContextBlock] = []
+    block_rank: dict[int, int] = {}
+    for source, items in by_source.items():
+        seen: set[int] = set()
+        ordered = sorted(items, key=lambda item: item.metadata.get('chunk_index', -1))
+        current: ContextBlock | None = None
+        for res in ordered:
+            idx = res.metadata.get('chunk_index')
+            if idx in seen:
+                continue
+            if idx is not None:
+                seen.add(idx)
+
+            if current is not None and idx is not None and current.chunk_indexes[-1] + 1 == idx:
+                shared = _overlap_len(current.text, res.text, max_overlap)
+                tail = res.text[shared:]
+                current.text = f'{current.text}{tail}' if shared else f'{current.text} {tail}'
+                current.chunk_indexes.append(idx)
+                current.score = max(current.score, res.score)
+                block_rank[id(current)] = min(block_rank[id(current)], rank_of[id(res)])
+                continue
+
+            current = ContextBlock(
+                source_path=source,
+                chunk_indexes=[idx] if idx is not None else [],
+                text=res.text,
+                score=res.score,
+            )
+            blocks.append(current)
+            block_rank[id(current)] = rank_of[id(res)]
+            if idx is None:
+                current = None
+
+    blocks.sort(key=lambda block: block_rank[id(block)])
+    return blocks
+
+
+class ContextPacker:
+    """Pack retrieved chunks into a prompt context under a token budget."""
+
+    def __init__(self, counter: BaseTokenCounter | None = None) -> None:
+        self._counter = counter or build_token_counter()
+
+    @property
+    def tokenizer_name(self) -> str:
+        return self._counter.name
+
+    def pack(
+        self,
+        query: str,
+        results: list[RetrievalResult],
+        max_tokens: int,
+        max_chars: int | None = None,
+        sentence_filter: bool | None = None,
+    ) -> PackedContext:
+        if sentence_filter is None:
+            sentence_filter = settings.rag_context_sentence_filter
+        query_terms = set(TOKEN_PATTERN.findall(query.lower()))
+        blocks = merge_results(results, max_overlap=max(settings.rag_chunk_overlap, 1) * 2)
+
+        lines: list[str] = []
+        packed: list[ContextBlock] = []
+        tokens_used = 0
+        chars_used = 0
+        for block in blocks:
+            header = self._header(len(packed) + 1, block)
+            text = self._best_sentences(block.text, query_terms) if sentence_filter else block.text
+            tokens_left = max_tokens - tokens_used - self._counter.count(header) - 1
+            chars_left = (max_chars - chars_used - len(header) - 1) if max_chars is not None else None
+            if tokens_left <= 0 or (chars_left is not None and chars_left <= 0):
+                continue
+
+            if self._counter.count(text) > tokens_left or (chars_left is not None and len(text) > chars_left):
+                # A long block should not crowd out shorter ones: keep its best sentences instead.
+                text = self._best_sentences(text, query_terms, tokens_left, chars_left)
+                if not text:
+                    continue
+
+            line = f'{header} {text}'
+            lines.append(line)
+            packed.append(block)
+            tokens_used += self._counter.count(line) + 1
+            chars_used += len(line) + 1
+
+        context = '\n'.join(lines)
+        return PackedContext(text=context, tokens=self._counter.count(context), blocks=packed)
+
+    @staticmethod
+    def _header(position: int, block: ContextBlock) -> str:
+        chunks = ','.join(str(idx) for idx in block.chunk_indexes)
+        return f'[{position}] (score={block.score:.3f}, source={block.source_path}, chunks={chunks})'
+
+    def _best_sentences(
+        self,
+        text: str,
+        query_terms: set[str],
+        tokens_left: int | None = None,
+        chars_left: int | None = None,
+    ) -> str:
+        """Keep the sentences sharing most terms with the query, in their original order.
+
+        Without a budget, sentences with no query term are dropped (the best one is always kept).
+        With a budget, the best sentences that fit are kept.
+        """
+        sentences = [sentence for sentence in _SENTENCE_SPLIT.split(text) if sentence]
+        overlaps = [len(query_terms & set(TOKEN_PATTERN.findall(sentence.lower()))) for sentence in sentences]
+        ranked = sorted(range(len(sentences)), key=lambda i: overlaps[i], reverse=True)
+
+        chosen: list[int] = []
+        tokens = 0
+        chars = -1
+        for i in ranked:
+            if tokens_left is None:
+                if overlaps[i] == 0 and chosen:
+                    break
+                chosen.append(i)
+                continue
+
+            cost_tokens = self._counter.count(sentences[i])
+            cost_chars = len(sentences[i]) + 1
+            if tokens + cost_tokens > tokens_left or (chars_left is not None and chars + cost_chars > chars_left):
+                continue
+            chosen.append(i)
+            tokens += cost_tokens
+            chars += cost_chars
+
+        if not chosen and tokens_left is not None and ranked:
+            return self._truncate(sentences[ranked[0]], tokens_left, chars_left)
+        return ' '.join(sentences[i] for i in sorted(chosen))
+
+    def _truncate(self, text: str, tokens_left: int, chars_left: int | None) -> str:
+        # Fragments shorter than this are noise rather than context.
+        if tokens_left < 16:
+            return ''
+        cut = min(len(text), tokens_left * 4, chars_left if chars_left is not None else len(text))
+        while cut > 0 and self._counter.count(text[:cut]) > tokens_left:
+            cut = int(cut * 0.8)
+        return text[:cut].rstrip()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; MMR falls back to pure Python.
+    np = None
+
+
+def _relevance(scores: list[float]) -> list[float]:
+    # Divided by the best score, so fused hybrid scores (tiny reciprocal ranks) and cosine scores
+    # weigh the same against the similarity penalty without exaggerating small score gaps.
+    scale = max(abs(score) for score in scores)
+    if scale <= 1e-12:
+        return [1.0] * len(scores)
+    return [score / scale for score in scores]
+
+
+def mmr_select(scores: list[float], embeddings: list[list[float]], top_k: int, mmr_lambda: float) -> list[int]:
+    """Maximal Marginal Relevance: indices of ``top_k`` candidates, each maximizing
+    ``lambda * relevance - (1 - lambda) * max cosine similarity to the ones already picked``.
+
+    ``lambda = 1`` keeps the original ranking; lower values trade relevance for diversity.
+    """
+    count = len(scores)
+    if count == 0:
+        return []
+    top_k = min(top_k, count)
+    relevance = _relevance(scores)
+
+    if np is not None:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        unit = vectors / norms
+        # All pairwise similarities in one matrix product.
+        similarity = unit @ unit.T
+        gains = mmr_lambda * np.asarray(relevance, dtype=np.float32)
+        penalty = np.full(count, -np.inf, dtype=np.float32)
+        available = np.ones(count, dtype=bool)
+        picked: list[int] = []
+        for _ in range(top_k):
+            if picked:
+                marginal = gains - (1.0 - mmr_lambda) * penalty
+            else:
+                marginal = gains.copy()
+            marginal[~available] = -np.inf
+            best = int(np.argmax(marginal))
+            picked.append(best)
+            available[best] = False
+            penalty = np.maximum(penalty, similarity[best])
+        return picked
+
+    unit_rows = []
+    for vector in embeddings:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        unit_rows.append([x / norm for x in vector])
+    penalty_of = [-math.inf] * count
+    remaining = list(range(count))
+    picked = []
+    for _ in range(top_k):
+        best = max(
+            remaining,
+            key=lambda idx: mmr_lambda * relevance[idx] - (1.0 - mmr_lambda) * penalty_of[idx]
+            if picked
+            else relevance[idx],
+        )
+        picked.append(best)
+        remaining.remove(best)
+        chosen = unit_rows[best]
+        for idx in remaining:
+            similarity = sum(a * b for a, b in zip(chosen, unit_rows[idx]))
+            if similarity > penalty_of[idx]:
+                penalty_of[idx] = similarity
+    return picked
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import os
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+# Each entry on disk: key length, component count, the UTF-8 key, then float32 components, all in
+# native byte order like the vector store's row file.
+_HEADER = struct.Struct('=HI')
+# Per-entry overhead besides the components: the key string, its dict slot and the array header.
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+class EmbeddingCache:
+    """Content-addressed embeddings keyed by (model, dimension, text hash).
+
+    Vectors are held as packed float32 arrays and persisted to an append-only binary file: a save
+    writes only the entries added since the last one, and the file is rewritten from memory once
+    evicted and replaced entries make it twice the size of the cache. A torn tail left by a crash
+    is cut off on load.
+    """
+
+    def __init__(self, path: str | None, max_entries: int = 20_000) -> None:
+        self._path = Path(path) if path else None
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries: OrderedDict[str, array] = OrderedDict()
+        # Keys put since the last save (a dict, as an insertion-ordered set).
+        self._unsaved: dict[str, None] = {}
+        self._file_entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    @staticmethod
+    def _key(model_name: str, dimension: int, text_hash: str) -> str:
+        return f'{model_name}:{dimension}:{text_hash}'
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def estimated_bytes(self) -> int:
+        with self._lock:
+            return sum(len(emb) * emb.itemsize + _ENTRY_OVERHEAD_BYTES for emb in self._entries.values())
+
+    def get_many(self, model_name: str, dimension: int, text_hashes: list[str]) -> list[list[float] | None]:
+        found: list[list[float] | None] = []
+        with self._lock:
+            for text_hash in text_hashes:
+                key = self._key(model_name, dimension, text_hash)
+                emb = self._entries.get(key)
+                if emb is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    found.append(emb.tolist())
+        return found
+
+    def put_many(self, model_name: str, dimension: int, items: list[tuple[str, list[float]]]) -> None:
+        if not items:
+            return
+
+        with self._lock:
+            for text_hash, emb in items:
+                key = self._key(model_name, dimension, text_hash)
+                self._entries[key] = array('f', emb)
+                self._entries.move_to_end(key)
+                self._unsaved[key] = None
+            while len(self._entries) > self._max_entries:
+                key, _ = self._entries.popitem(last=False)
+                self._unsaved.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def save(self) -> None:
+        if self._path is None:
+            return
+
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved:
+                    return
+                unsaved, self._unsaved = self._unsaved, {}
+                rewrite = self._file_entries + len(unsaved) > 2 * self._max_entries
+                if rewrite:
+                    entries = list(self._entries.items())
+                else:
+                    entries = [(key, self._entries[key]) for key in unsaved if key in self._entries]
+
+            try:
+                if rewrite:
+                    self._rewrite(entries)
+                else:
+                    self._append(entries)
+            except BaseException:
+                # Keep the entries pending so the next save writes them.
+                with self._lock:
+                    self._unsaved = {**unsaved, **self._unsaved}
+                raise
+
+            with self._lock:
+                self._file_entries = len(entries) if rewrite else self._file_entries + len(entries)
+
+    def _append(self, entries: list[tuple[str, array]]) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._path.open('ab') as handle:
+            _write_entries(handle, entries)
+
+    def _rewrite(self, entries: list[tuple[str, array]]) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(self._path.name + '.tmp')
+        with tmp_path.open('wb') as handle:
+            _write_entries(handle, entries)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, self._path)
+
+    def load(self) -> None:
+        if self._path is None or not self._path.exists():
+            return
+
+        entries: OrderedDict[str, array] = OrderedDict()
+        count = 0
+        good_bytes = 0
+        with self._path.open('rb') as handle:
+            while True:
+                header = handle.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                key_length, components = _HEADER.unpack(header)
+                key_bytes = handle.read(key_length)
+                data = handle.read(components * 4)
+                if len(key_bytes) < key_length or len(data) < components * 4:
+                    break
+                try:
+                    key = key_bytes.decode('utf-8')
+                except UnicodeDecodeError:
+                    # A damaged cache only costs re-embedding: keep what was read before it.
+                    break
+                emb = array('f')
+                emb.frombytes(data)
+                entries[key] = emb
+                entries.move_to_end(key)
+                count += 1
+                good_bytes = handle.tell()
+
+        if good_bytes < self._path.stat().st_size:
+            # Cut the torn or damaged tail so later appends start on an entry boundary.
+            with self._path.open('r+b') as handle:
+                handle.truncate(good_bytes)
+
+        while len(entries) > self._max_entries:
+            entries.popitem(last=False)
+        with self._lock:
+            self._entries = entries
+            self._unsaved = {}
+            self._file_entries = count
+
+
+def _write_entries(handle, entries: list[tuple[str, array]]) -> None:
+    for key, emb in entries:
+        key_bytes = key.encode('utf-8')
+        handle.write(_HEADER.pack(len(key_bytes), len(emb)))
+        handle.write(key_bytes)
+        handle.write(emb.tobytes())
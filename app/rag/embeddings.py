@@ -61,10 +61,12 @@ class HashingEmbeddingModel(BaseEmbeddingModel):
         return [x / norm for x in vec]
 
 
-def build_embedding_model() -> BaseEmbeddingModel:
+def build_embedding_model(dimension: int | None = None) -> BaseEmbeddingModel:
+    dimension = dimension or settings.embedding_dimension
+
     # Keep this pluggable for future model upgrades (OpenAI/HF/Gemini embeddings).
     if settings.embedding_model.lower() == 'hashing-embed-v1':
-        return HashingEmbeddingModel(dimension=settings.embedding_dimension)
+        return HashingEmbeddingModel(dimension=dimension)
 
     # Safe fallback to avoid startup failure if unsupported model name is configured.
-    return HashingEmbeddingModel(dimension=settings.embedding_dimension)
+    return HashingEmbeddingModel(dimension=dimension)
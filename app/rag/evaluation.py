@@ -1,8 +1,17 @@
 from __future__ import annotations
 
+import math
+import re
+import time
 from dataclasses import dataclass
+from typing import Callable
 
+from app.core.config import settings
 from app.rag.retriever import RagRetriever
+from app.rag.state import build_scratch_retriever
+from app.rag.vector_store import RetrievalResult
+
+ProgressCallback = Callable[[int, int], None]
 
 
 @dataclass
@@ -16,38 +25,173 @@ class RetrievalEvalResult:
     query: str
     found: bool
     top_match_score: float
+    recall_at_k: float
+    reciprocal_rank: float
+    ndcg: float
+    latency_ms: float
+
+
+def _compile_terms(terms: list[str]) -> re.Pattern | None:
+    cleaned = {term.lower() for term in terms if term}
+    if not cleaned:
+        return None
+    return re.compile('|'.join(re.escape(term) for term in cleaned))
+
+
+def _score_case(case: RetrievalEvalCase, retrieved: list[RetrievalResult]) -> tuple[bool, float, float, float]:
+    """Return (found, recall@k, reciprocal rank, nDCG) for one case using binary term relevance."""
+    pattern = _compile_terms(case.expected_terms)
+    if pattern is None or not retrieved:
+        return False, 0.0, 0.0, 0.0
+
+    texts = [item.text.lower() for item in retrieved]
+    relevant = [pattern.search(text) is not None for text in texts]
+    expected = {term.lower() for term in case.expected_terms if term}
+    matched = sum(1 for term in expected if any(term in text for text in texts))
+
+    first_rank = next((rank for rank, rel in enumerate(relevant, start=1) if rel), None)
+    reciprocal_rank = (1.0 / first_rank) if first_rank else 0.0
 
+    dcg = sum(1.0 / math.log2(rank + 1) for rank, rel in enumerate(relevant, start=1) if rel)
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, sum(relevant) + 1))
+    ndcg = (dcg / ideal) if ideal else 0.0
 
-def evaluate_retrieval(retriever: RagRetriever, cases: list[RetrievalEvalCase], top_k: int) -> dict:
+    recall = matched / len(expected)
+    return first_rank is not None, recall, reciprocal_rank, ndcg
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def evaluate_retrieval(
+    retriever: RagRetriever,
+    cases: list[RetrievalEvalCase],
+    top_k: int,
+    batch_size: int | None = None,
+    progress: ProgressCallback | None = None,
+) -> dict:
+    batch_size = max(1, batch_size or settings.rag_eval_batch_size)
     results: list[RetrievalEvalResult] = []
 
-    for case in cases:
-        retrieved = retriever.retrieve(case.query, top_k=top_k)
-        combined_text = ' '.join(item.text.lower() for item in retrieved)
-        found = any(term.lower() in combined_text for term in case.expected_terms)
-        top_score = retrieved[0].score if retrieved else 0.0
-        results.append(
-            RetrievalEvalResult(
-                query=case.query,
-                found=found,
-                top_match_score=top_score,
+    for start in range(0, len(cases), batch_size):
+        batch = cases[start : start + batch_size]
+        started = time.perf_counter()
+        retrieved_batch = retriever.retrieve_many([case.query for case in batch], top_k=top_k)
+        # Retrieval is batched, so each case is charged an equal share of the batch time.
+        shared_ms = (time.perf_counter() - started) * 1000 / len(batch)
+
+        for case, retrieved in zip(batch, retrieved_batch):
+            match_started = time.perf_counter()
+            found, recall, rr, ndcg = _score_case(case, retrieved)
+            match_ms = (time.perf_counter() - match_started) * 1000
+            results.append(
+                RetrievalEvalResult(
+                    query=case.query,
+                    found=found,
+                    top_match_score=retrieved[0].score if retrieved else 0.0,
+                    recall_at_k=recall,
+                    reciprocal_rank=rr,
+                    ndcg=ndcg,
+                    latency_ms=shared_ms + match_ms,
+                )
             )
-        )
+
+        if progress:
+            progress(len(results), len(cases))
 
     total = len(results)
     hits = sum(1 for r in results if r.found)
     hit_rate = (hits / total) if total else 0.0
+    latencies = [r.latency_ms for r in results]
+
+    def mean(values: list[float]) -> float:
+        return round(sum(values) / total, 4) if total else 0.0
 
     return {
         'cases': total,
         'hits': hits,
         'hit_rate': round(hit_rate, 4),
+        'recall_at_k': mean([r.recall_at_k for r in results]),
+        'mrr': mean([r.reciprocal_rank for r in results]),
+        'ndcg': mean([r.ndcg for r in results]),
+        'latency_ms': {
+            'avg': mean(latencies),
+            'p50': round(_percentile(latencies, 50), 4),
+            'p95': round(_percentile(latencies, 95), 4),
+        },
         'details': [
             {
                 'query': r.query,
                 'found_expected_term': r.found,
                 'top_match_score': round(r.top_match_score, 4),
+                'recall_at_k': round(r.recall_at_k, 4),
+                'reciprocal_rank': round(r.reciprocal_rank, 4),
+                'ndcg': round(r.ndcg, 4),
+                'latency_ms': round(r.latency_ms, 4),
             }
             for r in results
         ],
     }
+
+
+def compare_retrieval(
+    baseline: RagRetriever,
+    candidate: RagRetriever,
+    cases: list[RetrievalEvalCase],
+    top_k: int,
+    batch_size: int | None = None,
+    progress: ProgressCallback | None = None,
+) -> dict:
+    total = len(cases)
+
+    def scaled(offset: int) -> ProgressCallback | None:
+        if progress is None:
+            return None
+        return lambda done, _: progress(offset + done, 2 * total)
+
+    base_report = evaluate_retrieval(baseline, cases, top_k, batch_size=batch_size, progress=scaled(0))
+    cand_report = evaluate_retrieval(candidate, cases, top_k, batch_size=batch_size, progress=scaled(total))
+
+    delta_keys = ('hit_rate', 'recall_at_k', 'mrr', 'ndcg')
+    return {
+        'baseline': base_report,
+        'candidate': cand_report,
+        'delta': {key: round(cand_report[key] - base_report[key], 4) for key in delta_keys},
+    }
+
+
+def benchmark_chunking(
+    cases: list[RetrievalEvalCase],
+    top_k: int,
+    strategies: list[str],
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    collection: str | None = None,
+) -> dict:
+    """Index the data dir once per chunking strategy and compare chunk counts and retrieval quality."""
+    report: dict[str, dict] = {}
+    for strategy in strategies:
+        started = time.perf_counter()
+        retriever = build_scratch_retriever(
+            chunk_size=chunk_size,
+            overlap=overlap,
+            strategy=strategy,
+            collection=collection,
+        )
+        index_seconds = time.perf_counter() - started
+        result = evaluate_retrieval(retriever, cases, top_k)
+        report[strategy] = {
+            'chunks': retriever.index_size,
+            'index_seconds': round(index_seconds, 4),
+            'hit_rate': result['hit_rate'],
+            'recall_at_k': result['recall_at_k'],
+            'mrr': result['mrr'],
+            'ndcg': result['ndcg'],
+            'latency_ms': result['latency_ms'],
+        }
+    return report
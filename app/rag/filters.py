@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import fnmatch
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+
+Scalar = str | int | float | bool
+
+
+@dataclass
+class RangeCondition:
+    gte: float | None = None
+    gt: float | None = None
+    lte: float | None = None
+    lt: float | None = None
+
+    def matches(self, value) -> bool:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        return (
+            (self.gte is None or value >= self.gte)
+            and (self.gt is None or value > self.gt)
+            and (self.lte is None or value <= self.lte)
+            and (self.lt is None or value < self.lt)
+        )
+
+
+@dataclass
+class MetadataFilter:
+    """Conjunction of conditions on record metadata.
+
+    ``source_path`` is a glob when it contains ``*``, ``?`` or ``[``, otherwise a path prefix.
+    """
+
+    source_path: str | None = None
+    equals: dict[str, Scalar] = field(default_factory=dict)
+    ranges: dict[str, RangeCondition] = field(default_factory=dict)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.source_path and not self.equals and not self.ranges
+
+    @property
+    def source_is_glob(self) -> bool:
+        return any(ch in (self.source_path or '') for ch in '*?[')
+
+    def matches(self, metadata: dict) -> bool:
+        source = str(metadata.get('source_path', ''))
+        if self.source_path:
+            if self.source_is_glob:
+                if not fnmatch.fnmatchcase(source, self.source_path):
+                    return False
+            elif not source.startswith(self.source_path):
+                return False
+        for name, expected in self.equals.items():
+            if metadata.get(name) != expected:
+                return False
+        return all(condition.matches(metadata.get(name)) for name, condition in self.ranges.items())
+
+
+class _FieldIndex:
+    """Posting sets per distinct value, plus a lazily sorted key list for prefix and range scans."""
+
+    __slots__ = ('postings', '_sorted', '_numeric')
+
+    def __init__(self) -> None:
+        self.postings: dict[Scalar, set[int]] = {}
+        self._sorted: list[str] | None = None
+        self._numeric: list[float] | None = None
+
+    def add(self, value: Scalar, pos: int) -> None:
+        postings = self.postings.get(value)
+        if postings is None:
+            postings = self.postings[value] = set()
+            self._sorted = None
+            self._numeric = None
+        postings.add(pos)
+
+    def discard(self, value: Scalar, pos: int) -> None:
+        postings = self.postings.get(value)
+        if postings is None:
+            return
+        postings.discard(pos)
+        if not postings:
+            del self.postings[value]
+            self._sorted = None
+            self._numeric = None
+
+    def prefix(self, prefix: str) -> list[set[int]]:
+        if self._sorted is None:
+            self._sorted = sorted(value for value in self.postings if isinstance(value, str))
+        start = bisect_left(self._sorted, prefix)
+        found = []
+        for value in self._sorted[start:]:
+            if not value.startswith(prefix):
+                break
+            found.append(self.postings[value])
+        return found
+
+    def glob(self, pattern: str) -> list[set[int]]:
+        # Distinct values (e.g. source files) are far fewer than records, so matching them is cheap.
+        return [
+            postings
+            for value, postings in self.postings.items()
+            if isinstance(value, str) and fnmatch.fnmatchcase(value, pattern)
+        ]
+
+    def range(self, condition: RangeCondition) -> list[set[int]]:
+        if self._numeric is None:
+            self._numeric = sorted(
+                value for value in self.postings if isinstance(value, (int, float)) and not isinstance(value, bool)
+            )
+        values = self._numeric
+        lo, hi = 0, len(values)
+        if condition.gte is not None:
+            lo = max(lo, bisect_left(values, condition.gte))
+        if condition.gt is not None:
+            lo = max(lo, bisect_right(values, condition.gt))
+        if condition.lte is not None:
+            hi = min(hi, bisect_right(values, condition.lte))
+        if condition.lt is not None:
+            hi = min(hi, bisect_left(values, condition.lt))
+        return [self.postings[value] for value in values[lo:hi]]
+
+
+class MetadataIndex:
+    """Inverted index over scalar metadata values, maintained on every upsert.
+
+    ``select`` resolves a filter to store positions before any vector is scored, so the cost of a
+    filtered search follows the number of matching records rather than the store size.
+    """
+
+    def __init__(self) -> None:
+        self._fields: dict[str, _FieldIndex] = {}
+
+    def clear(self) -> None:
+        self._fields = {}
+
+    def add(self, pos: int, metadata: dict) -> None:
+        for name, value in metadata.items():
+            if isinstance(value, (str, int, float, bool)):
+                index = self._fields.get(name)
+                if index is None:
+                    index = self._fields[name] = _FieldIndex()
+                index.add(value, pos)
+
+    def discard(self, pos: int, metadata: dict) -> None:
+        for name, value in metadata.items():
+            index = self._fields.get(name)
+            if index is not None and isinstance(value, (str, int, float, bool)):
+                index.discard(value, pos)
+
+    def select(self, metadata_filter: MetadataFilter) -> set[int]:
+        clauses: list[list[set[int]]] = []
+        if metadata_filter.source_path:
+            index = self._fields.get('source_path', _FieldIndex())
+            if metadata_filter.source_is_glob:
+                clauses.append(index.glob(metadata_filter.source_path))
+            else:
+                clauses.append(index.prefix(metadata_filter.source_path))
+        for name, expected in metadata_filter.equals.items():
+            postings = self._fields.get(name, _FieldIndex()).postings.get(expected)
+            clauses.append([postings] if postings else [])
+        for name, condition in metadata_filter.ranges.items():
+            clauses.append(self._fields.get(name, _FieldIndex()).range(condition))
+
+        # Intersect starting from the most selective clause.
+        clauses.sort(key=lambda sets: sum(len(postings) for postings in sets))
+        selected: set[int] | None = None
+        for sets in clauses:
+            if selected is None:
+                selected = set().union(*sets)
+            else:
+                selected = {pos for pos in selected if any(pos in postings for postings in sets)}
+            if not selected:
+                return set()
+        return selected if selected is not None else set()
@@ -3,8 +3,10 @@ from __future__ import annotations
 import hashlib
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator
 
 from app.core.config import settings
+from app.rag.splitters import build_splitter, iter_windows
 
 
 @dataclass
@@ -14,7 +16,11 @@ class SourceChunk:
     metadata: dict
 
 
-def _is_supported(path: Path) -> bool:
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def is_supported(path: Path) -> bool:
     return path.suffix.lower() in {'.txt', '.md', '.rst', '.py'}
 
 
@@ -23,56 +29,65 @@ def collect_documents(data_dir: str | None = None) -> list[Path]:
     if not root.exists():
         return []
 
-    paths = [p for p in root.rglob('*') if p.is_file() and _is_supported(p)]
+    paths = [p for p in root.rglob('*') if p.is_file() and is_supported(p)]
     paths.sort()
     return paths
 
 
 def chunk_text(text: str, chunk_size: int, overlap: int) -> list[str]:
     clean = ' '.join(text.split())
-    if not clean:
-        return []
-
-    if overlap >= chunk_size:
-        overlap = max(0, chunk_size // 4)
-
-    chunks: list[str] = []
-    start = 0
-    while start < len(clean):
-        end = min(start + chunk_size, len(clean))
-        chunks.append(clean[start:end])
-        if end == len(clean):
-            break
-        start = max(0, end - overlap)
+    return list(iter_windows([clean], chunk_size, overlap))
 
-    return chunks
 
-
-def build_chunks(
+def iter_chunks(
     data_dir: str | None = None,
     chunk_size: int | None = None,
     overlap: int | None = None,
-) -> list[SourceChunk]:
+    strategy: str | None = None,
+) -> Iterator[SourceChunk]:
+    """Lazily yield chunks for every supported file; memory stays bounded by the read buffer."""
     chunk_size = chunk_size or settings.rag_chunk_size
     overlap = overlap or settings.rag_chunk_overlap
 
-    chunks: list[SourceChunk] = []
     for path in collect_documents(data_dir=data_dir):
-        text = path.read_text(encoding='utf-8', errors='ignore')
-        parts = chunk_text(text=text, chunk_size=chunk_size, overlap=overlap)
+        yield from iter_file_chunks(path, chunk_size, overlap, strategy=strategy)
 
-        for idx, chunk in enumerate(parts):
-            raw_id = f'{path.as_posix()}::{idx}::{chunk}'
+
+def iter_file_chunks(
+    path: Path,
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    strategy: str | None = None,
+) -> Iterator[SourceChunk]:
+    """Chunks of a single file, with the same ids ``iter_chunks`` gives them in a full pass."""
+    chunk_size = chunk_size or settings.rag_chunk_size
+    overlap = overlap or settings.rag_chunk_overlap
+
+    splitter = build_splitter(path.suffix, strategy=strategy)
+    with path.open('r', encoding='utf-8', errors='ignore') as handle:
+        seen: dict[str, int] = {}
+        for idx, chunk in enumerate(splitter.split(handle, chunk_size, overlap)):
+            # Identity comes from content rather than position, so edits elsewhere in the
+            # file keep unchanged chunks' ids stable. Repeats within a file get a counter.
+            text_hash = content_hash(chunk)
+            occurrence = seen.get(text_hash, 0)
+            seen[text_hash] = occurrence + 1
+            raw_id = f'{path.as_posix()}::{text_hash}::{occurrence}'
             chunk_id = hashlib.sha1(raw_id.encode('utf-8')).hexdigest()
-            chunks.append(
-                SourceChunk(
-                    chunk_id=chunk_id,
-                    text=chunk,
-                    metadata={
-                        'source_path': str(path),
-                        'chunk_index': idx,
-                    },
-                )
+            yield SourceChunk(
+                chunk_id=chunk_id,
+                text=chunk,
+                metadata={
+                    'source_path': str(path),
+                    'chunk_index': idx,
+                    'content_hash': text_hash,
+                },
             )
 
-    return chunks
+def build_chunks(
+    data_dir: str | None = None,
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    strategy: str | None = None,
+) -> list[SourceChunk]:
+    return list(iter_chunks(data_dir=data_dir, chunk_size=chunk_size, overlap=overlap, strategy=strategy))
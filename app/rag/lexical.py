@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable
+
+from app.rag.embeddings import TOKEN_PATTERN
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class _Postings:
+    """Doc ids in ascending order with their term frequencies, stored as compact C arrays.
+
+    ``live`` counts the postings of documents not tombstoned: the term's document frequency.
+    """
+
+    __slots__ = ('doc_ids', 'tfs', 'max_tf', 'live')
+
+    def __init__(self) -> None:
+        self.doc_ids = array('I')
+        self.tfs = array('I')
+        self.max_tf = 0
+        self.live = 0
+
+    def append(self, doc: int, tf: int) -> None:
+        self.doc_ids.append(doc)
+        self.tfs.append(tf)
+        self.live += 1
+        if tf > self.max_tf:
+            self.max_tf = tf
+
+
+class Bm25Index:
+    """Inverted BM25 index with MaxScore dynamic pruning.
+
+    Documents get increasing internal ids, so postings stay sorted by appending. Re-indexing a
+    record tombstones its old id; tombstones are dropped by ``compact`` once they pile up.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self._k1 = k1
+        self._b = b
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._postings: dict[str, _Postings] = {}
+        self._doc_lengths = array('I')
+        self._live = bytearray()
+        # The distinct terms of each document, so tombstoning it can update their frequencies.
+        self._doc_terms: list[tuple[str, ...]] = []
+        self._record_ids: list[str] = []
+        self._doc_of: dict[str, int] = {}
+        self._total_length = 0
+        self._live_count = 0
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._live_count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def empty_copy(self) -> Bm25Index:
+        """A new, empty index with the same parameters, e.g. to rebuild into while this one serves."""
+        return Bm25Index(self._k1, self._b)
+
+    def add_many(self, docs: Iterable[tuple[str, str]]) -> None:
+        with self._lock:
+            for record_id, text in docs:
+                self._add(record_id, tokenize(text))
+            if len(self._record_ids) > 1024 and self._live_count < len(self._record_ids) // 2:
+                self._compact()
+
+    def remove(self, record_id: str) -> None:
+        with self._lock:
+            self._remove(record_id)
+
+    def compact(self) -> None:
+        with self._lock:
+            self._compact()
+
+    def _add(self, record_id: str, tokens: list[str]) -> None:
+        self._remove(record_id)
+        doc = len(self._record_ids)
+        self._record_ids.append(record_id)
+        self._doc_of[record_id] = doc
+        self._doc_lengths.append(len(tokens))
+        self._live.append(1)
+        self._total_length += len(tokens)
+        self._live_count += 1
+        counts = Counter(tokens)
+        self._doc_terms.append(tuple(counts))
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = _Postings()
+            postings.append(doc, tf)
+
+    def _remove(self, record_id: str) -> None:
+        doc = self._doc_of.pop(record_id, None)
+        if doc is None:
+            return
+        self._live[doc] = 0
+        self._total_length -= self._doc_lengths[doc]
+        self._live_count -= 1
+        for term in self._doc_terms[doc]:
+            self._postings[term].live -= 1
+        self._doc_terms[doc] = ()
+
+    def _compact(self) -> None:
+        remap = array('i', [-1]) * len(self._record_ids)
+        record_ids: list[str] = []
+        doc_lengths = array('I')
+        doc_terms: list[tuple[str, ...]] = []
+        for doc, record_id in enumerate(self._record_ids):
+            if self._live[doc]:
+                remap[doc] = len(record_ids)
+                record_ids.append(record_id)
+                doc_lengths.append(self._doc_lengths[doc])
+                doc_terms.append(self._doc_terms[doc])
+
+        postings: dict[str, _Postings] = {}
+        for term, old in self._postings.items():
+            fresh = _Postings()
+            for doc, tf in zip(old.doc_ids, old.tfs):
+                if remap[doc] >= 0:
+                    fresh.append(remap[doc], tf)
+            if fresh.doc_ids:
+                postings[term] = fresh
+
+        self._postings = postings
+        self._record_ids = record_ids
+        self._doc_lengths = doc_lengths
+        self._doc_terms = doc_terms
+        self._live = bytearray(b'\x01') * len(record_ids)
+        self._doc_of = {record_id: doc for doc, record_id in enumerate(record_ids)}
+
+    def search(self, query: str, top_k: int, allowed: set[str] | None = None) -> list[tuple[str, float]]:
+        """Return up to ``top_k`` (record_id, bm25 score) pairs, best first.
+
+        ``allowed`` restricts results to those record ids (e.g. the matches of a metadata filter).
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._live_count or allowed is not None and not allowed:
+                return []
+            return self._max_score(terms, max(1, top_k), allowed)
+
+    def _max_score(self, terms: set[str], k: int, allowed: set[str] | None = None) -> list[tuple[str, float]]:
+        n_docs = self._live_count
+        avg_len = self._total_length / n_docs or 1.0
+        k1, b = self._k1, self._b
+        doc_lengths = self._doc_lengths
+
+        scored_terms = []
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None or not postings.live:
+                continue
+            # Only live documents count: a re-added record's old postings must not inflate df.
+            df = postings.live
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            # tf / (tf + norm) grows with tf and shrinks with norm; norm is at least k1 * (1 - b).
+            upper = idf * (k1 + 1) * postings.max_tf / (postings.max_tf + k1 * (1 - b))
+            scored_terms.append((upper, idf, postings))
+        if not scored_terms:
+            return []
+
+        # MaxScore: terms sorted by upper bound; a prefix whose bounds sum to at most the current
+        # top-k threshold is "non-essential" and only probed for documents found via the rest.
+        scored_terms.sort(key=lambda item: item[0])
+        bounds = [item[0] for item in scored_terms]
+        prefix = [sum(bounds[: i + 1]) for i in range(len(bounds))]
+        cursors = [0] * len(scored_terms)
+        heap: list[tuple[float, int]] = []
+        threshold = 0.0
+        essential = 0
+
+        while True:
+            while essential < len(scored_terms) and prefix[essential] <= threshold:
+                essential += 1
+            if essential == len(scored_terms):
+                break
+
+            doc = -1
+            for i in range(essential, len(scored_terms)):
+                doc_ids = scored_terms[i][2].doc_ids
+                if cursors[i] < len(doc_ids) and (doc < 0 or doc_ids[cursors[i]] < doc):
+                    doc = doc_ids[cursors[i]]
+            if doc < 0:
+                break
+
+            live = self._live[doc] and (allowed is None or self._record_ids[doc] in allowed)
+            norm = k1 * (1 - b + b * doc_lengths[doc] / avg_len)
+            score = 0.0
+            for i in range(essential, len(scored_terms)):
+                _, idf, postings = scored_terms[i]
+                pos = cursors[i]
+                if pos < len(postings.doc_ids) and postings.doc_ids[pos] == doc:
+                    tf = postings.tfs[pos]
+                    score += idf * tf * (k1 + 1) / (tf + norm)
+                    cursors[i] = pos + 1
+            if not live:
+                continue
+
+            for i in range(essential - 1, -1, -1):
+                if score + prefix[i] <= threshold:
+                    break
+                _, idf, postings = scored_terms[i]
+                pos = bisect_left(postings.doc_ids, doc, cursors[i])
+                cursors[i] = pos
+                if pos < len(postings.doc_ids) and postings.doc_ids[pos] == doc:
+                    tf = postings.tfs[pos]
+                    score += idf * tf * (k1 + 1) / (tf + norm)
+
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -doc))
+            elif (score, -doc) > heap[0]:
+                heapq.heapreplace(heap, (score, -doc))
+            if len(heap) == k:
+                threshold = heap[0][0]
+
+        return [(self._record_ids[-neg_doc], score) for score, neg_doc in sorted(heap, reverse=True)]
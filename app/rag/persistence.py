@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write via a temp file, fsync and rename, so readers see either the old or the new file."""
+    atomic_write_chunks(path, [text])
+
+
+def atomic_write_chunks(path: Path, chunks: Iterable[str]) -> None:
+    """``atomic_write_text`` for text produced piece by piece, e.g. a large snapshot."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with tmp_path.open('w', encoding='utf-8') as handle:
+        handle.writelines(chunks)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path.parent)
+
+
+def _fsync_dir(directory: Path) -> None:
+    # Makes the rename itself durable; directories cannot be opened for fsync on Windows.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class InterProcessLock:
+    """Exclusive lock shared by every process (and thread) that opens the same lock file."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._thread_lock = threading.Lock()
+        self._handle = None
+
+    def __enter__(self) -> InterProcessLock:
+        self._thread_lock.acquire()
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = self._path.open('a+b')
+            if fcntl is not None:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+            else:
+                self._handle.seek(0)
+                # Blocks, retrying for about 10 seconds before raising OSError.
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+        except BaseException:
+            self._release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._release()
+
+    def _release(self) -> None:
+        if self._handle is not None:
+            if fcntl is None:
+                self._handle.seek(0)
+                try:
+                    msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+                except OSError:
+                    pass
+            # Closing the handle drops a flock.
+            self._handle.close()
+            self._handle = None
+        self._thread_lock.release()
+
+
+class WriteAheadLog:
+    """Append-only JSON-lines log of store operations, each tagged with an increasing ``seq``.
+
+    A snapshot records the last ``seq`` it contains; loading replays only newer entries, and
+    compaction drops the entries a snapshot already covers. A torn last line left by a crash is
+    ignored on replay.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._drop_torn_tail()
+        for entry in self._read():
+            self._last_seq = max(self._last_seq, entry['seq'])
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def last_seq(self) -> int:
+        with self._lock:
+            return self._last_seq
+
+    @property
+    def size_bytes(self) -> int:
+        try:
+            return self._path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def advance_to(self, seq: int) -> None:
+        """Never hand out a sequence number a loaded snapshot already claims."""
+        with self._lock:
+            self._last_seq = max(self._last_seq, seq)
+
+    def append(self, ops: list[dict]) -> int:
+        """Append a batch of operations with a single fsync; returns the last assigned seq."""
+        if not ops:
+            return self.last_seq
+
+        with self._lock:
+            first_seq = self._last_seq + 1
+            lines = [json.dumps({'seq': seq, **op}) for seq, op in enumerate(ops, start=first_seq)]
+            size = self.size_bytes
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                with self._path.open('a', encoding='utf-8') as handle:
+                    handle.write('\n'.join(lines) + '\n')
+                    handle.flush()
+                    os.fsync(handle.fileno())
+            except BaseException:
+                # Cut a partial write: replay stops at the first torn line, so a retry appended
+                # after it would be lost.
+                try:
+                    with self._path.open('r+b') as handle:
+                        handle.truncate(size)
+                except OSError:
+                    pass
+                raise
+            self._last_seq = first_seq + len(ops) - 1
+            return self._last_seq
+
+    def replay(self, after_seq: int = 0) -> Iterator[dict]:
+        with self._lock:
+            entries = [entry for entry in self._read() if entry['seq'] > after_seq]
+        yield from entries
+
+    def truncate_through(self, seq: int) -> None:
+        """Drop entries with ``seq`` <= the given one, keeping anything appended meanwhile."""
+        with self._lock:
+            kept = [json.dumps(entry) for entry in self._read() if entry['seq'] > seq]
+            if kept:
+                atomic_write_text(self._path, '\n'.join(kept) + '\n')
+            else:
+                self._path.unlink(missing_ok=True)
+
+    def _drop_torn_tail(self) -> None:
+        # A crash mid-append can leave a partial last line; cut it so new appends start clean.
+        if not self._path.exists():
+            return
+        with self._path.open('r+b') as handle:
+            data = handle.read()
+            if data and not data.endswith(b'\n'):
+                handle.truncate(data.rfind(b'\n') + 1)
+
+    def _read(self) -> list[dict]:
+        if not self._path.exists():
+            return []
+
+        entries = []
+        with self._path.open('r', encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Only the final append can be torn; nothing after it was acknowledged.
+                    break
+        return entries
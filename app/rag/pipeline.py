@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import asyncio
+import threading
+from typing import AsyncIterator
+
+from app.core.cancellation import await_cancellable
 from app.core.config import settings
-from app.llm.inference import run_completion, run_completion_sync
+from app.llm.inference import run_completion, run_completion_sync, stream_completion
+from app.rag.filters import MetadataFilter
 from app.rag.retriever import RagRetriever
+from app.rag.vector_store import RetrievalResult
 
 
 def build_grounded_prompt(user_prompt: str, context: str) -> str:
@@ -15,43 +22,100 @@ def build_grounded_prompt(user_prompt: str, context: str) -> str:
     )
 
 
-def rag_answer_sync(retriever: RagRetriever, prompt: str, top_k: int | None = None) -> dict:
+def retrieved_payload(results: list[RetrievalResult]) -> list[dict]:
+    return [
+        {
+            'score': round(item.score, 4),
+            'source_path': item.metadata.get('source_path'),
+            'chunk_index': item.metadata.get('chunk_index'),
+            'text': item.text,
+        }
+        for item in results
+    ]
+
+
+def rag_answer_sync(
+    retriever: RagRetriever,
+    prompt: str,
+    top_k: int | None = None,
+    metadata_filter: MetadataFilter | None = None,
+    mmr_lambda: float | None = None,
+    cancel_event: threading.Event | None = None,
+) -> dict:
     k = top_k or settings.rag_default_top_k
-    context, results = retriever.build_context(query=prompt, top_k=k)
-    grounded_prompt = build_grounded_prompt(prompt, context)
-    output = run_completion_sync(grounded_prompt)
+    packed, results = retriever.pack_context(
+        query=prompt,
+        top_k=k,
+        metadata_filter=metadata_filter,
+        mmr_lambda=mmr_lambda,
+        cancel_event=cancel_event,
+    )
+    grounded_prompt = build_grounded_prompt(prompt, packed.text)
+    output = run_completion_sync(grounded_prompt, cancel_event=cancel_event)
 
     return {
         'output': output,
-        'retrieved': [
-            {
-                'score': round(item.score, 4),
-                'source_path': item.metadata.get('source_path'),
-                'chunk_index': item.metadata.get('chunk_index'),
-                'text': item.text,
-            }
-            for item in results
-        ],
+        'retrieved': retrieved_payload(results),
         'used_top_k': k,
+        'context_tokens': packed.tokens,
     }
 
 
-async def rag_answer_async(retriever: RagRetriever, prompt: str, top_k: int | None = None) -> dict:
+async def rag_answer_async(
+    retriever: RagRetriever,
+    prompt: str,
+    top_k: int | None = None,
+    metadata_filter: MetadataFilter | None = None,
+    mmr_lambda: float | None = None,
+    cancel_event: threading.Event | None = None,
+) -> dict:
     k = top_k or settings.rag_default_top_k
-    context, results = retriever.build_context(query=prompt, top_k=k)
-    grounded_prompt = build_grounded_prompt(prompt, context)
-    output = await run_completion(grounded_prompt)
+    packed, results = await await_cancellable(
+        asyncio.to_thread(
+            retriever.pack_context,
+            query=prompt,
+            top_k=k,
+            metadata_filter=metadata_filter,
+            mmr_lambda=mmr_lambda,
+            cancel_event=cancel_event,
+        ),
+        cancel_event,
+        'retrieval',
+    )
+    grounded_prompt = build_grounded_prompt(prompt, packed.text)
+    output = await run_completion(grounded_prompt, cancel_event=cancel_event)
 
     return {
         'output': output,
-        'retrieved': [
-            {
-                'score': round(item.score, 4),
-                'source_path': item.metadata.get('source_path'),
-                'chunk_index': item.metadata.get('chunk_index'),
-                'text': item.text,
-            }
-            for item in results
-        ],
+        'retrieved': retrieved_payload(results),
         'used_top_k': k,
+        'context_tokens': packed.tokens,
     }
+
+
+async def rag_answer_stream(
+    retriever: RagRetriever,
+    prompt: str,
+    top_k: int | None = None,
+    metadata_filter: MetadataFilter | None = None,
+    mmr_lambda: float | None = None,
+    cancel_event: threading.Event | None = None,
+) -> AsyncIterator[tuple[str, object]]:
+    """Yield ``('sources', payload)`` as soon as retrieval finishes, then ``('token', text)`` per token."""
+    k = top_k or settings.rag_default_top_k
+    packed, results = await await_cancellable(
+        asyncio.to_thread(
+            retriever.pack_context,
+            query=prompt,
+            top_k=k,
+            metadata_filter=metadata_filter,
+            mmr_lambda=mmr_lambda,
+            cancel_event=cancel_event,
+        ),
+        cancel_event,
+        'retrieval',
+    )
+    yield 'sources', {'retrieved': retrieved_payload(results), 'used_top_k': k, 'context_tokens': packed.tokens}
+
+    async for token in stream_completion(build_grounded_prompt(prompt, packed.text), cancel_event=cancel_event):
+        yield 'token', token
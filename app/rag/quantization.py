@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import logging
+from abc import ABC, abstractmethod
+from array import array
+from typing import Iterable, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; product quantization needs it, int8 does not.
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Rows decoded per step when scoring, so scratch memory stays O(batch x dimension), not a
+# full-precision copy of the whole store.
+_SCORE_BATCH_ROWS = 4096
+
+
+def _score_in_batches(codes, positions: Sequence[int] | None, score_block) -> np.ndarray:
+    """Apply ``score_block`` to fixed-size row batches of ``codes`` (or of its selected rows)."""
+    count = len(codes) if positions is None else len(positions)
+    out = np.empty(count, dtype=np.float32)
+    if positions is not None:
+        positions = np.asarray(positions, dtype=np.intp)
+    for start in range(0, count, _SCORE_BATCH_ROWS):
+        stop = min(start + _SCORE_BATCH_ROWS, count)
+        block = codes[start:stop] if positions is None else codes[positions[start:stop]]
+        out[start:stop] = score_block(block)
+    return out
+
+
+class BaseQuantizer(ABC):
+    """Compressed copy of the store's rows used for approximate (asymmetric) dot products."""
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def train_size(self) -> int:
+        return 0
+
+    def needs_training(self, rows: int) -> bool:
+        return False
+
+    def fit(self, sample, batches: Iterable) -> None:
+        """Train on a float32 sample matrix, then re-encode every row from ``batches`` (in row order).
+
+        Only codebook-based quantizers need this.
+        """
+
+    def trained(self, sample, batches: Iterable) -> BaseQuantizer:
+        """A new quantizer like this one, fitted as by ``fit``; this one is left as it is, so it can
+        keep serving while the new one trains."""
+        return self
+
+    @abstractmethod
+    def set_rows(self, positions: Sequence[int], rows: Sequence[Sequence[float]]) -> None:
+        """Encode rows at the given positions; a position equal to the row count appends."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def approx_dots(self, query: Sequence[float], positions: Sequence[int] | None = None) -> Sequence[float]:
+        """Approximate dot product of the full-precision query with every (or each selected) row."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def keep(self, positions: Sequence[int]) -> None:
+        """Retain only the given rows, renumbered in the given order (slot compaction)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class ScalarQuantizer(BaseQuantizer):
+    """Symmetric int8 codes with one float scale per row (4x smaller than float32)."""
+
+    def __init__(self, dimension: int) -> None:
+        self._dim = dimension
+        self._codes = array('b')
+        self._scales = array('f')
+
+    @property
+    def name(self) -> str:
+        return 'int8'
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._codes) + len(self._scales) * self._scales.itemsize
+
+    def set_rows(self, positions: Sequence[int], rows: Sequence[Sequence[float]]) -> None:
+        dim = self._dim
+        for pos, row in zip(positions, rows):
+            peak = max((abs(x) for x in row), default=0.0) or 1.0
+            scale = peak / 127.0
+            codes = array('b', (max(-127, min(127, round(x / scale))) for x in row))
+            if pos == len(self._scales):
+                self._codes.extend(codes)
+                self._scales.append(scale)
+            else:
+                self._codes[pos * dim : (pos + 1) * dim] = codes
+                self._scales[pos] = scale
+
+    def approx_dots(self, query: Sequence[float], positions: Sequence[int] | None = None) -> Sequence[float]:
+        rows = len(self._scales)
+        if np is not None:
+            codes = np.frombuffer(self._codes, dtype=np.int8).reshape(rows, self._dim)
+            scales = np.frombuffer(self._scales, dtype=np.float32)
+            if positions is not None:
+                scales = scales[positions]
+            q = np.asarray(query, dtype=np.float32)
+            dots = _score_in_batches(codes, positions, lambda block: block.astype(np.float32) @ q)
+            return dots * scales
+
+        dim = self._dim
+        return [
+            self._scales[pos] * sum(q * c for q, c in zip(query, self._codes[pos * dim : (pos + 1) * dim]))
+            for pos in (positions if positions is not None else range(rows))
+        ]
+
+    def keep(self, positions: Sequence[int]) -> None:
+        dim = self._dim
+        codes = array('b')
+        for pos in positions:
+            codes.extend(self._codes[pos * dim : (pos + 1) * dim])
+        self._codes = codes
+        self._scales = array('f', (self._scales[pos] for pos in positions))
+
+    def clear(self) -> None:
+        self._codes = array('b')
+        self._scales = array('f')
+
+
+class ProductQuantizer(BaseQuantizer):
+    """Product quantization: one uint8 centroid id per subspace, scored with per-query lookup tables.
+
+    Until its codebooks are trained, rows are held and scored as int8 codes instead.
+    """
+
+    def __init__(self, dimension: int, subspaces: int, centroids: int = 256, train_size: int = 20_000) -> None:
+        # Use the largest subspace count <= the requested one that divides the dimension.
+        subspaces = max(1, min(subspaces, dimension))
+        while dimension % subspaces:
+            subspaces -= 1
+        self._dim = dimension
+        self._m = subspaces
+        self._sub = dimension // subspaces
+        self._ks = centroids
+        self._train_size = train_size
+        self._codebooks = None
+        self._trained_on = 0
+        self._codes = bytearray()
+        self._interim = ScalarQuantizer(dimension)
+
+    @property
+    def name(self) -> str:
+        return f'pq{self._m}x{self._ks}'
+
+    @property
+    def nbytes(self) -> int:
+        codebooks = self._codebooks.nbytes if self._codebooks is not None else 0
+        return len(self._codes) + codebooks + self._interim.nbytes
+
+    @property
+    def train_size(self) -> int:
+        return self._train_size
+
+    def needs_training(self, rows: int) -> bool:
+        if self._codebooks is None:
+            return True
+        # Codebooks fitted on a small early corpus are refreshed once it has grown 4x.
+        return self._trained_on < self._train_size and rows >= 4 * self._trained_on
+
+    def fit(self, sample, batches: Iterable) -> None:
+        sample = np.asarray(sample, dtype=np.float32)
+        ks = min(self._ks, len(sample))
+        rng = np.random.default_rng(0)
+        codebooks = np.zeros((self._m, self._ks, self._sub), dtype=np.float32)
+        for j in range(self._m):
+            part = sample[:, j * self._sub : (j + 1) * self._sub]
+            codebooks[j, :ks] = _kmeans(part, ks, rng)
+            if ks < self._ks:
+                codebooks[j, ks:] = codebooks[j, 0]
+        self._codebooks = codebooks
+        self._trained_on = len(sample)
+
+        codes = bytearray()
+        for batch in batches:
+            codes.extend(self._encode(np.asarray(batch, dtype=np.float32)).tobytes())
+        self._codes = codes
+        self._interim = ScalarQuantizer(self._dim)
+
+    def trained(self, sample, batches: Iterable) -> ProductQuantizer:
+        fresh = ProductQuantizer(self._dim, self._m, self._ks, self._train_size)
+        fresh.fit(sample, batches)
+        return fresh
+
+    def set_rows(self, positions: Sequence[int], rows: Sequence[Sequence[float]]) -> None:
+        if self._codebooks is None:
+            self._interim.set_rows(positions, rows)
+            return
+        if not positions:
+            return
+
+        encoded = self._encode(np.asarray(rows, dtype=np.float32))
+        m = self._m
+        for pos, code in zip(positions, encoded):
+            if pos * m == len(self._codes):
+                self._codes.extend(code.tobytes())
+            else:
+                self._codes[pos * m : (pos + 1) * m] = code.tobytes()
+
+    def approx_dots(self, query: Sequence[float], positions: Sequence[int] | None = None) -> Sequence[float]:
+        if self._codebooks is None:
+            return self._interim.approx_dots(query, positions)
+        q = np.asarray(query, dtype=np.float32).reshape(self._m, self._sub)
+        # Asymmetric distance computation: the query stays exact, rows are centroid ids.
+        tables = np.einsum('mks,ms->mk', self._codebooks, q)
+        codes = np.frombuffer(self._codes, dtype=np.uint8).reshape(-1, self._m)
+        subspaces = np.arange(self._m)
+        return _score_in_batches(codes, positions, lambda block: tables[subspaces, block].sum(axis=1))
+
+    def keep(self, positions: Sequence[int]) -> None:
+        if self._codebooks is None:
+            self._interim.keep(positions)
+            return
+        codes = np.frombuffer(self._codes, dtype=np.uint8).reshape(-1, self._m)
+        self._codes = bytearray(codes[list(positions)].tobytes())
+
+    def clear(self) -> None:
+        self._codebooks = None
+        self._trained_on = 0
+        self._codes = bytearray()
+        self._interim.clear()
+
+    def _encode(self, rows):
+        codes = np.empty((len(rows), self._m), dtype=np.uint8)
+        for j in range(self._m):
+            part = rows[:, j * self._sub : (j + 1) * self._sub]
+            codes[:, j] = _nearest(part, self._codebooks[j])
+        return codes
+
+
+def _nearest(points, centroids):
+    dists = (centroids * centroids).sum(axis=1)[None, :] - 2.0 * points @ centroids.T
+    return dists.argmin(axis=1)
+
+
+def _kmeans(points, k: int, rng, iterations: int = 12):
+    centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(points, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, points)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = points[rng.choice(len(points), size=len(empty), replace=False)]
+    return centroids
+
+
+def build_quantizer(kind: str, dimension: int, pq_subspaces: int, pq_train_size: int) -> BaseQuantizer | None:
+    kind = kind.lower()
+    if kind == 'int8':
+        return ScalarQuantizer(dimension)
+    if kind == 'pq':
+        if np is None:
+            logger.warning('Product quantization needs numpy; falling back to int8')
+            return ScalarQuantizer(dimension)
+        return ProductQuantizer(dimension, subspaces=pq_subspaces, train_size=pq_train_size)
+    return None
@@ -1,8 +1,19 @@
 from __future__ import annotations
 
+import threading
 from dataclasses import dataclass
+from typing import Iterable
 
+from app.core.cancellation import check_cancelled
+from app.core.config import settings
+from app.rag.context import ContextPacker, PackedContext
+from app.rag.diversity import mmr_select
+from app.rag.embedding_cache import EmbeddingCache
 from app.rag.embeddings import BaseEmbeddingModel
+from app.rag.filters import MetadataFilter
+from app.rag.ingestion import content_hash
+from app.rag.lexical import Bm25Index
+from app.rag.shared_index import SharedVectorStore
 from app.rag.vector_store import JsonVectorStore, RetrievalResult, VectorRecord
 
 
@@ -14,9 +25,26 @@ class IndexStats:
 
 
 class RagRetriever:
-    def __init__(self, embedding_model: BaseEmbeddingModel, vector_store: JsonVectorStore) -> None:
+    def __init__(
+        self,
+        embedding_model: BaseEmbeddingModel,
+        vector_store: JsonVectorStore | SharedVectorStore,
+        embedding_cache: EmbeddingCache | None = None,
+        context_packer: ContextPacker | None = None,
+        lexical_index: Bm25Index | None = None,
+    ) -> None:
         self._embedding_model = embedding_model
         self._vector_store = vector_store
+        self._embedding_cache = embedding_cache
+        self._context_packer = context_packer or ContextPacker()
+        self._lexical = lexical_index
+        self._lexical_lock = threading.Lock()
+        # The lexical index is built from the stored texts on first use after a restart. When a
+        # shared store publishes a new generation it follows the changed ids; without that history
+        # it is rebuilt in the background while the previous one keeps serving.
+        self._lexical_ready = False
+        self._lexical_generation = 0
+        self._lexical_rebuilding = False
 
     @property
     def embedding_model_name(self) -> str:
@@ -26,13 +54,115 @@ class RagRetriever:
     def index_size(self) -> int:
         return self._vector_store.size
 
-    def index_chunks(self, chunks: list[dict], rebuild: bool = False) -> IndexStats:
+    @property
+    def vector_store_stats(self) -> dict:
+        return self._vector_store.memory_stats()
+
+    @property
+    def estimated_memory_bytes(self) -> int:
+        estimate = self._vector_store.memory_stats()['estimated_bytes']
+        if self._embedding_cache is not None:
+            estimate += self._embedding_cache.estimated_bytes
+        return estimate
+
+    def flush(self) -> None:
+        """Persist state that is otherwise only written after indexing (e.g. before eviction)."""
+        if self._embedding_cache is not None:
+            self._embedding_cache.save()
+
+    @property
+    def embedding_cache_stats(self) -> dict[str, int] | None:
+        if self._embedding_cache is None:
+            return None
+        return self._embedding_cache.stats()
+
+    def index_chunks(self, chunks: Iterable[dict], rebuild: bool = False, batch_size: int = 256) -> IndexStats:
+        """Embed and upsert chunks batch by batch so a lazy chunk stream is never fully materialized."""
         if rebuild:
             self._vector_store.clear()
+            if self._lexical is not None:
+                with self._lexical_lock:
+                    self._lexical.clear()
+                    self._lexical_ready = True
 
-        embeddings = self._embedding_model.embed_batch([item['text'] for item in chunks])
+        batch: list[dict] = []
+        for item in chunks:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self._upsert_batch(batch)
+                batch = []
+        self._upsert_batch(batch)
+        self._vector_store.save()
+        if self._embedding_cache is not None:
+            self._embedding_cache.save()
+
+        return IndexStats(
+            indexed_chunks=self._vector_store.size,
+            embedding_model=self._embedding_model.model_name,
+            embedding_dimension=self._embedding_model.dimension,
+        )
+
+    def replace_source(self, source_path: str, chunks: Iterable[dict], batch_size: int = 256) -> dict[str, int]:
+        """Make a source's records match ``chunks``: upsert them and delete the ones no longer produced.
+
+        Chunk ids derive from content, so only edited chunks are re-embedded; an empty ``chunks``
+        removes the source entirely. The embedding cache is left to ``flush``, so a batch of
+        sources writes it once.
+        """
+        stale = self._vector_store.filter_ids(MetadataFilter(equals={'source_path': source_path}))
+        upserted = 0
+        batch: list[dict] = []
+        for item in chunks:
+            stale.discard(item['chunk_id'])
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self._upsert_batch(batch)
+                upserted += len(batch)
+                batch = []
+        self._upsert_batch(batch)
+        upserted += len(batch)
+
+        deleted = self._vector_store.delete_many(sorted(stale))
+        self._forget_lexical(deleted)
+        self._vector_store.save()
+        return {'upserted': upserted, 'deleted': len(deleted)}
+
+    def delete_records(self, record_ids: list[str]) -> list[str]:
+        deleted = self._vector_store.delete_many(record_ids)
+        self._forget_lexical(deleted)
+        self._vector_store.save()
+        return deleted
+
+    def delete_where(self, metadata_filter: MetadataFilter) -> list[str]:
+        deleted = self._vector_store.delete_where(metadata_filter)
+        self._forget_lexical(deleted)
+        self._vector_store.save()
+        return deleted
+
+    def _forget_lexical(self, record_ids: list[str]) -> None:
+        if self._lexical is None:
+            return
+        # Under the build lock: a delete racing the first build is applied once the build is done.
+        with self._lexical_lock:
+            if not self._lexical_ready:
+                return
+            for record_id in record_ids:
+                self._lexical.remove(record_id)
+
+    def compact(self) -> dict[str, int]:
+        tombstones = self._vector_store.tombstones
+        self._vector_store.compact()
+        if self._lexical is not None:
+            self._lexical.compact()
+        return {'reclaimed_slots': tombstones, 'indexed_chunks': self._vector_store.size}
+
+    def _upsert_batch(self, batch: list[dict]) -> None:
+        if not batch:
+            return
+
+        embeddings = self._embed_documents(batch)
         records = []
-        for item, emb in zip(chunks, embeddings):
+        for item, emb in zip(batch, embeddings):
             records.append(
                 VectorRecord(
                     record_id=item['chunk_id'],
@@ -43,30 +173,254 @@ class RagRetriever:
             )
 
         self._vector_store.upsert_many(records)
-        self._vector_store.save()
+        if self._lexical is None:
+            return
+        # Checked under the build lock: records written while ``_ensure_lexical`` builds wait for it
+        # and are then added (re-adding one the build already saw just replaces it).
+        with self._lexical_lock:
+            if self._lexical_ready:
+                self._lexical.add_many((item['chunk_id'], item['text']) for item in batch)
 
-        return IndexStats(
-            indexed_chunks=self._vector_store.size,
-            embedding_model=self._embedding_model.model_name,
-            embedding_dimension=self._embedding_model.dimension,
+    def _embed_documents(self, batch: list[dict]) -> list[list[float]]:
+        texts = [item['text'] for item in batch]
+        cache = self._embedding_cache
+        if cache is None:
+            return self._embedding_model.embed_batch(texts)
+
+        model_name = self._embedding_model.model_name
+        dimension = self._embedding_model.dimension
+        hashes = [item['metadata'].get('content_hash') or content_hash(item['text']) for item in batch]
+        embeddings = cache.get_many(model_name, dimension, hashes)
+
+        missing = [idx for idx, emb in enumerate(embeddings) if emb is None]
+        if missing:
+            fresh = self._embedding_model.embed_batch([texts[idx] for idx in missing])
+            for idx, emb in zip(missing, fresh):
+                embeddings[idx] = emb
+            cache.put_many(model_name, dimension, [(hashes[idx], embeddings[idx]) for idx in missing])
+        return embeddings
+
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 4,
+        metadata_filter: MetadataFilter | None = None,
+        mmr_lambda: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> list[RetrievalResult]:
+        return self.retrieve_many(
+            [query],
+            top_k=top_k,
+            metadata_filter=metadata_filter,
+            mmr_lambda=mmr_lambda,
+            cancel_event=cancel_event,
+        )[0]
+
+    def retrieve_many(
+        self,
+        queries: list[str],
+        top_k: int = 4,
+        metadata_filter: MetadataFilter | None = None,
+        mmr_lambda: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> list[list[RetrievalResult]]:
+        """Top ``top_k`` results per query; with ``mmr_lambda`` set they are picked by Maximal
+        Marginal Relevance from a pool of ``rag_mmr_pool_factor * top_k`` candidates, so
+        overlapping chunks of one passage do not fill every slot.
+
+        With ``cancel_event`` set (or past its deadline) between stages, the remaining stages are
+        skipped and ``RequestCancelled`` is raised.
+        """
+        check_cancelled(cancel_event, 'retrieval')
+        if mmr_lambda is None:
+            return self._retrieve_many(queries, top_k, metadata_filter, cancel_event)
+
+        pool_size = max(top_k, top_k * settings.rag_mmr_pool_factor)
+        pool = self._retrieve_many(queries, pool_size, metadata_filter, cancel_event)
+        check_cancelled(cancel_event, 'rerank')
+        diversified = []
+        for candidates in pool:
+            if len(candidates) <= 1:
+                diversified.append(candidates[:top_k])
+                continue
+            embeddings = self._vector_store.embeddings_of([item.record_id for item in candidates])
+            picked = mmr_select([item.score for item in candidates], embeddings, top_k, mmr_lambda)
+            diversified.append([candidates[idx] for idx in picked])
+        return diversified
+
+    def _retrieve_many(
+        self,
+        queries: list[str],
+        top_k: int,
+        metadata_filter: MetadataFilter | None,
+        cancel_event: threading.Event | None = None,
+    ) -> list[list[RetrievalResult]]:
+        if metadata_filter is not None and metadata_filter.is_empty:
+            metadata_filter = None
+        query_embeddings = self._embedding_model.embed_batch(queries)
+        check_cancelled(cancel_event, 'vector_search')
+        if self._lexical is None:
+            return self._vector_store.search_many(
+                query_embeddings=query_embeddings,
+                top_k=top_k,
+                metadata_filter=metadata_filter,
+            )
+
+        self._ensure_lexical()
+        allowed = self._vector_store.filter_ids(metadata_filter) if metadata_filter is not None else None
+        if allowed is not None and not allowed:
+            return [[] for _ in queries]
+        pool = max(top_k, settings.rag_hybrid_candidates)
+        lexical_hits = [self._lexical.search(query, top_k=pool, allowed=allowed) for query in queries]
+
+        if self._vector_store.size >= settings.rag_lexical_prefilter_min_records:
+            # Large corpus: only lexical candidates are vector-scored; queries without any
+            # lexical match still fall back to a full vector scan.
+            dense_lists = []
+            for emb, hits in zip(query_embeddings, lexical_hits):
+                if hits:
+                    dense = self._vector_store.score_ids(emb, [record_id for record_id, _ in hits])
+                    dense.sort(key=lambda item: item.score, reverse=True)
+                else:
+                    dense = self._vector_store.search(emb, top_k=pool, metadata_filter=metadata_filter)
+                dense_lists.append(dense)
+        else:
+            dense_lists = self._vector_store.search_many(
+                query_embeddings=query_embeddings,
+                top_k=pool,
+                metadata_filter=metadata_filter,
+            )
+            for emb, dense, hits in zip(query_embeddings, dense_lists, lexical_hits):
+                seen = {item.record_id for item in dense}
+                missing = [record_id for record_id, _ in hits if record_id not in seen]
+                if missing:
+                    dense.extend(self._vector_store.score_ids(emb, missing))
+
+        return [_fuse(dense, hits, top_k) for dense, hits in zip(dense_lists, lexical_hits)]
+
+    def _ensure_lexical(self) -> None:
+        generation = self._vector_store.generation
+        if self._lexical_ready and self._lexical_generation == generation:
+            return
+        with self._lexical_lock:
+            if not self._lexical_ready:
+                # Nothing to serve from yet: the first build has to finish before searching.
+                self._lexical.clear()
+                self._lexical.add_many(self._vector_store.iter_texts())
+                self._lexical_ready = True
+                self._lexical_generation = generation
+                return
+            if self._catch_up_lexical_locked(generation) or self._lexical_rebuilding:
+                return
+            self._lexical_rebuilding = True
+        threading.Thread(target=self._rebuild_lexical, name='lexical-rebuild', daemon=True).start()
+
+    def _catch_up_lexical_locked(self, generation: int) -> bool:
+        """Apply the records changed since the index's generation; ``False`` if they are unknown."""
+        if self._lexical_generation == generation:
+            return True
+        changed = self._vector_store.changed_ids_between(self._lexical_generation, generation)
+        if changed is None:
+            return False
+        texts = self._vector_store.texts_of(changed)
+        for record_id in changed.difference(texts):
+            self._lexical.remove(record_id)
+        # Re-adding a record this process already indexed just replaces it.
+        self._lexical.add_many(texts.items())
+        self._lexical_generation = generation
+        return True
+
+    def _rebuild_lexical(self) -> None:
+        try:
+            generation = self._vector_store.generation
+            fresh = self._lexical.empty_copy()
+            fresh.add_many(self._vector_store.iter_texts())
+            with self._lexical_lock:
+                self._lexical = fresh
+                self._lexical_generation = generation
+                # Writes made here during the build went to the old index; they are published, so
+                # catching up from the build's generation brings them in.
+                self._catch_up_lexical_locked(self._vector_store.generation)
+        finally:
+            with self._lexical_lock:
+                self._lexical_rebuilding = False
+
+    def pack_context(
+        self,
+        query: str,
+        top_k: int = 4,
+        max_chars: int | None = None,
+        max_tokens: int | None = None,
+        metadata_filter: MetadataFilter | None = None,
+        mmr_lambda: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> tuple[PackedContext, list[RetrievalResult]]:
+        results = self.retrieve(
+            query=query,
+            top_k=top_k,
+            metadata_filter=metadata_filter,
+            mmr_lambda=mmr_lambda,
+            cancel_event=cancel_event,
+        )
+        packed = self._context_packer.pack(
+            query=query,
+            results=results,
+            max_tokens=max_tokens or settings.rag_context_max_tokens,
+            max_chars=max_chars,
         )
+        return packed, results
 
-    def retrieve(self, query: str, top_k: int = 4) -> list[RetrievalResult]:
-        query_embedding = self._embedding_model.embed_text(query)
-        return self._vector_store.search(query_embedding=query_embedding, top_k=top_k)
-
-    def build_context(self, query: str, top_k: int = 4, max_chars: int = 3000) -> tuple[str, list[RetrievalResult]]:
-        results = self.retrieve(query=query, top_k=top_k)
-
-        context_lines: list[str] = []
-        current_len = 0
-        for idx, res in enumerate(results, start=1):
-            source = res.metadata.get('source_path', 'unknown')
-            line = f'[{idx}] (score={res.score:.3f}, source={source}) {res.text}'
-            if current_len + len(line) > max_chars:
-                break
-            context_lines.append(line)
-            current_len += len(line)
-
-        context = '\n'.join(context_lines)
-        return context, results
+    def build_context(
+        self,
+        query: str,
+        top_k: int = 4,
+        max_chars: int | None = None,
+        max_tokens: int | None = None,
+        metadata_filter: MetadataFilter | None = None,
+        mmr_lambda: float | None = None,
+        cancel_event: threading.Event | None = None,
+    ) -> tuple[str, list[RetrievalResult]]:
+        packed, results = self.pack_context(
+            query=query,
+            top_k=top_k,
+            max_chars=max_chars,
+            max_tokens=max_tokens,
+            metadata_filter=metadata_filter,
+            mmr_lambda=mmr_lambda,
+            cancel_event=cancel_event,
+        )
+        return packed.text, results
+
+
+def _fuse(dense: list[RetrievalResult], lexical: list[tuple[str, float]], top_k: int) -> list[RetrievalResult]:
+    """Combine vector and BM25 rankings with reciprocal rank fusion or a weighted sum."""
+    by_id = {item.record_id: item for item in dense}
+    fused: dict[str, float] = {}
+
+    if settings.rag_fusion.lower() == 'weighted':
+        alpha = settings.rag_hybrid_alpha
+        best = lexical[0][1] if lexical else 0.0
+        lexical_scores = {record_id: score / best for record_id, score in lexical} if best > 0 else {}
+        for record_id, item in by_id.items():
+            fused[record_id] = alpha * max(0.0, item.score) + (1 - alpha) * lexical_scores.get(record_id, 0.0)
+    else:
+        k = settings.rag_rrf_k
+        ordered_dense = sorted(dense, key=lambda item: item.score, reverse=True)
+        for rank, item in enumerate(ordered_dense, start=1):
+            fused[item.record_id] = fused.get(item.record_id, 0.0) + 1.0 / (k + rank)
+        for rank, (record_id, _) in enumerate(lexical, start=1):
+            if record_id in by_id:
+                fused[record_id] = fused.get(record_id, 0.0) + 1.0 / (k + rank)
+
+    ranked = sorted(fused, key=lambda record_id: fused[record_id], reverse=True)[: max(1, top_k)]
+    # ``score`` stays the cosine similarity callers threshold and display; the order is the fused one.
+    return [
+        RetrievalResult(
+            record_id=record_id,
+            text=by_id[record_id].text,
+            score=by_id[record_id].score,
+            metadata=by_id[record_id].metadata,
+            fused_score=fused[record_id],
+        )
+        for record_id in ranked
+    ]
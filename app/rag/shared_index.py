@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from app.rag.filters import MetadataFilter
+from app.rag.persistence import InterProcessLock, atomic_write_text
+from app.rag.vector_store import JsonVectorStore, RetrievalResult, VectorRecord
+
+_COUNTER = struct.Struct('<Q')
+# Generations whose changed ids are kept, so readers lagging behind can catch up incrementally.
+_CHANGE_HISTORY = 64
+
+
+class _GenerationCounter:
+    """Eight-byte counter in a memory-mapped file; reading it costs no system call."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = path.open('a+b')
+        if os.fstat(self._handle.fileno()).st_size < _COUNTER.size:
+            self._handle.write(b'\0' * _COUNTER.size)
+            self._handle.flush()
+        self._map = mmap.mmap(self._handle.fileno(), _COUNTER.size)
+
+    def read(self) -> int:
+        return _COUNTER.unpack_from(self._map)[0]
+
+    def write(self, value: int) -> None:
+        # An aligned 8-byte store: readers see the old or the new value, never a mix.
+        _COUNTER.pack_into(self._map, 0, value)
+        self._map.flush()
+
+
+class _Mapped:
+    __slots__ = ('generation', 'store', 'shared_bytes')
+
+    def __init__(self, generation: int, store: JsonVectorStore, shared_bytes: int) -> None:
+        self.generation = generation
+        self.store = store
+        self.shared_bytes = shared_bytes
+
+
+class SharedVectorStore:
+    """Vector store whose published index is memory-mapped read-only by every worker process.
+
+    Publishing writes the live rows as packed float32 to ``<stem>.shared/<generation>.f32`` with
+    the ids, texts and metadata beside it, then bumps a generation counter that lives in a shared
+    memory map. Every read checks the counter; when it moved, the process maps the new files and
+    swaps them in with one reference assignment, so searches see either the old or the new index
+    and in-flight ones finish on the generation they started with. The rows exist once in the page
+    cache however many workers serve them; texts and metadata are parsed per process.
+
+    Writes go to a private ``JsonVectorStore`` (snapshot plus write-ahead log, as before) that is
+    only loaded in processes that write. ``save`` takes an inter-process lock, replays this
+    process's unsaved operations onto a fresh copy if another worker published in between, logs
+    them and publishes the next generation. Publishing costs a pass over the store, so bursts of
+    changes should be saved together. Searches over the mapped rows are exact; ``quantization``
+    only applies to the writer's copy.
+
+    Each generation also records the ids it changed (``changes-<generation>.json``), so per-process
+    state derived from the records, such as the BM25 index, can follow with ``changed_ids_between``
+    instead of a pass over every text.
+    """
+
+    def __init__(self, path: str, **store_options) -> None:
+        self._path = Path(path)
+        self._store_options = {**store_options, 'background_compaction': False}
+        self._dir = self._path.with_name(f'{self._path.stem}.shared')
+        self._scan_options = {
+            key: value for key, value in store_options.items() if key in {'search_shards', 'shard_min_rows'}
+        }
+        self._publish_lock = InterProcessLock(self._dir / 'publish.lock')
+        with self._publish_lock:
+            self._counter = _GenerationCounter(self._dir / 'generation')
+        self._map_lock = threading.Lock()
+        self._mapped = _Mapped(-1, JsonVectorStore(None), 0)
+        self._write_lock = threading.Lock()
+        self._writer: JsonVectorStore | None = None
+        self._writer_generation = 0
+        self._publish_existing()
+
+    def _publish_existing(self) -> None:
+        # The first process to start in shared mode publishes the index that is already on disk.
+        wal_path = self._path.with_name(f'{self._path.stem}.wal')
+        if self._counter.read() or not (self._path.exists() or wal_path.exists()):
+            return
+        with self._publish_lock:
+            if self._counter.read() == 0:
+                self._publish_locked(JsonVectorStore(str(self._path), **self._store_options), None)
+
+    def _current(self) -> JsonVectorStore:
+        mapped = self._mapped
+        generation = self._counter.read()
+        if generation == mapped.generation:
+            return mapped.store
+        with self._map_lock:
+            if self._mapped.generation != generation:
+                self._mapped = self._open_generation(generation)
+            return self._mapped.store
+
+    def _open_generation(self, generation: int) -> _Mapped:
+        while generation:
+            try:
+                columns = json.loads((self._dir / f'{generation}.json').read_text(encoding='utf-8'))
+                with (self._dir / f'{generation}.f32').open('rb') as handle:
+                    size = os.fstat(handle.fileno()).st_size
+                    # The mapping stays valid after the file is closed (or pruned).
+                    rows = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+                store = JsonVectorStore.mapped(columns, rows, **self._scan_options)
+                return _Mapped(generation, store, size)
+            except FileNotFoundError:
+                # Pruned because newer generations were published meanwhile; map the latest.
+                latest = self._counter.read()
+                if latest == generation:
+                    raise
+                generation = latest
+        return _Mapped(0, JsonVectorStore(None), 0)
+
+    def _publish_locked(self, writer: JsonVectorStore, changed_ids: list[str] | None) -> int:
+        """Publish the writer's records as the next generation; ``changed_ids`` are the ids written
+        since the previous one, or ``None`` when unknown (e.g. after a clear)."""
+        generation = self._counter.read() + 1
+        rows_path = self._dir / f'{generation}.f32'
+        tmp_path = rows_path.with_name(rows_path.name + '.tmp')
+        with tmp_path.open('wb') as handle:
+            columns = writer.export(handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, rows_path)
+        atomic_write_text(self._dir / f'{generation}.json', json.dumps(columns))
+        changes_path = self._dir / f'changes-{generation}.json'
+        if changed_ids is None:
+            changes_path.unlink(missing_ok=True)
+        else:
+            atomic_write_text(changes_path, json.dumps(sorted(set(changed_ids))))
+        self._counter.write(generation)
+        self._prune(keep_from=generation - 1)
+        return generation
+
+    def _prune(self, keep_from: int) -> None:
+        # The previous generation stays for processes that read the counter but have not mapped
+        # it yet; anything older is only held by existing mappings, which survive the unlink.
+        for path in self._dir.iterdir():
+            stem = path.name.split('.', 1)[0]
+            oldest = keep_from
+            if stem.startswith('changes-'):
+                # Changed ids outlive the data, for readers catching up over several generations.
+                stem, oldest = stem.removeprefix('changes-'), keep_from - _CHANGE_HISTORY
+            if stem.isdigit() and int(stem) < oldest:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass  # still mapped on Windows; removed by a later publish
+
+    def _writer_locked(self) -> JsonVectorStore:
+        """The private writable copy, rebased first if another worker published since it was loaded."""
+        if self._writer is None or self._writer_generation != self._counter.read():
+            with self._publish_lock:
+                self._rebase_locked()
+        return self._writer
+
+    def _rebase_locked(self) -> None:
+        # Must hold the publish lock: the writer's log position is only valid until someone else
+        # appends, and a log being appended to must not be read.
+        generation = self._counter.read()
+        if self._writer is not None and self._writer_generation == generation:
+            return
+        ops = self._writer.take_pending() if self._writer is not None else []
+        self._writer = JsonVectorStore(str(self._path), **self._store_options)
+        self._writer.apply(ops)
+        self._writer_generation = generation
+
+    @property
+    def size(self) -> int:
+        return self._current().size
+
+    @property
+    def tombstones(self) -> int:
+        writer = self._writer
+        return writer.tombstones if writer is not None else 0
+
+    @property
+    def dimension(self) -> int | None:
+        return self._current().dimension
+
+    @property
+    def generation(self) -> int:
+        self._current()
+        return self._mapped.generation
+
+    def memory_stats(self) -> dict:
+        self._current()
+        mapped = self._mapped
+        stats = mapped.store.memory_stats()
+        writer = self._writer
+        if writer is not None:
+            own = writer.memory_stats()
+            stats['vector_bytes_in_memory'] += own['vector_bytes_in_memory']
+            stats['estimated_bytes'] += own['estimated_bytes']
+        stats.update(
+            shared_generation=mapped.generation,
+            shared_vector_bytes=mapped.shared_bytes,
+            writer_loaded=writer is not None,
+        )
+        return stats
+
+    def clear(self) -> None:
+        with self._write_lock:
+            self._writer_locked().clear()
+
+    def upsert_many(self, records: list[VectorRecord]) -> None:
+        with self._write_lock:
+            self._writer_locked().upsert_many(records)
+
+    def delete_many(self, record_ids: list[str]) -> list[str]:
+        with self._write_lock:
+            return self._writer_locked().delete_many(record_ids)
+
+    def delete_where(self, metadata_filter: MetadataFilter) -> list[str]:
+        with self._write_lock:
+            return self._writer_locked().delete_where(metadata_filter)
+
+    def iter_texts(self) -> Iterator[tuple[str, str]]:
+        return self._current().iter_texts()
+
+    def texts_of(self, record_ids: Iterable[str]) -> dict[str, str]:
+        return self._current().texts_of(record_ids)
+
+    def changed_ids_between(self, old_generation: int, new_generation: int) -> set[str] | None:
+        """Ids written by the generations after ``old_generation`` up to ``new_generation``; ``None``
+        when that history is incomplete (too old, or a generation published without it)."""
+        if not 0 < new_generation - old_generation <= _CHANGE_HISTORY:
+            return set() if old_generation == new_generation else None
+        changed: set[str] = set()
+        for generation in range(old_generation + 1, new_generation + 1):
+            try:
+                changed.update(json.loads((self._dir / f'changes-{generation}.json').read_text(encoding='utf-8')))
+            except (FileNotFoundError, ValueError):
+                return None
+        return changed
+
+    def filter_ids(self, metadata_filter: MetadataFilter) -> set[str]:
+        return self._current().filter_ids(metadata_filter)
+
+    def embeddings_of(self, record_ids: list[str]) -> list[list[float]]:
+        return self._current().embeddings_of(record_ids)
+
+    def score_ids(self, query_embedding: list[float], record_ids: list[str]) -> list[RetrievalResult]:
+        return self._current().score_ids(query_embedding, record_ids)
+
+    def search(
+        self,
+        query_embedding: list[float],
+        top_k: int = 4,
+        metadata_filter: MetadataFilter | None = None,
+    ) -> list[RetrievalResult]:
+        return self._current().search(query_embedding, top_k=top_k, metadata_filter=metadata_filter)
+
+    def search_many(
+        self,
+        query_embeddings: list[list[float]],
+        top_k: int = 4,
+        metadata_filter: MetadataFilter | None = None,
+    ) -> list[list[RetrievalResult]]:
+        return self._current().search_many(query_embeddings, top_k=top_k, metadata_filter=metadata_filter)
+
+    def save(self) -> None:
+        """Log this process's changes and publish them as the next generation."""
+        with self._write_lock:
+            if self._writer is None or not self._writer.pending_ops:
+                return
+            with self._publish_lock:
+                self._rebase_locked()
+                writer = self._writer
+                changed_ids = writer.pending_record_ids()
+                writer.save()
+                if writer.needs_compaction():
+                    writer.compact()
+                self._writer_generation = self._publish_locked(writer, changed_ids)
+
+    def compact(self) -> None:
+        with self._write_lock, self._publish_lock:
+            self._rebase_locked()
+            writer = self._writer
+            changed_ids = writer.pending_record_ids()
+            writer.compact()
+            self._writer_generation = self._publish_locked(writer, changed_ids)
+
+    def load(self) -> None:
+        """Map the latest published generation now rather than on the next read."""
+        with self._map_lock:
+            self._mapped = self._open_generation(self._counter.read())
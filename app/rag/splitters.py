@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import ast
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Iterator, TextIO
+
+from app.core.config import settings
+
+Windower = Callable[[Iterable[str], int, int], Iterator[str]]
+# (context, text): context is a heading or class signature that labels text when it is split off.
+Unit = tuple[str, str]
+
+
+def iter_normalized_text(handle: TextIO, buffer_size: int) -> Iterator[str]:
+    """Yield whitespace-collapsed text read in fixed-size buffers.
+
+    Concatenating the pieces gives the same result as ``' '.join(text.split())`` on the whole file.
+    """
+    emitted = False
+    pending_space = False
+    for buf in iter(lambda: handle.read(buffer_size), ''):
+        words = buf.split()
+        if not words:
+            pending_space = True
+            continue
+
+        piece = ' '.join(words)
+        if emitted and (pending_space or buf[0].isspace()):
+            piece = ' ' + piece
+        yield piece
+        emitted = True
+        pending_space = buf[-1].isspace()
+
+
+def iter_windows(pieces: Iterable[str], chunk_size: int, overlap: int) -> Iterator[str]:
+    """Slice a stream of normalized text into overlapping fixed-size windows."""
+    if overlap >= chunk_size:
+        overlap = max(0, chunk_size // 4)
+    step = chunk_size - overlap
+
+    window = ''
+    for piece in pieces:
+        window += piece
+        pos = 0
+        # Only emit once more text is buffered, so the final window is handled at end of stream.
+        while len(window) - pos > chunk_size:
+            yield window[pos : pos + chunk_size]
+            pos += step
+        window = window[pos:]
+
+    if window:
+        yield window
+
+
+def _iter_words(pieces: Iterable[str], max_word: int) -> Iterator[str]:
+    carry = ''
+    for piece in pieces:
+        words = (carry + piece).split(' ')
+        carry = words.pop()
+        yield from (word for word in words if word)
+        # Keep whitespace-free input (dumps, minified data) from growing the carry without bound.
+        while len(carry) > max_word:
+            yield carry[:max_word]
+            carry = carry[max_word:]
+    if carry:
+        yield carry
+
+
+def _overlap_tail(words: list[str], overlap: int) -> tuple[list[str], int]:
+    tail: list[str] = []
+    length = -1
+    for word in reversed(words):
+        if length + 1 + len(word) > overlap:
+            break
+        tail.append(word)
+        length += 1 + len(word)
+    tail.reverse()
+    return tail, max(0, length)
+
+
+def iter_content_windows(pieces: Iterable[str], chunk_size: int, overlap: int) -> Iterator[str]:
+    """Cut normalized text at word boundaries chosen by content instead of by offset.
+
+    A chunk ends after an anchor word (a stable hash of the word) once it is half full, or when
+    the next word would overflow ``chunk_size``. Boundaries depend only on nearby words, so an
+    insertion near the top of a file re-aligns within a chunk or two instead of shifting every
+    later window, which keeps content-derived chunk ids (and cached embeddings) reusable.
+    """
+    if overlap >= chunk_size:
+        overlap = max(0, chunk_size // 4)
+    min_len = chunk_size // 2
+    # Roughly one anchor per quarter chunk, assuming ~6 characters per word including the space.
+    anchor_every = max(1, chunk_size // 24)
+
+    words: list[str] = []
+    length = 0
+    fresh = 0
+    for word in _iter_words(pieces, max_word=chunk_size):
+        if words and length + 1 + len(word) > chunk_size:
+            yield ' '.join(words)
+            words, length = _overlap_tail(words, overlap)
+            fresh = 0
+            if words and length + 1 + len(word) > chunk_size:
+                words, length = [], 0
+
+        length += len(word) + (1 if words else 0)
+        words.append(word)
+        fresh += 1
+
+        if length >= min_len and zlib.crc32(word.encode('utf-8')) % anchor_every == 0:
+            yield ' '.join(words)
+            words, length = _overlap_tail(words, overlap)
+            fresh = 0
+
+    if fresh:
+        yield ' '.join(words)
+
+
+WINDOWERS: dict[str, Windower] = {
+    'fixed': iter_windows,
+    'content': iter_content_windows,
+}
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def _iter_lines(handle: TextIO) -> Iterator[str]:
+    # readline with a limit keeps a single enormous line from being loaded at once.
+    buffer_size = settings.rag_read_buffer_chars
+    return iter(lambda: handle.readline(buffer_size), '')
+
+
+class BaseSplitter(ABC):
+    def __init__(self, windower: Windower = iter_content_windows) -> None:
+        self._window = windower
+
+    @abstractmethod
+    def split(self, handle: TextIO, chunk_size: int, overlap: int) -> Iterator[str]:
+        raise NotImplementedError
+
+    def _pack(self, units: Iterable[Unit], chunk_size: int, overlap: int) -> Iterator[str]:
+        """Greedily merge small units into chunks and window the ones that do not fit.
+
+        A unit whose text does not start with its context gets the context as a label. Units are
+        only merged when they share a label, so e.g. methods are grouped under their class line.
+        """
+        buf: list[str] = []
+        buf_label = ''
+        length = 0
+
+        for context, text in units:
+            if not text:
+                continue
+            context = context[: chunk_size // 4]
+            label = '' if text.startswith(context) else context
+            label_len = len(label) + 1 if label else 0
+
+            if buf and (label != buf_label or length + 1 + len(text) > chunk_size):
+                yield ' '.join(buf)
+                buf, length = [], 0
+
+            if label_len + len(text) > chunk_size:
+                width = chunk_size - (len(context) + 1 if context else 0)
+                for piece in self._window([text], width, min(overlap, width - 1)):
+                    yield piece if piece.startswith(context) else f'{context} {piece}'
+                continue
+
+            if not buf and label:
+                buf, length = [label], len(label)
+            buf_label = label
+            length += len(text) + (1 if buf else 0)
+            buf.append(text)
+
+        if buf:
+            yield ' '.join(buf)
+
+
+class TextSplitter(BaseSplitter):
+    def split(self, handle: TextIO, chunk_size: int, overlap: int) -> Iterator[str]:
+        pieces = iter_normalized_text(handle, buffer_size=settings.rag_read_buffer_chars)
+        return self._window(pieces, chunk_size, overlap)
+
+
+class _SectionSplitter(BaseSplitter):
+    """Shared section accumulation for heading-based formats; sections are capped by the read buffer."""
+
+    def split(self, handle: TextIO, chunk_size: int, overlap: int) -> Iterator[str]:
+        return self._pack(self._sections(handle), chunk_size, overlap)
+
+    @abstractmethod
+    def _sections(self, handle: TextIO) -> Iterator[Unit]:
+        raise NotImplementedError
+
+    @staticmethod
+    def _section_unit(heading: str, body: list[str], continued: bool) -> Unit:
+        text = _normalize(''.join(body))
+        if continued or not heading:
+            return heading, text
+        return heading, f'{heading} {text}' if text else heading
+
+
+class MarkdownSplitter(_SectionSplitter):
+    _HEADING = re.compile(r'^ {0,3}#{1,6}(\s|$)')
+    _FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+    def _sections(self, handle: TextIO) -> Iterator[Unit]:
+        cap = settings.rag_read_buffer_chars
+        heading = ''
+        body: list[str] = []
+        size = 0
+        continued = False
+        fence: str | None = None
+
+        for line in _iter_lines(handle):
+            match = self._FENCE.match(line)
+            if match:
+                marker = match.group(1)
+                if fence is None:
+                    fence = marker
+                elif marker.startswith(fence):
+                    fence = None
+            elif fence is None and self._HEADING.match(line):
+                yield self._section_unit(heading, body, continued)
+                heading, body, size, continued = _normalize(line), [], 0, False
+                continue
+
+            body.append(line)
+            size += len(line)
+            if size > cap:
+                yield self._section_unit(heading, body, continued)
+                body, size, continued = [], 0, True
+
+        yield self._section_unit(heading, body, continued)
+
+
+class RstSplitter(_SectionSplitter):
+    _ADORNMENT = re.compile(r'^([=\-`:\'"~^_*+#<>.])\1{2,}\s*$')
+
+    def _sections(self, handle: TextIO) -> Iterator[Unit]:
+        cap = settings.rag_read_buffer_chars
+        heading = ''
+        body: list[str] = []
+        size = 0
+        continued = False
+        prev: str | None = None
+
+        # One line of lookahead: a title is only known once its underline is seen.
+        for line in _iter_lines(handle):
+            if prev is not None and self._is_title(prev, line):
+                if body and self._ADORNMENT.match(body[-1]):
+                    body.pop()  # overline of the new title
+                yield self._section_unit(heading, body, continued)
+                heading, body, size, continued = _normalize(prev), [], 0, False
+                prev = None
+                continue
+
+            if prev is not None:
+                body.append(prev)
+                size += len(prev)
+                if size > cap:
+                    yield self._section_unit(heading, body, continued)
+                    body, size, continued = [], 0, True
+            prev = line
+
+        if prev is not None:
+            body.append(prev)
+        yield self._section_unit(heading, body, continued)
+
+    def _is_title(self, title: str, underline: str) -> bool:
+        title = title.strip()
+        return (
+            bool(title)
+            and not self._ADORNMENT.match(title)
+            and bool(self._ADORNMENT.match(underline))
+            and len(underline.strip()) >= len(title)
+        )
+
+
+class PythonSplitter(BaseSplitter):
+    """Split modules on top-level functions and classes; oversized classes split per method."""
+
+    _DEFS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+    def split(self, handle: TextIO, chunk_size: int, overlap: int) -> Iterator[str]:
+        limit = settings.rag_python_ast_max_chars
+        source = handle.read(limit + 1)
+        if len(source) > limit:
+            handle.seek(0)
+            return TextSplitter(self._window).split(handle, chunk_size, overlap)
+
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            return self._window([_normalize(source)], chunk_size, overlap)
+
+        lines = source.splitlines(keepends=True)
+        units = self._body_units(tree.body, lines, 0, len(lines), '', chunk_size)
+        return self._pack(units, chunk_size, overlap)
+
+    def _body_units(
+        self,
+        body: list[ast.stmt],
+        lines: list[str],
+        start: int,
+        end: int,
+        context: str,
+        chunk_size: int,
+    ) -> Iterator[Unit]:
+        # start/end are 0-based line offsets; every line in the range lands in exactly one unit.
+        cursor = start
+        for node in body:
+            if not isinstance(node, self._DEFS):
+                continue
+
+            node_start = _first_line(node)
+            node_end = node.end_lineno or node.lineno
+            yield context, _normalize(''.join(lines[cursor:node_start]))
+
+            text = _normalize(''.join(lines[node_start:node_end]))
+            if isinstance(node, ast.ClassDef) and not context and len(text) > chunk_size and node.body:
+                body_start = _first_line(node.body[0])
+                header = _normalize(''.join(lines[node_start:body_start]))
+                yield from self._body_units(node.body, lines, body_start, node_end, header, chunk_size)
+            else:
+                yield context, text
+            cursor = node_end
+
+        yield context, _normalize(''.join(lines[cursor:end]))
+
+
+def _first_line(node: ast.stmt) -> int:
+    """0-based offset of a statement's first line, counting its decorators."""
+    return min([node.lineno] + [dec.lineno for dec in getattr(node, 'decorator_list', [])]) - 1
+
+
+_STRUCTURED_SPLITTERS: dict[str, type[BaseSplitter]] = {
+    '.md': MarkdownSplitter,
+    '.rst': RstSplitter,
+    '.py': PythonSplitter,
+}
+
+
+def register_splitter(suffix: str, splitter_cls: type[BaseSplitter]) -> None:
+    _STRUCTURED_SPLITTERS[suffix.lower()] = splitter_cls
+
+
+def build_splitter(suffix: str, strategy: str | None = None) -> BaseSplitter:
+    """Pick a splitter for a file suffix: structured | content | fixed."""
+    strategy = (strategy or settings.rag_chunking).lower()
+    if strategy == 'fixed':
+        return TextSplitter(iter_windows)
+    if strategy == 'content':
+        return TextSplitter(iter_content_windows)
+
+    splitter_cls = _STRUCTURED_SPLITTERS.get(suffix.lower(), TextSplitter)
+    return splitter_cls(iter_content_windows)
@@ -1,36 +1,219 @@
 from __future__ import annotations
 
 import threading
+import weakref
+from pathlib import Path
+from typing import Callable, Iterator, TypeVar
 
 from app.core.config import settings
+from app.rag.collection_manager import CollectionConfig, CollectionManager, UnknownCollectionError
+from app.rag.embedding_cache import EmbeddingCache
 from app.rag.embeddings import build_embedding_model
-from app.rag.ingestion import build_chunks
+from app.rag.ingestion import is_supported, iter_chunks, iter_file_chunks
+from app.rag.lexical import Bm25Index
 from app.rag.retriever import IndexStats, RagRetriever
+from app.rag.shared_index import SharedVectorStore
 from app.rag.vector_store import JsonVectorStore
+from app.rag.watcher import DirectoryWatcher
 
-_retriever_lock = threading.Lock()
-_retriever: RagRetriever | None = None
+_collections_lock = threading.Lock()
+_collections: CollectionManager | None = None
+_watcher_lock = threading.Lock()
+_watcher: DirectoryWatcher | None = None
 
+T = TypeVar('T')
 
-def get_retriever() -> RagRetriever:
-    global _retriever
-    with _retriever_lock:
-        if _retriever is None:
-            embedding_model = build_embedding_model()
-            vector_store = JsonVectorStore(settings.vector_store_path)
-            _retriever = RagRetriever(embedding_model=embedding_model, vector_store=vector_store)
-        return _retriever
+# Open stores and embedding caches by resolved file path. A collection reloaded (after eviction or
+# re-registration) while a request or the watcher still holds its previous retriever gets the same
+# instances: two instances on one snapshot and log would hand out duplicate sequence numbers, and
+# one's compaction would drop the other's entries. An instance goes away with its last holder.
+_open_files_lock = threading.Lock()
+_open_files: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
 
 
-def index_documents(rebuild: bool = False) -> IndexStats:
-    retriever = get_retriever()
-    chunks = build_chunks()
-    payload = [
-        {
+def _open_once(kind: str, path: str, build: Callable[[], T]) -> T:
+    key = (kind, str(Path(path).resolve()))
+    with _open_files_lock:
+        instance = _open_files.get(key)
+        if instance is None:
+            instance = build()
+            _open_files[key] = instance
+        return instance
+
+
+def embedding_cache_path(vector_store_path: str) -> str:
+    path = Path(vector_store_path)
+    return str(path.with_name(f'{path.stem}.embeddings.bin'))
+
+
+def _build_lexical_index() -> Bm25Index | None:
+    if settings.rag_retrieval_mode.lower() != 'hybrid':
+        return None
+    return Bm25Index()
+
+
+def _build_vector_store(path: str | None, quantization: str | None = None) -> JsonVectorStore | SharedVectorStore:
+    options = dict(
+        quantization=quantization or settings.vector_quantization,
+        pq_subspaces=settings.vector_pq_subspaces,
+        pq_train_size=settings.vector_pq_train_size,
+        rerank_candidates=settings.vector_rerank_candidates,
+        compact_min_bytes=settings.vector_wal_compact_min_bytes,
+        compact_ratio=settings.vector_wal_compact_ratio,
+        search_shards=settings.vector_search_shards,
+        shard_min_rows=settings.vector_shard_min_rows,
+    )
+    if not path:
+        return JsonVectorStore(None, **options)
+    if settings.vector_shared_index:
+        return _open_once('vector_store', path, lambda: SharedVectorStore(path, **options))
+    # A store still open keeps its quantization until its last holder releases it.
+    return _open_once('vector_store', path, lambda: JsonVectorStore(path, **options))
+
+
+def _build_retriever(config: CollectionConfig) -> RagRetriever:
+    return RagRetriever(
+        embedding_model=build_embedding_model(dimension=config.embedding_dimension),
+        vector_store=_build_vector_store(config.vector_store_path, quantization=config.quantization),
+        embedding_cache=_open_once(
+            'embedding_cache',
+            embedding_cache_path(config.vector_store_path),
+            lambda: EmbeddingCache(
+                embedding_cache_path(config.vector_store_path),
+                max_entries=settings.embedding_cache_max_entries,
+            ),
+        ),
+        lexical_index=_build_lexical_index(),
+    )
+
+
+def get_collections() -> CollectionManager:
+    global _collections
+    with _collections_lock:
+        if _collections is None:
+            _collections = CollectionManager(
+                registry_path=settings.rag_collections_registry_path,
+                collections_dir=settings.rag_collections_dir,
+                factory=_build_retriever,
+                allowed_roots=settings.rag_collection_roots,
+                max_loaded=settings.rag_collections_max_loaded,
+                memory_budget_bytes=settings.rag_collections_memory_budget_mb * 1024 * 1024,
+            )
+        return _collections
+
+
+def get_retriever(collection: str | None = None) -> RagRetriever:
+    """Retriever of a named collection (the default one when omitted), loaded on first use."""
+    return get_collections().get(collection or settings.rag_default_collection)
+
+
+def _chunk_payload(
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    strategy: str | None = None,
+    data_dir: str | None = None,
+) -> Iterator[dict]:
+    for chunk in iter_chunks(data_dir=data_dir, chunk_size=chunk_size, overlap=overlap, strategy=strategy):
+        yield {
             'chunk_id': chunk.chunk_id,
             'text': chunk.text,
             'metadata': chunk.metadata,
         }
-        for chunk in chunks
-    ]
-    return retriever.index_chunks(payload, rebuild=rebuild)
+
+
+def index_documents(rebuild: bool = False, collection: str | None = None) -> IndexStats:
+    config = get_collections().config(collection or settings.rag_default_collection)
+    retriever = get_retriever(config.name)
+    chunks = _chunk_payload(
+        chunk_size=config.chunk_size,
+        overlap=config.chunk_overlap,
+        strategy=config.chunking,
+        data_dir=config.data_dir,
+    )
+    return retriever.index_chunks(chunks, rebuild=rebuild, batch_size=settings.rag_index_batch_size)
+
+
+def reindex_paths(paths: list[Path], collection: str | None = None) -> dict[str, int]:
+    """Re-chunk just the given files of a collection; missing or unsupported paths lose their records."""
+    config = get_collections().config(collection or settings.rag_default_collection)
+    retriever = get_retriever(config.name)
+    totals = {'files': 0, 'upserted': 0, 'deleted': 0}
+    try:
+        for path in paths:
+            chunks: Iterator[dict] = iter(())
+            if path.is_file() and is_supported(path):
+                chunks = (
+                    {'chunk_id': chunk.chunk_id, 'text': chunk.text, 'metadata': chunk.metadata}
+                    for chunk in iter_file_chunks(
+                        path,
+                        chunk_size=config.chunk_size,
+                        overlap=config.chunk_overlap,
+                        strategy=config.chunking,
+                    )
+                )
+            counts = retriever.replace_source(str(path), chunks, batch_size=settings.rag_index_batch_size)
+            totals['files'] += 1
+            totals['upserted'] += counts['upserted']
+            totals['deleted'] += counts['deleted']
+    finally:
+        # One embedding cache write for the whole batch, including files done before an error.
+        retriever.flush()
+    return totals
+
+
+def _watched_roots() -> dict[str, str]:
+    manager = get_collections()
+    roots = {}
+    for name in manager.names():
+        try:
+            roots[name] = manager.config(name).data_dir
+        except UnknownCollectionError:
+            continue
+    return roots
+
+
+def get_watcher() -> DirectoryWatcher:
+    """Watcher feeding changed files of every collection's data dir into ``reindex_paths``."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = DirectoryWatcher(
+                roots=_watched_roots,
+                on_change=lambda name, paths: reindex_paths(paths, collection=name),
+                backend=settings.rag_watch_backend,
+                interval=settings.rag_watch_interval_seconds,
+                debounce=settings.rag_watch_debounce_seconds,
+                max_delay=settings.rag_watch_max_delay_seconds,
+                max_files_per_cycle=settings.rag_watch_max_files_per_cycle,
+            )
+        return _watcher
+
+
+def build_scratch_retriever(
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    embedding_dimension: int | None = None,
+    strategy: str | None = None,
+    quantization: str | None = None,
+    collection: str | None = None,
+) -> RagRetriever:
+    """Index a collection's data dir into a throwaway in-memory store, e.g. to evaluate an alternative config.
+
+    Parameters left unset fall back to the collection's own configuration.
+    """
+    config = get_collections().config(collection or settings.rag_default_collection)
+    retriever = RagRetriever(
+        embedding_model=build_embedding_model(dimension=embedding_dimension or config.embedding_dimension),
+        vector_store=_build_vector_store(None, quantization=quantization or config.quantization),
+        lexical_index=_build_lexical_index(),
+    )
+    retriever.index_chunks(
+        _chunk_payload(
+            chunk_size=chunk_size or config.chunk_size,
+            overlap=overlap if overlap is not None else config.chunk_overlap,
+            strategy=strategy or config.chunking,
+            data_dir=config.data_dir,
+        ),
+        batch_size=settings.rag_index_batch_size,
+    )
+    return retriever
@@ -1,10 +1,40 @@
 from __future__ import annotations
 
+import heapq
 import json
 import math
+import os
+import random
+import shutil
+import tempfile
 import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+from app.rag.filters import MetadataFilter, MetadataIndex
+from app.rag.persistence import WriteAheadLog, atomic_write_chunks
+from app.rag.quantization import BaseQuantizer, build_quantizer
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; scoring falls back to pure Python.
+    np = None
+
+
+_search_pool_lock = threading.Lock()
+_search_pool: ThreadPoolExecutor | None = None
+
+
+def _get_search_pool() -> ThreadPoolExecutor:
+    # One pool for every store: shard scans are short and never wait on each other.
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='vector-shard')
+        return _search_pool
 
 
 @dataclass
@@ -19,8 +49,9 @@ class VectorRecord:
 class RetrievalResult:
     record_id: str
     text: str
-    score: float
+    score: float  # cosine similarity to the query
     metadata: dict
+    fused_score: float | None = None  # the hybrid ranking value (RRF or weighted), when fused
 
 
 def cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
@@ -34,96 +65,919 @@ def cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
     return dot / (n1 * n2)
 
 
+class _MemoryRows:
+    """Full-precision float32 rows packed into one C array.
+
+    numpy views over the array are created per call and never kept: a live buffer export would
+    make the array refuse to grow.
+    """
+
+    on_disk = False
+
+    def __init__(self, dimension: int) -> None:
+        self._dim = dimension
+        self._data = array('f')
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data) * self._data.itemsize
+
+    def append(self, row: list[float]) -> None:
+        self._data.extend(array('f', row))
+
+    def set(self, pos: int, row: list[float]) -> None:
+        self._data[pos * self._dim : (pos + 1) * self._dim] = array('f', row)
+
+    def get(self, pos: int) -> list[float]:
+        return self._data[pos * self._dim : (pos + 1) * self._dim].tolist()
+
+    def snapshot(self) -> _MemoryRows:
+        """A private copy (one memcpy) to read from while the store keeps changing."""
+        copy = _MemoryRows(self._dim)
+        copy._data = self._data[:]
+        return copy
+
+    def matrix(self):
+        return np.frombuffer(self._data, dtype=np.float32).reshape(-1, self._dim)
+
+    def take(self, positions: list[int]):
+        return self.matrix()[positions]
+
+    def batches(self, size: int) -> Iterator:
+        matrix = self.matrix()
+        for start in range(0, len(matrix), size):
+            yield matrix[start : start + size]
+
+    def keep(self, positions: list[int]) -> None:
+        data = array('f')
+        for pos in positions:
+            data.extend(self._data[pos * self._dim : (pos + 1) * self._dim])
+        self._data = data
+
+    def close(self) -> None:
+        self._data = array('f')
+
+
+class _FileRows:
+    """Full-precision float32 rows kept in a scratch file next to the store, read back on demand.
+
+    Used when a quantizer holds the in-memory copy, so only re-rank candidates touch the disk.
+    The file is anonymous: two instances of the same store (e.g. one evicted collection still
+    serving a request while its replacement loads) never share it, and it vanishes on close.
+    """
+
+    on_disk = True
+
+    def __init__(self, directory: Path, prefix: str, dimension: int) -> None:
+        self._dim = dimension
+        self._row_bytes = dimension * 4
+        self._count = 0
+        self._directory = directory
+        self._prefix = prefix
+        directory.mkdir(parents=True, exist_ok=True)
+        self._file = self._open()
+
+    def _open(self):
+        return tempfile.TemporaryFile(dir=self._directory, prefix=self._prefix, suffix='.f32')
+
+    @property
+    def nbytes(self) -> int:
+        return 0
+
+    def append(self, row: list[float]) -> None:
+        self.set(self._count, row)
+        self._count += 1
+
+    def set(self, pos: int, row: list[float]) -> None:
+        self._file.seek(pos * self._row_bytes)
+        self._file.write(array('f', row).tobytes())
+
+    def _read(self, pos: int) -> array:
+        self._file.seek(pos * self._row_bytes)
+        row = array('f')
+        row.frombytes(self._file.read(self._row_bytes))
+        return row
+
+    def get(self, pos: int) -> list[float]:
+        return self._read(pos).tolist()
+
+    def snapshot(self) -> _FileRows:
+        """A private copy of the scratch file (a sequential file copy) to read from while the store
+        keeps changing."""
+        copy = _FileRows(self._directory, self._prefix, self._dim)
+        self._file.flush()
+        self._file.seek(0)
+        shutil.copyfileobj(self._file, copy._file, 1024 * 1024)
+        copy._count = self._count
+        return copy
+
+    def take(self, positions: list[int]):
+        self._file.flush()
+        # Read in file order to keep the access pattern as sequential as possible.
+        rows = {pos: self._read(pos) for pos in sorted(set(positions))}
+        return np.asarray([rows[pos] for pos in positions], dtype=np.float32).reshape(-1, self._dim)
+
+    def batches(self, size: int) -> Iterator:
+        self._file.flush()
+        self._file.seek(0)
+        for start in range(0, self._count, size):
+            count = min(size, self._count - start)
+            data = self._file.read(count * self._row_bytes)
+            yield np.frombuffer(data, dtype=np.float32).reshape(count, self._dim)
+
+    def keep(self, positions: list[int]) -> None:
+        self._file.flush()
+        fresh = self._open()
+        for pos in positions:
+            fresh.write(self._read(pos).tobytes())
+        self._file.close()
+        self._file = fresh
+        self._count = len(positions)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _MappedRows:
+    """Read-only float32 rows over a buffer owned by someone else, e.g. a memory-mapped file.
+
+    Processes mapping the same file share one copy of the rows through the page cache.
+    """
+
+    on_disk = False
+
+    def __init__(self, buffer, dimension: int) -> None:
+        self._dim = dimension
+        self._buffer = buffer
+
+    @property
+    def nbytes(self) -> int:
+        return 0
+
+    @property
+    def shared_bytes(self) -> int:
+        return len(self._buffer)
+
+    def append(self, row: list[float]) -> None:
+        raise RuntimeError('Mapped rows are read-only')
+
+    def set(self, pos: int, row: list[float]) -> None:
+        raise RuntimeError('Mapped rows are read-only')
+
+    def keep(self, positions: list[int]) -> None:
+        raise RuntimeError('Mapped rows are read-only')
+
+    def get(self, pos: int) -> list[float]:
+        return memoryview(self._buffer).cast('f')[pos * self._dim : (pos + 1) * self._dim].tolist()
+
+    def matrix(self):
+        return np.frombuffer(self._buffer, dtype=np.float32).reshape(-1, self._dim)
+
+    def take(self, positions: list[int]):
+        return self.matrix()[positions]
+
+    def batches(self, size: int) -> Iterator:
+        matrix = self.matrix()
+        for start in range(0, len(matrix), size):
+            yield matrix[start : start + size]
+
+    def close(self) -> None:
+        self._buffer = b''
+
+
 class JsonVectorStore:
-    def __init__(self, path: str) -> None:
-        self._path = Path(path)
+    """Vector store persisted as a JSON snapshot plus a write-ahead log, held in memory as columns
+    plus packed float32 rows.
+
+    ``save`` appends only the operations since the previous save to ``<stem>.wal`` (one fsync per
+    batch); once the log outgrows the snapshot, a background compaction rewrites the snapshot
+    atomically and trims the log. Loading reads the snapshot and replays the newer log entries.
+
+    With ``quantization`` set to ``int8`` or ``pq`` the scan runs over compressed codes and only
+    the best ``rerank_candidates`` rows are re-scored exactly; for a store with a path the
+    full-precision rows then live in a scratch file beside it instead of memory.
+
+    Records live in slots found through an id -> slot map, so upserts are O(1). Deletes leave
+    tombstoned slots that searches skip; once they make up a quarter of the store the slots are
+    compacted.
+
+    Exact numpy scans over more than ``shard_min_rows`` rows are split into up to ``search_shards``
+    row ranges scored on a shared thread pool (numpy releases the GIL); each shard keeps its own
+    top-k and the candidates are merged into the global top-k.
+    """
+
+    def __init__(
+        self,
+        path: str | None,
+        quantization: str = 'none',
+        pq_subspaces: int = 48,
+        pq_train_size: int = 20_000,
+        rerank_candidates: int = 100,
+        compact_min_bytes: int = 8 * 1024 * 1024,
+        compact_ratio: float = 1.0,
+        background_compaction: bool = True,
+        search_shards: int = 1,
+        shard_min_rows: int = 65_536,
+    ) -> None:
+        # A store without a path is kept in memory only (used for ad-hoc evaluation indexes).
+        self._path = Path(path) if path else None
+        self._wal = WriteAheadLog(self._path.with_name(f'{self._path.stem}.wal')) if self._path else None
+        self._compact_min_bytes = compact_min_bytes
+        self._compact_ratio = compact_ratio
+        self._background_compaction = background_compaction
+        self._pending: list[dict] = []
+        # Serializes log appends and compactions; searches only take ``_lock``.
+        self._persist_lock = threading.Lock()
+        self._compacting = False
+        self._quantization = quantization.lower()
+        self._pq_subspaces = pq_subspaces
+        self._pq_train_size = pq_train_size
+        self._rerank_candidates = rerank_candidates
+        self._search_shards = search_shards if search_shards > 0 else os.cpu_count() or 1
+        self._shard_min_rows = max(1, shard_min_rows)
         self._lock = threading.Lock()
-        self._records: list[VectorRecord] = []
-        self._dim: int | None = None
+        self._rows: _MemoryRows | _FileRows | None = None
+        self._quantizer: BaseQuantizer | None = None
+        # Codebook training runs off ``_lock``; the epoch changes whenever slots are renumbered or
+        # dropped, and ``_train_dirty`` collects the slots written meanwhile, to re-encode at the swap.
+        self._train_lock = threading.Lock()
+        self._train_dirty: set[int] | None = None
+        self._slot_epoch = 0
+        self._reset()
         self.load()
 
+    def _reset(self) -> None:
+        if self._rows is not None:
+            self._rows.close()
+        self._ids: list[str] = []
+        self._texts: list[str] = []
+        self._metadata: list[dict] = []
+        self._positions: dict[str, int] = {}
+        self._live = bytearray()
+        self._dead = 0
+        self._norms = array('f')
+        self._text_chars = 0
+        self._metadata_index = MetadataIndex()
+        self._rows = None
+        self._quantizer = None
+        self._dim: int | None = None
+        self._slot_epoch += 1
+
+    def _init_storage(self, dimension: int) -> None:
+        self._dim = dimension
+        self._quantizer = build_quantizer(
+            self._quantization,
+            dimension,
+            pq_subspaces=self._pq_subspaces,
+            pq_train_size=self._pq_train_size,
+        )
+        if self._quantizer is not None and self._path is not None and np is not None:
+            self._rows = _FileRows(self._path.parent, f'{self._path.stem}.vectors.', dimension)
+        else:
+            self._rows = _MemoryRows(dimension)
+
     @property
     def size(self) -> int:
         with self._lock:
-            return len(self._records)
+            return len(self._ids) - self._dead
+
+    @property
+    def tombstones(self) -> int:
+        with self._lock:
+            return self._dead
 
     @property
     def dimension(self) -> int | None:
         with self._lock:
             return self._dim
 
+    @property
+    def generation(self) -> int:
+        """Changes whenever the records change behind this instance's back; never, for a local store."""
+        return 0
+
+    @property
+    def pending_ops(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def pending_record_ids(self) -> list[str] | None:
+        """Ids the unsaved operations write or delete; ``None`` when they include a ``clear``."""
+        with self._lock:
+            if any(op['op'] == 'clear' for op in self._pending):
+                return None
+            return [op['record_id'] for op in self._pending]
+
+    def changed_ids_between(self, old_generation: int, new_generation: int) -> set[str] | None:
+        """Ids written between two generations, or ``None`` when unknown; a local store has only one."""
+        return set() if old_generation == new_generation else None
+
+    def take_pending(self) -> list[dict]:
+        """Hand over the unsaved operations, e.g. to replay them onto a fresher copy of the store."""
+        with self._lock:
+            ops, self._pending = self._pending, []
+            return ops
+
+    def apply(self, ops: list[dict]) -> None:
+        """Apply logged operations (upsert, delete, clear) as if they had been made through this store."""
+        with self._lock:
+            self._replay_locked(ops)
+            if self._wal is not None:
+                if any(op['op'] == 'clear' for op in ops):
+                    self._pending = []
+                self._pending.extend(ops)
+
+    def memory_stats(self) -> dict:
+        with self._lock:
+            return {
+                'quantization': self._quantizer.name if self._quantizer is not None else 'none',
+                'vector_bytes_in_memory': self._rows.nbytes if self._rows is not None else 0,
+                'quantized_bytes': self._quantizer.nbytes if self._quantizer is not None else 0,
+                'full_precision_on_disk': self._rows.on_disk if self._rows is not None else False,
+                'estimated_bytes': self._estimated_bytes(),
+            }
+
+    def _estimated_bytes(self) -> int:
+        vectors = self._rows.nbytes if self._rows is not None else 0
+        quantized = self._quantizer.nbytes if self._quantizer is not None else 0
+        # Ids, metadata dicts and list slots cost a few hundred bytes per record on top of the text.
+        return vectors + quantized + self._text_chars + 300 * len(self._ids)
+
     def clear(self) -> None:
         with self._lock:
-            self._records.clear()
-            self._dim = None
+            self._reset()
+            if self._wal is not None:
+                # Unsaved operations are superseded by the clear.
+                self._pending = [{'op': 'clear'}]
 
     def upsert_many(self, records: list[VectorRecord]) -> None:
         if not records:
             return
 
         with self._lock:
-            if self._dim is None:
-                self._dim = len(records[0].embedding)
-
-            indexed = {rec.record_id: rec for rec in self._records}
+            dim = self._dim if self._dim is not None else len(records[0].embedding)
             for rec in records:
-                if len(rec.embedding) != self._dim:
+                if len(rec.embedding) != dim:
                     raise ValueError('Embedding dimension mismatch')
-                indexed[rec.record_id] = rec
-
-            self._records = list(indexed.values())
-
-    def search(self, query_embedding: list[float], top_k: int = 4) -> list[RetrievalResult]:
-        with self._lock:
-            scored: list[RetrievalResult] = []
-            for rec in self._records:
-                score = cosine_similarity(query_embedding, rec.embedding)
-                scored.append(
-                    RetrievalResult(
-                        record_id=rec.record_id,
-                        text=rec.text,
-                        score=score,
-                        metadata=rec.metadata,
-                    )
-                )
-
-        scored.sort(key=lambda item: item.score, reverse=True)
-        return scored[: max(1, top_k)]
-
-    def save(self) -> None:
-        with self._lock:
-            payload = {
-                'dimension': self._dim,
-                'records': [
+            # Re-indexing unchanged content (e.g. the startup index pass) writes and logs nothing.
+            changed = [rec for rec in records if not self._unchanged(rec)]
+            self._upsert_locked([(rec.record_id, rec.text, rec.embedding, rec.metadata) for rec in changed])
+            if self._wal is not None:
+                self._pending.extend(
                     {
+                        'op': 'upsert',
                         'record_id': rec.record_id,
                         'text': rec.text,
                         'embedding': rec.embedding,
                         'metadata': rec.metadata,
                     }
-                    for rec in self._records
-                ],
+                    for rec in changed
+                )
+
+    def _unchanged(self, rec: VectorRecord) -> bool:
+        pos = self._positions.get(rec.record_id)
+        return (
+            pos is not None
+            and self._texts[pos] == rec.text
+            and self._metadata[pos] == rec.metadata
+            and self._rows.get(pos) == array('f', rec.embedding).tolist()
+        )
+
+    def _upsert_locked(self, items: list[tuple[str, str, list[float], dict]]) -> None:
+        if not items:
+            return
+        if self._rows is None:
+            self._init_storage(len(items[0][2]))
+
+        written = [self._write(record_id, text, emb, metadata) for record_id, text, emb, metadata in items]
+        if self._quantizer is not None:
+            self._quantizer.set_rows(written, [item[2] for item in items])
+        if self._train_dirty is not None:
+            self._train_dirty.update(written)
+
+    def _write(self, record_id: str, text: str, embedding: list[float], metadata: dict) -> int:
+        norm = math.sqrt(sum(x * x for x in embedding))
+        pos = self._positions.get(record_id)
+        if pos is None:
+            pos = len(self._ids)
+            self._positions[record_id] = pos
+            self._ids.append(record_id)
+            self._live.append(1)
+            self._texts.append(text)
+            self._text_chars += len(text)
+            self._metadata.append(metadata)
+            self._norms.append(norm)
+            self._rows.append(embedding)
+        else:
+            self._metadata_index.discard(pos, self._metadata[pos])
+            self._text_chars += len(text) - len(self._texts[pos])
+            self._texts[pos] = text
+            self._metadata[pos] = metadata
+            self._norms[pos] = norm
+            self._rows.set(pos, embedding)
+        self._metadata_index.add(pos, metadata)
+        return pos
+
+    def delete_many(self, record_ids: list[str]) -> list[str]:
+        """Tombstone the given records; returns the ids that existed."""
+        with self._lock:
+            deleted = [record_id for record_id in dict.fromkeys(record_ids) if self._delete(record_id)]
+            if self._wal is not None:
+                self._pending.extend({'op': 'delete', 'record_id': record_id} for record_id in deleted)
+            if self._dead > 1024 and self._dead * 4 > len(self._ids):
+                self._compact_slots()
+            return deleted
+
+    def delete_where(self, metadata_filter: MetadataFilter) -> list[str]:
+        """Tombstone every record matching the filter (e.g. all chunks of one ``source_path``)."""
+        if metadata_filter.is_empty:
+            raise ValueError('Refusing to delete with an empty filter; use clear() instead')
+        return self.delete_many(list(self.filter_ids(metadata_filter)))
+
+    def _delete(self, record_id: str) -> bool:
+        pos = self._positions.pop(record_id, None)
+        if pos is None:
+            return False
+        self._metadata_index.discard(pos, self._metadata[pos])
+        self._live[pos] = 0
+        self._dead += 1
+        self._text_chars -= len(self._texts[pos])
+        # Release the payload now; the slot itself is reclaimed by compaction.
+        self._texts[pos] = ''
+        self._metadata[pos] = {}
+        self._norms[pos] = 0.0
+        return True
+
+    def _compact_slots(self) -> None:
+        if not self._dead:
+            return
+        keep = [pos for pos in range(len(self._ids)) if self._live[pos]]
+        self._ids = [self._ids[pos] for pos in keep]
+        self._texts = [self._texts[pos] for pos in keep]
+        self._metadata = [self._metadata[pos] for pos in keep]
+        self._norms = array('f', (self._norms[pos] for pos in keep))
+        self._rows.keep(keep)
+        if self._quantizer is not None:
+            self._quantizer.keep(keep)
+        self._live = bytearray(b'\x01') * len(keep)
+        self._dead = 0
+        self._slot_epoch += 1
+        self._positions = {record_id: pos for pos, record_id in enumerate(self._ids)}
+        self._metadata_index = MetadataIndex()
+        for pos, metadata in enumerate(self._metadata):
+            self._metadata_index.add(pos, metadata)
+
+    def _dead_mask(self):
+        return np.frombuffer(self._live, dtype=np.uint8) == 0
+
+    def iter_texts(self) -> Iterator[tuple[str, str]]:
+        with self._lock:
+            items = [(record_id, self._texts[pos]) for pos, record_id in enumerate(self._ids) if self._live[pos]]
+        yield from items
+
+    def _select(self, metadata_filter: MetadataFilter | None) -> list[int] | None:
+        if metadata_filter is None or metadata_filter.is_empty:
+            return None
+        return sorted(self._metadata_index.select(metadata_filter))
+
+    def filter_ids(self, metadata_filter: MetadataFilter) -> set[str]:
+        """Ids of the records matching the filter, resolved from the metadata index."""
+        with self._lock:
+            return {self._ids[pos] for pos in self._metadata_index.select(metadata_filter)}
+
+    def texts_of(self, record_ids: Iterable[str]) -> dict[str, str]:
+        """Texts of those of the given records that exist."""
+        with self._lock:
+            return {
+                record_id: self._texts[self._positions[record_id]]
+                for record_id in record_ids
+                if record_id in self._positions
             }
 
-        self._path.parent.mkdir(parents=True, exist_ok=True)
-        self._path.write_text(json.dumps(payload), encoding='utf-8')
+    def embeddings_of(self, record_ids: list[str]) -> list[list[float]]:
+        """Stored vectors of the given records; ids that no longer exist get a zero vector."""
+        with self._lock:
+            missing = [0.0] * (self._dim or 0)
+            return [
+                self._rows.get(self._positions[record_id]) if record_id in self._positions else missing
+                for record_id in record_ids
+            ]
+
+    def _result(self, pos: int, score: float) -> RetrievalResult:
+        return RetrievalResult(
+            record_id=self._ids[pos],
+            text=self._texts[pos],
+            score=score,
+            metadata=self._metadata[pos],
+        )
+
+    def score_ids(self, query_embedding: list[float], record_ids: list[str]) -> list[RetrievalResult]:
+        """Score only the given records (e.g. lexical candidates) instead of scanning the store."""
+        with self._lock:
+            positions = [self._positions[rid] for rid in record_ids if rid in self._positions]
+            if not positions:
+                return []
+            scores = self._exact_scores(query_embedding, positions)
+            return [self._result(pos, score) for pos, score in zip(positions, scores)]
+
+    def _exact_scores(self, query_embedding: list[float], positions: list[int]) -> list[float]:
+        """Cosine similarity against full-precision rows."""
+        if len(query_embedding) != self._dim:
+            return [0.0] * len(positions)
+
+        if np is not None:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            q_norm = float(np.linalg.norm(query)) or 1.0
+            norms = np.asarray([self._norms[pos] or 1.0 for pos in positions], dtype=np.float32)
+            return (self._rows.take(positions) @ query / (norms * q_norm)).tolist()
+
+        q_norm = math.sqrt(sum(x * x for x in query_embedding))
+        scores = []
+        for pos in positions:
+            n2 = self._norms[pos]
+            if q_norm == 0 or n2 == 0:
+                scores.append(0.0)
+            else:
+                scores.append(sum(a * b for a, b in zip(query_embedding, self._rows.get(pos))) / (q_norm * n2))
+        return scores
+
+    def search(
+        self,
+        query_embedding: list[float],
+        top_k: int = 4,
+        metadata_filter: MetadataFilter | None = None,
+    ) -> list[RetrievalResult]:
+        return self.search_many([query_embedding], top_k=top_k, metadata_filter=metadata_filter)[0]
+
+    def search_many(
+        self,
+        query_embeddings: list[list[float]],
+        top_k: int = 4,
+        metadata_filter: MetadataFilter | None = None,
+    ) -> list[list[RetrievalResult]]:
+        """Score every query against the store (or the records matching the filter) in one pass."""
+        if not query_embeddings:
+            return []
+
+        k = max(1, top_k)
+        with self._lock:
+            positions = self._select(metadata_filter)
+            if len(self._ids) == self._dead or positions == []:
+                return [[] for _ in query_embeddings]
+            if self._quantizer is not None:
+                ranked = self._rank_quantized(query_embeddings, k, positions)
+            elif np is not None:
+                ranked = self._rank_matrix(query_embeddings, k, positions)
+            else:
+                ranked = self._rank_python(query_embeddings, k, positions)
+
+            return [[self._result(pos, score) for pos, score in row] for row in ranked]
+
+    def _rank_python(
+        self,
+        query_embeddings: list[list[float]],
+        k: int,
+        positions: list[int] | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        queries = [(q, math.sqrt(sum(x * x for x in q))) for q in query_embeddings]
+        # Min-heaps of (score, -idx) so ties keep the earliest record, like a stable sort.
+        heaps: list[list[tuple[float, int]]] = [[] for _ in queries]
+        for idx in positions if positions is not None else range(len(self._ids)):
+            if not self._live[idx]:
+                continue
+            emb = self._rows.get(idx)
+            n2 = self._norms[idx]
+            for heap, (q, n1) in zip(heaps, queries):
+                if n1 == 0 or n2 == 0 or len(q) != len(emb):
+                    score = 0.0
+                else:
+                    score = sum(a * b for a, b in zip(q, emb)) / (n1 * n2)
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -idx))
+                elif (score, -idx) > heap[0]:
+                    heapq.heapreplace(heap, (score, -idx))
+
+        return [[(-neg_idx, score) for score, neg_idx in sorted(heap, reverse=True)] for heap in heaps]
+
+    def _rank_matrix(
+        self,
+        query_embeddings: list[list[float]],
+        k: int,
+        positions: list[int] | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self._dim:
+            return self._rank_python(query_embeddings, k, positions)
+        q_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        q_norms[q_norms == 0] = 1.0
+        norms = np.frombuffer(self._norms, dtype=np.float32)
+        if positions is None:
+            matrix, norms = self._rows.matrix(), norms.copy()
+        else:
+            matrix, norms = self._rows.take(positions), norms[positions]
+        norms[norms == 0] = 1.0
+        dead = self._dead_mask() if positions is None and self._dead else None
+        k = min(k, len(matrix) - (self._dead if positions is None else 0))
+        unit_queries = queries / q_norms
+
+        def scan(lo: int, hi: int):
+            scores = unit_queries @ matrix[lo:hi].T / norms[lo:hi]
+            if dead is not None:
+                scores[:, dead[lo:hi]] = -np.inf
+            shard_k = min(k, hi - lo)
+            top = np.argpartition(-scores, shard_k - 1, axis=1)[:, :shard_k]
+            return top + lo, np.take_along_axis(scores, top, axis=1)
+
+        bounds = self._shard_bounds(len(matrix))
+        if len(bounds) == 1:
+            candidates, scores = scan(0, len(matrix))
+        else:
+            shards = list(_get_search_pool().map(lambda bound: scan(*bound), bounds))
+            candidates = np.concatenate([shard[0] for shard in shards], axis=1)
+            scores = np.concatenate([shard[1] for shard in shards], axis=1)
+
+        ranked: list[list[tuple[int, float]]] = []
+        for row_candidates, row_scores in zip(candidates, scores):
+            # Best score first; ties keep the earliest record, like a stable sort.
+            order = np.lexsort((row_candidates, -row_scores))[:k]
+            if positions is None:
+                ranked.append([(int(row_candidates[i]), float(row_scores[i])) for i in order])
+            else:
+                ranked.append([(positions[row_candidates[i]], float(row_scores[i])) for i in order])
+        return ranked
+
+    def _shard_bounds(self, rows: int) -> list[tuple[int, int]]:
+        shards = max(1, min(self._search_shards, rows // self._shard_min_rows))
+        step = max(1, -(-rows // shards))
+        return [(lo, min(lo + step, rows)) for lo in range(0, rows, step)] or [(0, 0)]
+
+    def _rank_quantized(
+        self,
+        query_embeddings: list[list[float]],
+        k: int,
+        positions: list[int] | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        # Codebooks are trained by ``train_quantizer``, never here; until then PQ scores int8 codes.
+        quantizer = self._quantizer
+        total = len(self._ids)
+        if positions is None and self._dead:
+            if np is not None:
+                positions = np.flatnonzero(~self._dead_mask()).tolist()
+            else:
+                positions = [pos for pos in range(total) if self._live[pos]]
+        scope = positions if positions is not None else range(total)
+        pool = min(len(scope), max(k, self._rerank_candidates))
+        if np is not None:
+            norms = np.frombuffer(self._norms, dtype=np.float32)
+            norms = norms.copy() if positions is None else norms[positions]
+            norms[norms == 0] = 1.0
+        ranked: list[list[tuple[int, float]]] = []
+        for query in query_embeddings:
+            if len(query) != self._dim:
+                ranked.extend(self._rank_python([query], k, positions))
+                continue
+
+            if pool == len(scope):
+                # A selective filter leaves fewer records than the re-rank pool: score them exactly.
+                candidates = list(scope)
+            elif np is not None:
+                # Approximate scan over the codes, then an exact re-rank of the best candidates.
+                approx = np.asarray(quantizer.approx_dots(query, positions)) / norms
+                candidates = sorted(scope[idx] for idx in np.argpartition(-approx, pool - 1)[:pool].tolist())
+            else:
+                approx = quantizer.approx_dots(query, positions)
+                best = heapq.nlargest(
+                    pool,
+                    range(len(scope)),
+                    key=lambda idx: approx[idx] / (self._norms[scope[idx]] or 1.0),
+                )
+                candidates = sorted(scope[idx] for idx in best)
+            scores = self._exact_scores(query, candidates)
+            best = sorted(zip(candidates, scores), key=lambda item: (-item[1], item[0]))[:k]
+            ranked.append(best)
+        return ranked
+
+    def save(self) -> None:
+        """Durably log the operations since the last save; cost follows the changes, not the store.
+
+        Product-quantization codebooks are (re)trained here when the store needs them, so the k-means
+        pass runs at index time rather than on a search.
+        """
+        self.train_quantizer()
+        if self._wal is None:
+            return
+
+        with self._persist_lock:
+            self._log_pending()
+
+        if self._background_compaction and self.needs_compaction():
+            self._compact_in_background()
+
+    def _log_pending(self) -> None:
+        # Called with ``_persist_lock`` held. If the append fails, the operations go back in front
+        # of any made meanwhile, so the next save logs them instead of dropping them.
+        with self._lock:
+            ops, self._pending = self._pending, []
+        try:
+            self._wal.append(ops)
+        except BaseException:
+            with self._lock:
+                self._pending = ops + self._pending
+            raise
+
+    def train_quantizer(self) -> bool:
+        """Train the quantizer's codebooks if it needs them; returns whether new ones were swapped in.
+
+        Sampling and snapshotting the rows holds the store lock; k-means and encoding every row run on
+        the snapshot without it, so searches keep scoring the current codes meanwhile. Rows written
+        during training are re-encoded before the swap; a compaction or clear in between discards the
+        result, since the snapshot's slot numbers no longer apply.
+        """
+        if not self._train_lock.acquire(blocking=False):
+            return False  # already training
+        try:
+            with self._lock:
+                quantizer = self._quantizer
+                total = len(self._ids)
+                if quantizer is None or not total or not quantizer.needs_training(total):
+                    return False
+                picked = random.Random(0).sample(range(total), min(total, quantizer.train_size))
+                sample = self._rows.take(sorted(picked))
+                rows = self._rows.snapshot()
+                epoch = self._slot_epoch
+                self._train_dirty = set()
+
+            try:
+                trained = quantizer.trained(sample, rows.batches(4096))
+            finally:
+                rows.close()
+
+            with self._lock:
+                if self._quantizer is not quantizer or self._slot_epoch != epoch:
+                    return False
+                dirty = sorted(self._train_dirty)
+                if dirty:
+                    trained.set_rows(dirty, self._rows.take(dirty))
+                self._quantizer = trained
+                return True
+        finally:
+            with self._lock:
+                self._train_dirty = None
+            self._train_lock.release()
+
+    def _train_in_background(self) -> None:
+        with self._lock:
+            if self._quantizer is None or not self._quantizer.needs_training(len(self._ids)):
+                return
+        threading.Thread(target=self.train_quantizer, name='vector-store-training', daemon=True).start()
+
+    def needs_compaction(self) -> bool:
+        if self._wal is None:
+            return False
+        wal_bytes = self._wal.size_bytes
+        if wal_bytes < self._compact_min_bytes:
+            return False
+        snapshot_bytes = self._path.stat().st_size if self._path.exists() else 0
+        return wal_bytes > snapshot_bytes * self._compact_ratio
+
+    def _compact_in_background(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run() -> None:
+            try:
+                self.compact()
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+        threading.Thread(target=run, name='vector-store-compaction', daemon=True).start()
+
+    def compact(self) -> None:
+        """Reclaim tombstoned slots, then (for a persisted store) fold the log into a new snapshot.
+
+        The snapshot is replaced via atomic rename, then the log entries it covers are dropped.
+        Only copying the columns and rows holds the store lock; searches and upserts go on while
+        the copy is serialized.
+        """
+        with self._lock:
+            self._compact_slots()
+        if self._wal is None:
+            return
+
+        with self._persist_lock:
+            self._log_pending()
+
+            with self._lock:
+                seq = self._wal.last_seq
+                dimension = self._dim
+                ids, texts, metadata = list(self._ids), list(self._texts), list(self._metadata)
+                live = bytes(self._live)
+                rows = self._rows.snapshot() if self._rows is not None else None
+
+            try:
+                atomic_write_chunks(self._path, _snapshot_chunks(dimension, seq, ids, texts, metadata, live, rows))
+            finally:
+                if rows is not None:
+                    rows.close()
+            self._wal.truncate_through(seq)
 
     def load(self) -> None:
-        if not self._path.exists():
+        if self._path is None:
             return
 
-        payload = json.loads(self._path.read_text(encoding='utf-8'))
-        records = []
-        for item in payload.get('records', []):
-            records.append(
-                VectorRecord(
-                    record_id=item['record_id'],
-                    text=item['text'],
-                    embedding=item['embedding'],
-                    metadata=item.get('metadata', {}),
-                )
+        payload = json.loads(self._path.read_text(encoding='utf-8')) if self._path.exists() else {}
+        snapshot_seq = payload.get('wal_seq', 0)
+        self._wal.advance_to(snapshot_seq)
+        with self._lock:
+            self._reset()
+            self._pending = []
+            records = payload.get('records', [])
+            dimension = payload.get('dimension') or (len(records[0]['embedding']) if records else None)
+            if dimension:
+                self._init_storage(dimension)
+            self._upsert_locked(
+                [(item['record_id'], item['text'], item['embedding'], item.get('metadata', {})) for item in records]
             )
 
+            self._replay_locked(self._wal.replay(after_seq=snapshot_seq))
+            self._compact_slots()
+        self._train_in_background()
+
+    def _replay_locked(self, entries: Iterable[dict]) -> None:
+        batch: list[tuple[str, str, list[float], dict]] = []
+        for entry in entries:
+            if entry['op'] == 'upsert':
+                batch.append((entry['record_id'], entry['text'], entry['embedding'], entry.get('metadata', {})))
+                continue
+            self._upsert_locked(batch)
+            batch = []
+            if entry['op'] == 'delete':
+                self._delete(entry['record_id'])
+            elif entry['op'] == 'clear':
+                self._reset()
+        self._upsert_locked(batch)
+
+    def export(self, handle: BinaryIO) -> dict:
+        """Write the live rows to ``handle`` as packed float32 and return the matching columns.
+
+        Slots are compacted first, so row ``i`` of the output belongs to ``ids[i]``.
+        """
         with self._lock:
-            self._dim = payload.get('dimension')
-            self._records = records
+            self._compact_slots()
+            if self._rows is not None:
+                if np is not None:
+                    for batch in self._rows.batches(4096):
+                        handle.write(np.ascontiguousarray(batch, dtype=np.float32).tobytes())
+                else:
+                    for pos in range(len(self._ids)):
+                        handle.write(array('f', self._rows.get(pos)).tobytes())
+            return {
+                'dimension': self._dim,
+                'ids': list(self._ids),
+                'texts': list(self._texts),
+                'metadata': list(self._metadata),
+                'norms': self._norms.tolist(),
+            }
+
+    @classmethod
+    def mapped(cls, columns: dict, rows, **options) -> JsonVectorStore:
+        """Read-only in-memory store over columns and a float32 row buffer written by ``export``."""
+        store = cls(None, **options)
+        with store._lock:
+            store._ids = columns['ids']
+            store._texts = columns['texts']
+            store._metadata = columns['metadata']
+            store._norms = array('f', columns['norms'])
+            store._live = bytearray(b'\x01') * len(store._ids)
+            store._text_chars = sum(len(text) for text in store._texts)
+            store._positions = {record_id: pos for pos, record_id in enumerate(store._ids)}
+            for pos, metadata in enumerate(store._metadata):
+                store._metadata_index.add(pos, metadata)
+            if columns['dimension']:
+                store._dim = columns['dimension']
+                store._rows = _MappedRows(rows, store._dim)
+        return store
+
+
+def _snapshot_chunks(
+    dimension: int | None,
+    seq: int,
+    ids: list[str],
+    texts: list[str],
+    metadata: list[dict],
+    live: bytes,
+    rows: _MemoryRows | _FileRows | None,
+) -> Iterator[str]:
+    """The snapshot JSON one record at a time, so it is never built as a single string."""
+    yield f'{{"dimension": {json.dumps(dimension)}, "wal_seq": {seq}, "records": ['
+    first = True
+    for pos, record_id in enumerate(ids):
+        if not live[pos]:
+            continue
+        record = {'record_id': record_id, 'text': texts[pos], 'embedding': rows.get(pos), 'metadata': metadata[pos]}
+        yield json.dumps(record) if first else ', ' + json.dumps(record)
+        first = False
+    yield ']}'
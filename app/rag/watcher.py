@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from app.rag.ingestion import collect_documents
+
+try:
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - optional dependency
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+Snapshot = dict[Path, tuple[int, int]]
+
+
+def _snapshot(root: str) -> Snapshot:
+    found: Snapshot = {}
+    for path in collect_documents(data_dir=root):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        found[path] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+
+class _RootEvents:
+    """watchdog handler for one collection; events only mark the root for a rescan.
+
+    The rescan diff names the changed files, so directory moves and editors' save-via-rename
+    dances need no special casing.
+    """
+
+    def __init__(self, watcher: DirectoryWatcher, name: str) -> None:
+        self._watcher = watcher
+        self._name = name
+
+    def dispatch(self, event) -> None:
+        self._watcher._mark_dirty(self._name)
+
+
+class DirectoryWatcher:
+    """Background thread that keeps collections in sync with the files in their data dirs.
+
+    With the ``native`` backend (watchdog: inotify, FSEvents or ReadDirectoryChangesW) file events
+    trigger a rescan of the affected data dir; the ``polling`` backend rescans every ``interval``
+    seconds by comparing mtimes and sizes. Changes are debounced until nothing has changed for
+    ``debounce`` seconds (but at most ``max_delay`` after the first one), then the changed paths
+    are handed to ``on_change`` at most ``max_files_per_cycle`` at a time. All work runs on this
+    one thread, so indexing never takes more than a core away from request handling.
+
+    ``roots`` is re-read every cycle, so collections registered or removed at runtime are picked
+    up. A collection's first scan only records a baseline; files changed before it are left to
+    ``/rag/index``.
+    """
+
+    def __init__(
+        self,
+        roots: Callable[[], dict[str, str]],
+        on_change: Callable[[str, list[Path]], None],
+        backend: str = 'auto',
+        interval: float = 2.0,
+        debounce: float = 1.0,
+        max_delay: float = 10.0,
+        max_files_per_cycle: int = 64,
+    ) -> None:
+        self._roots_of = roots
+        self._on_change = on_change
+        self._backend = self._resolve_backend(backend)
+        self._interval = max(0.05, interval)
+        self._debounce = max(0.0, debounce)
+        self._max_delay = max(self._debounce, max_delay)
+        self._max_files_per_cycle = max(1, max_files_per_cycle)
+        self._tick = max(0.05, min(self._interval, self._debounce or self._interval) / 2)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._observer = None
+        self._watches: dict[str, object] = {}
+        self._roots: dict[str, str] = {}
+        self._snapshots: dict[str, Snapshot] = {}
+        self._dirty_roots: set[str] = set()
+        self._pending: dict[str, set[Path]] = {}
+        self._first_change: float | None = None
+        self._last_change: float | None = None
+
+        self.cycles = 0
+        self.reindexed_files = 0
+        self.errors = 0
+        self.last_error: str | None = None
+        self.last_lag_seconds: float | None = None
+
+    @staticmethod
+    def _resolve_backend(backend: str) -> str:
+        backend = backend.lower()
+        if backend not in {'auto', 'native', 'polling'}:
+            raise ValueError(f'Unknown watch backend: {backend}')
+        if backend == 'polling':
+            return 'polling'
+        if Observer is None:
+            if backend == 'native':
+                logger.warning('Native file watching needs watchdog; falling back to polling.')
+            return 'polling'
+        return 'native'
+
+    @property
+    def backend(self) -> str:
+        return self._backend
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self._stop.clear()
+        if self._backend == 'native':
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+        self._thread = threading.Thread(target=self._run, name='rag-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching; a re-index in progress finishes first, pending changes are dropped."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._watches.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(len(paths) for paths in self._pending.values())
+            collections = sorted(self._roots)
+        return {
+            'running': self.is_running,
+            'backend': self._backend,
+            'collections': collections,
+            'pending_files': pending,
+            'cycles': self.cycles,
+            'reindexed_files': self.reindexed_files,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'last_lag_seconds': round(self.last_lag_seconds, 3) if self.last_lag_seconds is not None else None,
+        }
+
+    def _mark_dirty(self, name: str) -> None:
+        with self._lock:
+            self._dirty_roots.add(name)
+            self._note_change_locked(time.monotonic())
+
+    def _note_change_locked(self, now: float) -> None:
+        if self._first_change is None:
+            self._first_change = now
+        self._last_change = now
+
+    def _settled_locked(self, now: float) -> bool:
+        if self._last_change is None:
+            return False
+        return now - self._last_change >= self._debounce or now - self._first_change >= self._max_delay
+
+    def _run(self) -> None:
+        next_scan = 0.0
+        while not self._stop.is_set():
+            try:
+                self._sync_roots()
+                now = time.monotonic()
+                if self._backend == 'polling' and now >= next_scan:
+                    for name in list(self._roots):
+                        self._scan(name)
+                    next_scan = now + self._interval
+                self._flush(now)
+            except Exception as exc:  # keep watching; the next cycle retries
+                logger.exception('File watcher cycle failed')
+                self.errors += 1
+                self.last_error = str(exc)
+            self._stop.wait(self._tick)
+
+    def _sync_roots(self) -> None:
+        roots = self._roots_of()
+        for name in set(self._roots) - set(roots):
+            self._unwatch(name)
+        for name, root in roots.items():
+            if self._roots.get(name) != root:
+                self._unwatch(name)
+                with self._lock:
+                    self._roots[name] = root
+                self._snapshots[name] = _snapshot(root)
+            if self._observer is not None and name not in self._watches and Path(root).is_dir():
+                # A data dir created after startup is scheduled as soon as it exists.
+                self._watches[name] = self._observer.schedule(_RootEvents(self, name), root, recursive=True)
+                self._mark_dirty(name)
+
+    def _unwatch(self, name: str) -> None:
+        watch = self._watches.pop(name, None)
+        if watch is not None and self._observer is not None:
+            self._observer.unschedule(watch)
+        self._snapshots.pop(name, None)
+        with self._lock:
+            self._roots.pop(name, None)
+            self._pending.pop(name, None)
+            self._dirty_roots.discard(name)
+
+    def _scan(self, name: str) -> None:
+        previous = self._snapshots.get(name, {})
+        current = _snapshot(self._roots[name])
+        self._snapshots[name] = current
+        changed = {path for path, signature in current.items() if previous.get(path) != signature}
+        changed.update(path for path in previous if path not in current)
+        if changed:
+            with self._lock:
+                self._pending.setdefault(name, set()).update(changed)
+                if self._backend == 'polling':
+                    self._note_change_locked(time.monotonic())
+
+    def _flush(self, now: float) -> None:
+        with self._lock:
+            if not self._settled_locked(now):
+                return
+            dirty = sorted(self._dirty_roots)
+            self._dirty_roots.clear()
+        for name in dirty:
+            if name in self._roots:
+                self._scan(name)
+
+        with self._lock:
+            budget = self._max_files_per_cycle
+            batches: list[tuple[str, list[Path]]] = []
+            for name in list(self._pending):
+                if budget <= 0:
+                    break
+                paths = sorted(self._pending[name])[:budget]
+                self._pending[name].difference_update(paths)
+                if not self._pending[name]:
+                    del self._pending[name]
+                batches.append((name, paths))
+                budget -= len(paths)
+            first_change = self._first_change
+            if not self._pending and not self._dirty_roots:
+                self._first_change = None
+                self._last_change = None
+
+        for name, paths in batches:
+            try:
+                self._on_change(name, paths)
+                self.reindexed_files += len(paths)
+            except Exception as exc:
+                logger.exception('Re-indexing %d changed file(s) of %s failed', len(paths), name)
+                self.errors += 1
+                self.last_error = str(exc)
+                # Forget their signatures so the next scan of the collection retries them.
+                snapshot = self._snapshots.get(name, {})
+                for path in paths:
+                    snapshot.pop(path, None)
+        if batches:
+            self.cycles += 1
+            if first_change is not None:
+                self.last_lag_seconds = time.monotonic() - first_change
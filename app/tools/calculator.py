@@ -1,7 +1,13 @@
 from __future__ import annotations
 
 import ast
-from dataclasses import dataclass
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+from app.core.config import settings
 
 
 @dataclass
@@ -27,29 +33,103 @@ _ALLOWED_UNARY_OPS = {
 }
 
 
-def _eval_node(node: ast.AST) -> float:
+class _Budget:
+    __slots__ = ("deadline", "max_magnitude")
+
+    def __init__(self, seconds: float, max_magnitude: float) -> None:
+        self.deadline = time.perf_counter() + seconds
+        self.max_magnitude = max_magnitude
+
+    def check(self, value: float) -> float:
+        if isinstance(value, complex) or not math.isfinite(value) or abs(value) > self.max_magnitude:
+            raise ValueError("Value out of range")
+        if time.perf_counter() > self.deadline:
+            raise ValueError("Time budget exceeded")
+        return value
+
+
+def _check_power(base: float, exponent: float, budget: _Budget) -> None:
+    # Reject before computing: a huge power is where the time and memory would go.
+    if base == 0 or abs(base) == 1:
+        return
+    if exponent * math.log10(abs(base)) > math.log10(budget.max_magnitude):
+        raise ValueError("Value out of range")
+
+
+def _eval_node(node: ast.AST, budget: _Budget) -> float:
     if isinstance(node, ast.Expression):
-        return _eval_node(node.body)
+        return _eval_node(node.body, budget)
 
-    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
-        return float(node.value)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return budget.check(float(node.value))
 
     if isinstance(node, ast.UnaryOp) and type(node.op) in _ALLOWED_UNARY_OPS:
-        value = _eval_node(node.operand)
-        return _ALLOWED_UNARY_OPS[type(node.op)](value)
+        value = _eval_node(node.operand, budget)
+        return budget.check(_ALLOWED_UNARY_OPS[type(node.op)](value))
 
     if isinstance(node, ast.BinOp) and type(node.op) in _ALLOWED_BIN_OPS:
-        left = _eval_node(node.left)
-        right = _eval_node(node.right)
-        return _ALLOWED_BIN_OPS[type(node.op)](left, right)
+        left = _eval_node(node.left, budget)
+        right = _eval_node(node.right, budget)
+        if isinstance(node.op, ast.Pow):
+            _check_power(left, right, budget)
+        return budget.check(_ALLOWED_BIN_OPS[type(node.op)](left, right))
 
     raise ValueError("Unsupported expression")
 
 
+class _ResultCache:
+    """Thread-safe LRU of successful results keyed by the whitespace-free expression."""
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max(0, max_entries)
+        self._entries: OrderedDict[str, CalculatorResult] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CalculatorResult | None:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key: str, result: CalculatorResult) -> None:
+        if self._max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+# Per process: with the process-pool tool executor every worker keeps its own.
+_cache = _ResultCache(settings.calculator_cache_size)
+
+
+def _evaluate(expression: str) -> float:
+    if len(expression) > settings.calculator_max_expression_chars:
+        raise ValueError("Expression too long")
+    parsed = ast.parse(expression, mode="eval")
+    if sum(1 for _ in ast.walk(parsed)) > settings.calculator_max_nodes:
+        raise ValueError("Expression too complex")
+    budget = _Budget(settings.calculator_time_budget_seconds, settings.calculator_max_magnitude)
+    return _eval_node(parsed, budget)
+
+
 def calculate(expression: str) -> CalculatorResult:
+    """Evaluate arithmetic within length, node count, magnitude and time limits (see settings).
+
+    Every intermediate value is range-checked and powers are rejected before they are computed,
+    so no input can hold a worker for long; the time budget is checked between nodes as a backstop.
+    """
+    key = "".join(expression.split())
+    cached = _cache.get(key)
+    if cached is not None:
+        return replace(cached, expression=expression)
     try:
-        parsed = ast.parse(expression.strip(), mode="eval")
-        value = _eval_node(parsed)
-        return CalculatorResult(ok=True, expression=expression, result=value)
+        value = _evaluate(expression.strip())
     except Exception as exc:
         return CalculatorResult(ok=False, expression=expression, error=str(exc))
+    result = CalculatorResult(ok=True, expression=expression, result=value)
+    _cache.put(key, result)
+    return result
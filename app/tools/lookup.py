@@ -1,8 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, field
 
+from app.core.config import settings
+from app.rag.filters import MetadataFilter
 from app.rag.state import get_retriever
+from app.tools.lookup_store import (
+    CachedLookup,
+    LookupBackend,
+    MemoryLookupBackend,
+    SqliteLookupBackend,
+    normalize_key,
+)
 
 
 @dataclass
@@ -10,9 +20,10 @@ class LookupResult:
     key: str
     found: bool
     value: str | None = None
+    suggestions: list[str] = field(default_factory=list)
 
 
-# Simple in-memory key-value lookup to represent "database lookup" in Phase 6.
+# Seed data: the whole store with the memory backend, the initial rows of a new SQLite store.
 LOOKUP_DB = {
     "project": "High-Performance LLM Backend with FastAPI, RAG, and tool calling.",
     "framework": "FastAPI",
@@ -22,15 +33,64 @@ LOOKUP_DB = {
 }
 
 
+_lookup_lock = threading.Lock()
+_lookup: CachedLookup | None = None
+
+
+def _build_backend() -> LookupBackend:
+    backend = settings.lookup_backend.lower()
+    if backend == "sqlite":
+        return SqliteLookupBackend(settings.lookup_sqlite_path, seed=LOOKUP_DB)
+    if backend == "memory":
+        return MemoryLookupBackend(LOOKUP_DB)
+    raise ValueError(f"Unsupported lookup backend: {settings.lookup_backend}")
+
+
+def get_lookup() -> CachedLookup:
+    global _lookup
+    with _lookup_lock:
+        if _lookup is None:
+            _lookup = CachedLookup(
+                _build_backend(),
+                max_entries=settings.lookup_cache_size,
+                check_interval=settings.lookup_cache_check_seconds,
+            )
+        return _lookup
+
+
 def lookup_key(key: str) -> LookupResult:
-    normalized = key.strip().lower().replace(" ", "_")
-    value = LOOKUP_DB.get(normalized)
-    return LookupResult(key=normalized, found=value is not None, value=value)
+    normalized = normalize_key(key)
+    lookup = get_lookup()
+    value = lookup.get(normalized)
+    if value is not None:
+        return LookupResult(key=normalized, found=True, value=value)
+    suggestions = []
+    if settings.lookup_suggestions > 0:
+        matches = lookup.backend.fuzzy(
+            normalized,
+            limit=settings.lookup_suggestions,
+            min_score=settings.lookup_fuzzy_min_score,
+        )
+        suggestions = [match_key for match_key, _, _ in matches]
+    return LookupResult(key=normalized, found=False, suggestions=suggestions)
 
 
-def semantic_lookup(query: str, top_k: int = 3) -> list[dict]:
-    retriever = get_retriever()
-    matches = retriever.retrieve(query=query, top_k=top_k)
+def semantic_lookup(
+    query: str,
+    top_k: int = 3,
+    metadata_filter: MetadataFilter | None = None,
+    collection: str | None = None,
+    mmr_lambda: float | None = None,
+    cancel_event: threading.Event | None = None,
+) -> list[dict]:
+    retriever = get_retriever(collection)
+    matches = retriever.retrieve(
+        query=query,
+        top_k=top_k,
+        metadata_filter=metadata_filter,
+        mmr_lambda=mmr_lambda,
+        cancel_event=cancel_event,
+    )
     return [
         {
             "score": round(match.score, 4),
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Iterable
+
+_MISSING = object()
+_COMMON_GRAM_MIN_KEYS = 1_000
+_COMMON_GRAM_SHARE = 0.05
+
+
+def normalize_key(key: str) -> str:
+    return key.strip().lower().replace(" ", "_")
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[idx : idx + 3] for idx in range(len(padded) - 2)}
+
+
+def _similarity(query_grams: set[str], key: str) -> float:
+    # Dice coefficient over padded trigrams: 1.0 for equal keys, tolerant of typos and reordering.
+    key_grams = trigrams(key)
+    return 2 * len(query_grams & key_grams) / (len(query_grams) + len(key_grams))
+
+
+def _selective_grams(frequencies: dict[str, int], total: int) -> list[str]:
+    """The query trigrams worth reading postings for.
+
+    Trigrams shared by a large part of the keys (``sku``, ``_00``) make up most of the postings
+    while telling keys apart the least, so they are skipped unless fewer than two rarer ones are
+    left; candidates are then scored on all trigrams anyway.
+    """
+    present = sorted((count, gram) for gram, count in frequencies.items() if count)
+    cutoff = max(_COMMON_GRAM_MIN_KEYS, total * _COMMON_GRAM_SHARE)
+    selective = [gram for count, gram in present if count <= cutoff]
+    if len(selective) < 2:
+        selective = [gram for _, gram in present[:2]]
+    return selective
+
+
+def _shortlist_size(limit: int) -> int:
+    return max(limit * 8, 50)
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    # Every key starting with ``prefix`` sorts in [prefix, upper bound).
+    return prefix + "\U0010ffff"
+
+
+class LookupBackend(ABC):
+    """Key-value reference data for the ``lookup_key`` tool. Keys are stored normalized."""
+
+    name: str
+
+    @property
+    @abstractmethod
+    def size(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def prefix(self, prefix: str, limit: int = 10) -> list[tuple[str, str]]:
+        """Up to ``limit`` ``(key, value)`` pairs whose key starts with ``prefix``, in key order."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def fuzzy(self, query: str, limit: int = 5, min_score: float = 0.3) -> list[tuple[str, str, float]]:
+        """Up to ``limit`` ``(key, value, score)`` triples ranked by trigram similarity to ``query``."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_load(self, items: Iterable[tuple[str, str]], replace: bool = False) -> int:
+        """Insert or overwrite ``items`` (all of the data when ``replace``); returns how many were loaded."""
+        raise NotImplementedError
+
+    def version(self) -> int:
+        """Changes whenever the data may have changed, including from other processes."""
+        return 0
+
+
+class MemoryLookupBackend(LookupBackend):
+    """Dict for exact lookups, a sorted key list for prefix ranges and a trigram index for fuzzy
+    matching. Lives in one process; refreshed only through ``bulk_load``."""
+
+    name = "memory"
+
+    def __init__(self, items: dict[str, str] | None = None) -> None:
+        self._lock = threading.Lock()
+        self._data: dict[str, str] = {}
+        self._sorted_keys: list[str] = []
+        self._grams: dict[str, set[str]] = {}
+        self._version = 0
+        if items:
+            self.bulk_load(items.items())
+
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key: str) -> str | None:
+        return self._data.get(normalize_key(key))
+
+    def prefix(self, prefix: str, limit: int = 10) -> list[tuple[str, str]]:
+        prefix = normalize_key(prefix)
+        data, keys = self._data, self._sorted_keys
+        start = bisect.bisect_left(keys, prefix)
+        stop = bisect.bisect_left(keys, _prefix_upper_bound(prefix), lo=start)
+        return [(key, data[key]) for key in keys[start : min(stop, start + limit)]]
+
+    def fuzzy(self, query: str, limit: int = 5, min_score: float = 0.3) -> list[tuple[str, str, float]]:
+        query_grams = trigrams(normalize_key(query))
+        data, index = self._data, self._grams
+        frequencies = {gram: len(index.get(gram, ())) for gram in query_grams}
+        shared: Counter[str] = Counter()
+        for gram in _selective_grams(frequencies, len(data)):
+            shared.update(index[gram])
+        # Keys sharing the most trigrams first; the shortlist is then scored exactly.
+        shortlist = heapq.nlargest(_shortlist_size(limit), shared, key=shared.__getitem__)
+        scored = [(key, _similarity(query_grams, key)) for key in shortlist]
+        scored = [(key, score) for key, score in scored if score >= min_score]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return [(key, data[key], round(score, 4)) for key, score in scored[:limit]]
+
+    def bulk_load(self, items: Iterable[tuple[str, str]], replace: bool = False) -> int:
+        loaded = {normalize_key(key): value for key, value in items}
+        with self._lock:
+            data = dict(loaded) if replace else {**self._data, **loaded}
+            grams: dict[str, set[str]] = {}
+            for key in data:
+                for gram in trigrams(key):
+                    grams.setdefault(gram, set()).add(key)
+            # Readers hold references to the old structures and never see a half-built index.
+            self._data, self._sorted_keys, self._grams = data, sorted(data), grams
+            self._version += 1
+        return len(loaded)
+
+
+class SqliteLookupBackend(LookupBackend):
+    """SQLite file with the keys as a ``WITHOUT ROWID`` primary key (point and range lookups are
+    B-tree seeks) and a trigram table, with per-trigram key counts, for fuzzy matching.
+
+    Every process and thread opens its own connection in WAL mode, so readers never block on a
+    bulk load and see it as soon as it commits; data can be refreshed without a restart. A
+    ``version`` counter in the file tells caches in other processes that the data changed.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, seed: dict[str, str] | None = None) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+                    CREATE TABLE IF NOT EXISTS grams (
+                        gram TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (gram, key)
+                    ) WITHOUT ROWID;
+                    CREATE TABLE IF NOT EXISTS gram_stats (gram TEXT PRIMARY KEY, keys INTEGER NOT NULL) WITHOUT ROWID;
+                    CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+                    INSERT OR IGNORE INTO meta (name, value) VALUES ('version', 0), ('keys', 0);
+                    """
+                )
+        if seed and self.size == 0:
+            self.bulk_load(seed.items())
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def size(self) -> int:
+        return self._connection().execute("SELECT value FROM meta WHERE name = 'keys'").fetchone()[0]
+
+    def version(self) -> int:
+        return self._connection().execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+
+    def get(self, key: str) -> str | None:
+        row = self._connection().execute("SELECT value FROM kv WHERE key = ?", (normalize_key(key),)).fetchone()
+        return row[0] if row else None
+
+    def prefix(self, prefix: str, limit: int = 10) -> list[tuple[str, str]]:
+        prefix = normalize_key(prefix)
+        return self._connection().execute(
+            "SELECT key, value FROM kv WHERE key >= ? AND key < ? ORDER BY key LIMIT ?",
+            (prefix, _prefix_upper_bound(prefix), limit),
+        ).fetchall()
+
+    def fuzzy(self, query: str, limit: int = 5, min_score: float = 0.3) -> list[tuple[str, str, float]]:
+        query_grams = trigrams(normalize_key(query))
+        conn = self._connection()
+        placeholders = ",".join("?" * len(query_grams))
+        frequencies = dict(
+            conn.execute(f"SELECT gram, keys FROM gram_stats WHERE gram IN ({placeholders})", tuple(query_grams))
+        )
+        total = conn.execute("SELECT value FROM meta WHERE name = 'keys'").fetchone()[0]
+        selective = _selective_grams(frequencies, total)
+        if not selective:
+            return []
+        placeholders = ",".join("?" * len(selective))
+        # Keys sharing the most trigrams first; the shortlist is then scored exactly.
+        rows = conn.execute(
+            f"""
+            SELECT kv.key, kv.value FROM (
+                SELECT key, COUNT(*) AS shared FROM grams WHERE gram IN ({placeholders})
+                GROUP BY key ORDER BY shared DESC LIMIT ?
+            ) AS shortlist JOIN kv ON kv.key = shortlist.key
+            """,
+            (*selective, _shortlist_size(limit)),
+        ).fetchall()
+        scored = [(key, value, _similarity(query_grams, key)) for key, value in rows]
+        scored = [item for item in scored if item[2] >= min_score]
+        scored.sort(key=lambda item: (-item[2], item[0]))
+        return [(key, value, round(score, 4)) for key, value, score in scored[:limit]]
+
+    def bulk_load(self, items: Iterable[tuple[str, str]], replace: bool = False) -> int:
+        loaded = {normalize_key(key): value for key, value in items}
+        with self._write_lock:
+            conn = self._connection()
+            with conn:  # one transaction: readers see all of the load or none of it
+                # Take the write lock before reading which keys exist, so loads from other
+                # processes cannot interleave with the count updates.
+                conn.execute("BEGIN IMMEDIATE")
+                if replace:
+                    conn.execute("DELETE FROM kv")
+                    conn.execute("DELETE FROM grams")
+                    conn.execute("DELETE FROM gram_stats")
+                    new_keys = list(loaded)
+                else:
+                    new_keys = self._missing_keys(conn, list(loaded))
+                conn.executemany("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", loaded.items())
+                # Trigrams depend on the key only, so overwritten keys already have theirs and
+                # only new keys change the per-trigram counts.
+                conn.executemany(
+                    "INSERT INTO grams (gram, key) VALUES (?, ?)",
+                    ((gram, key) for key in new_keys for gram in trigrams(key)),
+                )
+                conn.executemany(
+                    "INSERT INTO gram_stats (gram, keys) VALUES (?, ?)"
+                    " ON CONFLICT (gram) DO UPDATE SET keys = keys + excluded.keys",
+                    Counter(gram for key in new_keys for gram in trigrams(key)).items(),
+                )
+                if replace:
+                    conn.execute("UPDATE meta SET value = ? WHERE name = 'keys'", (len(loaded),))
+                else:
+                    conn.execute("UPDATE meta SET value = value + ? WHERE name = 'keys'", (len(new_keys),))
+                conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+        return len(loaded)
+
+    @staticmethod
+    def _missing_keys(conn: sqlite3.Connection, keys: list[str], chunk: int = 500) -> list[str]:
+        existing: set[str] = set()
+        for start in range(0, len(keys), chunk):
+            part = keys[start : start + chunk]
+            placeholders = ",".join("?" * len(part))
+            existing.update(row[0] for row in conn.execute(f"SELECT key FROM kv WHERE key IN ({placeholders})", part))
+        return [key for key in keys if key not in existing]
+
+
+class CachedLookup:
+    """Hot-key LRU in front of a backend for exact lookups, misses included.
+
+    The backend's version is re-read at most every ``check_interval`` seconds and the cache is
+    dropped when it moved, so a bulk load in another process shows up within that interval.
+    """
+
+    def __init__(self, backend: LookupBackend, max_entries: int, check_interval: float = 1.0) -> None:
+        self.backend = backend
+        self._max_entries = max(0, max_entries)
+        self._check_interval = check_interval
+        self._entries: OrderedDict[str, str | None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = backend.version()
+        self._checked_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    def _validate_locked(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self._check_interval:
+            return
+        self._checked_at = now
+        version = self.backend.version()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = self.backend.version()
+            self._checked_at = time.monotonic()
+
+    def get(self, key: str) -> str | None:
+        normalized = normalize_key(key)
+        with self._lock:
+            self._validate_locked()
+            value = self._entries.get(normalized, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(normalized)
+                self.hits += 1
+                return value
+            self.misses += 1
+            version = self._version
+        value = self.backend.get(normalized)
+        if self._max_entries:
+            with self._lock:
+                if version != self._version:
+                    return value  # the data changed while reading; do not cache what may be stale
+                self._entries[normalized] = value
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "keys": self.backend.size,
+                "cached_keys": len(self._entries),
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+            }
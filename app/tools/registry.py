@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import functools
+import importlib
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Literal
+
+from app.rag.filters import MetadataFilter
+from app.tools.calculator import CalculatorResult, calculate
+from app.tools.lookup import LookupResult, lookup_key, semantic_lookup
+from app.tools.lookup_store import normalize_key
+
+ToolKind = Literal["cpu", "io"]
+
+
+@dataclass(frozen=True)
+class ToolContext:
+    prompt: str
+    top_k: int
+    metadata_filter: MetadataFilter | None = None
+    collection: str | None = None
+    mmr_lambda: float | None = None
+    cancel_event: threading.Event | None = None
+
+
+@dataclass(frozen=True)
+class TriggerMatch:
+    prompt: str
+    start: int
+    end: int
+
+    @property
+    def text(self) -> str:
+        return self.prompt[self.start : self.end]
+
+    @property
+    def rest(self) -> str:
+        return self.prompt[self.end :]
+
+
+@dataclass
+class ToolCall:
+    """One planned tool invocation.
+
+    ``kind`` picks the executor: ``cpu`` tools run in a process pool (``func`` and ``args`` must be
+    picklable), ``io`` tools in a thread pool. ``describe`` turns the result into
+    ``(success, note)``; a ``None`` note means there is nothing worth telling the model.
+    """
+
+    name: str
+    tool_input: str
+    kind: ToolKind
+    func: Callable[..., Any]
+    args: tuple
+    describe: Callable[[Any], tuple[bool, str | None]]
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """A tool as the registry sees it.
+
+    ``triggers`` are regular expressions that mark a prompt as a candidate for the tool; they must
+    not contain capturing groups of their own. ``plan`` receives each trigger match in prompt order
+    until it returns a call (``None`` rejects the match). A tool without triggers is planned for
+    every prompt, with ``None`` in place of the match.
+    """
+
+    name: str
+    kind: ToolKind
+    plan: Callable[[TriggerMatch | None, ToolContext], ToolCall | None]
+    triggers: tuple[str, ...] = ()
+
+
+class ToolRegistry:
+    """Enabled tools, in priority order, with all their triggers compiled into one regex.
+
+    Planning scans the prompt once however many tools are registered: every trigger is a named
+    alternative of the combined pattern and ``finditer`` reports which one matched where. Matches
+    do not overlap; where two triggers start at the same position, the tool registered first wins.
+    """
+
+    def __init__(self, specs: list[ToolSpec]) -> None:
+        names = [spec.name for spec in specs]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate tool names: {', '.join(duplicates)}")
+        self._specs = list(specs)
+        self._owners: dict[str, ToolSpec] = {}
+        alternatives = []
+        for spec_idx, spec in enumerate(self._specs):
+            for trigger_idx, trigger in enumerate(spec.triggers):
+                group = f"t{spec_idx}_{trigger_idx}"
+                if re.compile(trigger).groups:
+                    raise ValueError(f"Trigger {trigger!r} of tool {spec.name!r} must not contain capturing groups")
+                self._owners[group] = spec
+                alternatives.append(f"(?P<{group}>{trigger})")
+        self._matcher = re.compile("|".join(alternatives)) if alternatives else None
+
+    @property
+    def names(self) -> list[str]:
+        return [spec.name for spec in self._specs]
+
+    def _matches(self, prompt: str) -> dict[str, list[TriggerMatch]]:
+        found: dict[str, list[TriggerMatch]] = {}
+        if self._matcher is not None:
+            for match in self._matcher.finditer(prompt):
+                spec = self._owners[match.lastgroup]
+                found.setdefault(spec.name, []).append(TriggerMatch(prompt, match.start(), match.end()))
+        return found
+
+    def plan(self, context: ToolContext, limit: int) -> list[ToolCall]:
+        """Calls for the prompt in ``context``, at most ``limit`` of them, in registration order."""
+        matches = self._matches(context.prompt)
+        calls: list[ToolCall] = []
+        for spec in self._specs:
+            if len(calls) >= limit:
+                break
+            if not spec.triggers:
+                call = spec.plan(None, context)
+            else:
+                call = None
+                for hit in matches.get(spec.name, ()):
+                    call = spec.plan(hit, context)
+                    if call is not None:
+                        break
+            if call is not None:
+                calls.append(call)
+        return calls
+
+
+def _describe_calculation(result: CalculatorResult) -> tuple[bool, str]:
+    if result.ok:
+        return True, f"calculator({result.expression}) = {result.result}"
+    return False, f"calculator({result.expression}) failed: {result.error}"
+
+
+def _plan_calculator(hit: TriggerMatch | None, _: ToolContext) -> ToolCall | None:
+    expr = hit.text.strip()
+    if not any(ch.isdigit() for ch in expr):
+        return None
+    return ToolCall("calculator", expr, "cpu", calculate, (expr,), _describe_calculation)
+
+
+def _describe_lookup(hit: LookupResult) -> tuple[bool, str]:
+    if hit.found:
+        return True, f"lookup_key({hit.key}) -> {hit.value}"
+    if hit.suggestions:
+        return False, f"lookup_key({hit.key}) -> not found (closest: {', '.join(hit.suggestions)})"
+    return False, f"lookup_key({hit.key}) -> not found"
+
+
+def _plan_lookup(hit: TriggerMatch | None, _: ToolContext) -> ToolCall | None:
+    candidate = hit.rest.strip(" :?")
+    if not candidate:
+        return None
+    return ToolCall("lookup_key", normalize_key(candidate), "io", lookup_key, (candidate,), _describe_lookup)
+
+
+def _describe_semantic_hits(hits: list[dict]) -> tuple[bool, str | None]:
+    if not hits:
+        return False, None
+    top = hits[0]
+    return True, f"semantic_lookup(top1) score={top['score']} source={top['source_path']}"
+
+
+def _plan_semantic_lookup(_: TriggerMatch | None, context: ToolContext) -> ToolCall:
+    search = functools.partial(
+        semantic_lookup,
+        top_k=min(context.top_k, 3),
+        metadata_filter=context.metadata_filter,
+        collection=context.collection,
+        mmr_lambda=context.mmr_lambda,
+        cancel_event=context.cancel_event,
+    )
+    return ToolCall("semantic_lookup", context.prompt, "io", search, (context.prompt,), _describe_semantic_hits)
+
+
+BUILTIN_TOOLS: dict[str, ToolSpec] = {
+    "calculator": ToolSpec("calculator", "cpu", _plan_calculator, triggers=(r"[-+*/(). 0-9]{3,}",)),
+    "lookup_key": ToolSpec(
+        "lookup_key",
+        "io",
+        _plan_lookup,
+        triggers=(r"(?i:lookup|find key|what is key|db key)",),
+    ),
+    "semantic_lookup": ToolSpec("semantic_lookup", "io", _plan_semantic_lookup),
+}
+
+
+def resolve_tool(entry: str) -> ToolSpec:
+    """A built-in tool by name, or any ``ToolSpec`` by import path (``package.module:ATTRIBUTE``)."""
+    if entry in BUILTIN_TOOLS:
+        return BUILTIN_TOOLS[entry]
+    module_name, sep, attr = entry.partition(":")
+    if not sep or not module_name or not attr:
+        raise ValueError(f"Unknown tool {entry!r}; use a built-in name or 'package.module:ATTRIBUTE'")
+    spec = getattr(importlib.import_module(module_name), attr)
+    if not isinstance(spec, ToolSpec):
+        raise ValueError(f"{entry!r} is not a ToolSpec")
+    return spec
+
+
+def build_registry(entries: list[str]) -> ToolRegistry:
+    return ToolRegistry([resolve_tool(entry) for entry in entries])
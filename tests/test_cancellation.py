@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.cancellation import (
+    CancelToken,
+    DeadlineExceeded,
+    RequestCancelled,
+    await_cancellable,
+    check_cancelled,
+    remaining_seconds,
+)
+
+
+def test_token_deadline_counts_as_cancelled_and_caps_waits():
+    token = CancelToken(timeout=0.05)
+
+    assert not token.is_set()
+    assert remaining_seconds(token, 10.0) <= 0.05
+    assert remaining_seconds(None, 10.0) == 10.0
+    started = time.perf_counter()
+    assert token.wait(5.0)
+    assert time.perf_counter() - started < 1.0
+
+    assert token.is_set() and token.expired
+    with pytest.raises(DeadlineExceeded):
+        check_cancelled(token, 'retrieval')
+
+
+def test_cancel_runs_callbacks_once_and_keeps_the_first_reason():
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: calls.append('registered'))
+    unregister = token.on_cancel(lambda: calls.append('unregistered'))
+    unregister()
+
+    token.cancel('client disconnected')
+    token.cancel('server is shutting down')
+    token.on_cancel(lambda: calls.append('late'))
+
+    assert calls == ['registered', 'late']
+    with pytest.raises(RequestCancelled, match='client disconnected'):
+        check_cancelled(token, 'llm')
+
+
+def test_await_cancellable_stops_waiting_when_another_thread_cancels():
+    token = CancelToken()
+
+    async def scenario():
+        threading.Timer(0.05, token.cancel, args=('client disconnected',)).start()
+        await await_cancellable(asyncio.sleep(5), token, 'tools')
+
+    started = time.perf_counter()
+    with pytest.raises(RequestCancelled) as raised:
+        asyncio.run(scenario())
+
+    assert raised.value.stage == 'tools'
+    assert raised.value.reason == 'client disconnected'
+    assert time.perf_counter() - started < 1.0
+
+
+def test_await_cancellable_turns_the_deadline_into_deadline_exceeded():
+    async def scenario():
+        return await await_cancellable(asyncio.sleep(5), CancelToken(timeout=0.05), 'llm')
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert asyncio.run(await_cancellable(asyncio.sleep(0, result='done'), CancelToken(timeout=1.0), 'llm')) == 'done'
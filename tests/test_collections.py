@@ -0,0 +1,61 @@
+import gc
+
+import pytest
+
+from app.core.config import settings
+from app.rag import state
+from app.rag.collection_manager import CollectionConfig, CollectionManager
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'vector_shared_index', False)
+    monkeypatch.setattr(settings, 'vector_store_path', str(tmp_path / 'default' / 'vector_store.json'))
+    monkeypatch.setattr(settings, 'rag_data_dir', str(tmp_path / 'default' / 'data'))
+    return CollectionManager(
+        registry_path=str(tmp_path / 'collections.json'),
+        collections_dir=str(tmp_path),
+        factory=state._build_retriever,
+        max_loaded=1,
+    )
+
+
+def _config(tmp_path, name, **options):
+    return CollectionConfig(
+        name=name,
+        data_dir=str(tmp_path / name / 'data'),
+        vector_store_path=str(tmp_path / name / 'vector_store.json'),
+        **options,
+    )
+
+
+def test_reloaded_collection_reuses_the_store_still_in_use(tmp_path, manager):
+    manager.register(_config(tmp_path, 'docs'))
+    held = manager.get('docs')
+
+    manager.register(_config(tmp_path, 'docs', chunk_size=200))
+    reloaded = manager.get('docs')
+
+    assert reloaded is not held
+    assert reloaded._vector_store is held._vector_store
+    assert reloaded._embedding_cache is held._embedding_cache
+
+
+def test_evicted_collection_reuses_the_store_still_in_use(tmp_path, manager):
+    manager.register(_config(tmp_path, 'a'))
+    manager.register(_config(tmp_path, 'b'))
+    held = manager.get('a')
+    manager.get('b')
+    assert 'a' not in manager.stats()['loaded']
+
+    assert manager.get('a')._vector_store is held._vector_store
+
+
+def test_store_is_released_with_its_last_holder(tmp_path, manager):
+    manager.register(_config(tmp_path, 'docs'))
+    manager.get('docs')
+    manager.remove('docs')
+    gc.collect()
+
+    resolved = str((tmp_path / 'docs' / 'vector_store.json').resolve())
+    assert ('vector_store', resolved) not in state._open_files
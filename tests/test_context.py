@@ -0,0 +1,58 @@
+import pytest
+
+from app.rag import diversity as diversity_module
+from app.rag.context import ContextPacker, HeuristicTokenCounter
+from app.rag.diversity import mmr_select
+from app.rag.vector_store import RetrievalResult
+
+
+def _chunk(source, index, text, score):
+    return RetrievalResult(
+        record_id=f'{source}:{index}',
+        text=text,
+        score=score,
+        metadata={'source_path': source, 'chunk_index': index},
+    )
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_mmr_skips_near_duplicates_for_a_diverse_runner_up(monkeypatch, vectorized):
+    if vectorized:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(diversity_module, 'np', None)
+    scores = [0.95, 0.94, 0.70]
+    embeddings = [[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]]
+
+    assert mmr_select(scores, embeddings, top_k=2, mmr_lambda=1.0) == [0, 1]
+    assert mmr_select(scores, embeddings, top_k=2, mmr_lambda=0.5) == [0, 2]
+    assert mmr_select([], [], top_k=3, mmr_lambda=0.5) == []
+
+
+def test_packer_merges_adjacent_chunks_and_keeps_retrieval_order():
+    results = [
+        _chunk('b.md', 0, 'Bees make honey.', 0.9),
+        _chunk('a.md', 1, 'Cats sleep a lot. They purr.', 0.8),
+        _chunk('a.md', 0, 'Cats are pets. Cats sleep a lot.', 0.7),
+    ]
+
+    packed = ContextPacker(HeuristicTokenCounter()).pack('cats', results, max_tokens=500, sentence_filter=False)
+
+    assert [(block.source_path, block.chunk_indexes) for block in packed.blocks] == [('b.md', [0]), ('a.md', [0, 1])]
+    assert packed.blocks[1].text == 'Cats are pets. Cats sleep a lot. They purr.'
+
+
+def test_packer_stays_within_the_token_budget_by_trimming_long_blocks():
+    counter = HeuristicTokenCounter()
+    filler = ' '.join(f'Unrelated sentence number {i}.' for i in range(40))
+    results = [
+        _chunk('long.md', 0, f'{filler} Rust has a borrow checker.', 0.9),
+        _chunk('short.md', 0, 'Rust compiles to native code.', 0.8),
+    ]
+
+    packed = ContextPacker(counter).pack('rust borrow checker', results, max_tokens=60, sentence_filter=False)
+
+    assert packed.tokens <= 60
+    assert 'borrow checker' in packed.text
+    assert 'Unrelated sentence number 39' not in packed.text
+    assert packed.blocks[0].source_path == 'long.md'
@@ -0,0 +1,64 @@
+from app.rag.embedding_cache import _HEADER, EmbeddingCache
+
+
+def _vectors(prefix, count, dimension=8):
+    return [(f'{prefix}{i}', [float(i)] * dimension) for i in range(count)]
+
+
+def _entry_bytes(key, dimension=8):
+    return _HEADER.size + len(key) + dimension * 4
+
+
+def test_saved_entries_survive_reload(tmp_path):
+    path = tmp_path / 'cache.bin'
+    cache = EmbeddingCache(str(path), max_entries=100)
+    cache.put_many('model', 8, _vectors('h', 10))
+    cache.save()
+
+    reloaded = EmbeddingCache(str(path), max_entries=100)
+    assert reloaded.size == 10
+    assert reloaded.get_many('model', 8, ['h3', 'missing']) == [[3.0] * 8, None]
+
+
+def test_save_appends_only_new_entries(tmp_path):
+    path = tmp_path / 'cache.bin'
+    cache = EmbeddingCache(str(path), max_entries=100)
+    cache.put_many('model', 8, _vectors('h', 10))
+    cache.save()
+    size = path.stat().st_size
+
+    cache.save()
+    assert path.stat().st_size == size
+
+    cache.put_many('model', 8, _vectors('new', 1))
+    cache.save()
+    assert path.stat().st_size - size == _entry_bytes('model:8:new0')
+
+
+def test_torn_tail_is_dropped_on_load(tmp_path):
+    path = tmp_path / 'cache.bin'
+    cache = EmbeddingCache(str(path), max_entries=100)
+    cache.put_many('model', 8, _vectors('h', 5))
+    cache.save()
+    size = path.stat().st_size
+    with path.open('ab') as handle:
+        handle.write(b'\x05\x00\x10')
+
+    reloaded = EmbeddingCache(str(path), max_entries=100)
+    assert reloaded.size == 5
+    assert path.stat().st_size == size
+    reloaded.put_many('model', 8, _vectors('x', 1))
+    reloaded.save()
+    assert EmbeddingCache(str(path), max_entries=100).size == 6
+
+
+def test_file_is_rewritten_once_evictions_pile_up(tmp_path):
+    path = tmp_path / 'cache.bin'
+    cache = EmbeddingCache(str(path), max_entries=10)
+    for round_number in range(5):
+        cache.put_many('model', 8, _vectors(f'r{round_number}-', 10))
+        cache.save()
+
+    assert path.stat().st_size <= 2 * 10 * _entry_bytes('model:8:r0-0')
+    reloaded = EmbeddingCache(str(path), max_entries=10)
+    assert reloaded.get_many('model', 8, ['r4-0', 'r0-0']) == [[0.0] * 8, None]
@@ -0,0 +1,67 @@
+import pytest
+
+from app.rag.evaluation import RetrievalEvalCase, compare_retrieval, evaluate_retrieval
+from app.rag.vector_store import RetrievalResult
+
+
+class _Retriever:
+    """Returns canned texts per query and records how queries were batched."""
+
+    def __init__(self, texts_by_query):
+        self._texts_by_query = texts_by_query
+        self.batches = []
+
+    def retrieve_many(self, queries, top_k):
+        self.batches.append(list(queries))
+        return [
+            [RetrievalResult(f'{query}:{rank}', text, 1.0 - rank / 10, {}) for rank, text in enumerate(texts[:top_k])]
+            for query, texts in ((query, self._texts_by_query[query]) for query in queries)
+        ]
+
+
+CASES = [
+    RetrievalEvalCase('q1', ['alpha', 'beta']),
+    RetrievalEvalCase('q2', ['gamma']),
+    RetrievalEvalCase('q3', ['delta']),
+]
+
+
+def test_evaluation_scores_rank_metrics_over_batched_retrieval():
+    retriever = _Retriever(
+        {
+            'q1': ['noise', 'has Alpha', 'beta too'],
+            'q2': ['gamma first', 'noise', 'noise'],
+            'q3': ['noise', 'noise', 'noise'],
+        }
+    )
+    progress = []
+
+    def record(done, total):
+        progress.append(done)
+
+    report = evaluate_retrieval(retriever, CASES, top_k=3, batch_size=2, progress=record)
+
+    assert retriever.batches == [['q1', 'q2'], ['q3']]
+    assert progress == [2, 3]
+    assert report['hits'] == 2
+    assert report['mrr'] == pytest.approx((0.5 + 1.0 + 0.0) / 3, abs=1e-4)
+    assert report['recall_at_k'] == pytest.approx(2 / 3, abs=1e-4)
+    q1 = report['details'][0]
+    assert q1['reciprocal_rank'] == 0.5
+    # Relevant at ranks 2 and 3 against an ideal of ranks 1 and 2.
+    assert q1['ndcg'] == pytest.approx((1 / 1.585 + 1 / 2) / (1 + 1 / 1.585), abs=1e-3)
+
+
+def test_comparison_reports_the_candidate_minus_the_baseline():
+    baseline = _Retriever({'q1': ['noise'], 'q2': ['noise'], 'q3': ['delta']})
+    candidate = _Retriever({'q1': ['alpha beta'], 'q2': ['gamma'], 'q3': ['delta']})
+    progress = []
+
+    def record(done, total):
+        progress.append((done, total))
+
+    report = compare_retrieval(baseline, candidate, CASES, top_k=1, progress=record)
+
+    assert report['delta']['hit_rate'] == pytest.approx(2 / 3, abs=1e-4)
+    assert report['delta']['mrr'] == pytest.approx(2 / 3, abs=1e-4)
+    assert progress[-1] == (6, 6)
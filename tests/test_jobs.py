@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from app.background import worker as worker_module
+from app.background.drain import DrainCoordinator
+from app.background.job_spool import JobSpool
+from app.background.worker import InMemoryJobStore, InMemoryJobWorker, TenantQueueFull, WorkerDraining
+from app.core.cancellation import CancelToken
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    """Fake ``run_completion``: prompts starting with ``slow`` block until the test releases them."""
+    state = {'release': None, 'started': [], 'finished': []}
+
+    async def run_completion(prompt):
+        state['started'].append(prompt)
+        if prompt.startswith('slow'):
+            await state['release'].wait()
+        state['finished'].append(prompt)
+        return f'done: {prompt}'
+
+    monkeypatch.setattr(worker_module, 'run_completion', run_completion)
+    return state
+
+
+async def _settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_drain_hands_queued_and_cut_jobs_to_the_spool(tmp_path, completions):
+    spool = JobSpool(tmp_path / 'jobs.spool')
+
+    async def first_instance():
+        completions['release'] = asyncio.Event()
+        store = InMemoryJobStore()
+        worker = InMemoryJobWorker(store, concurrency=1)
+        await worker.start()
+        running = await worker.submit('slow job', tenant='a', weight=2.0)
+        await _settle()
+        queued = await worker.submit('quick job', tenant='b')
+
+        result = await worker.drain(0.05, spool)
+
+        assert result == {'interrupted': 1, 'spooled': 2, 'failed': 0}
+        assert (await store.get(running.id)).status == 'queued'
+        assert (await store.get(queued.id)).status == 'queued'
+        with pytest.raises(WorkerDraining):
+            await worker.submit('late')
+        return running.id, queued.id
+
+    async def next_instance():
+        completions['release'] = asyncio.Event()
+        completions['release'].set()
+        store = InMemoryJobStore()
+        worker = InMemoryJobWorker(store, concurrency=1)
+        assert await worker.restore(spool) == 2
+        await worker.start()
+        await worker.stop()
+        return store
+
+    running_id, queued_id = asyncio.run(first_instance())
+    assert completions['finished'] == []
+    store = asyncio.run(next_instance())
+
+    for job_id, prompt in ((running_id, 'slow job'), (queued_id, 'quick job')):
+        job = asyncio.run(store.get(job_id))
+        assert job.status == 'completed'
+        assert job.result == f'done: {prompt}'
+    assert asyncio.run(store.get(running_id)).tenant == 'a'
+    assert not spool.path.exists()
+
+
+def test_drain_without_a_spool_runs_the_queue_then_fails_what_is_left(completions):
+    async def scenario():
+        completions['release'] = asyncio.Event()
+        store = InMemoryJobStore()
+        worker = InMemoryJobWorker(store, concurrency=1)
+        await worker.start()
+        quick = await worker.submit('quick job')
+        slow = await worker.submit('slow job')
+        result = await worker.drain(0.05)
+        return result, await store.get(quick.id), await store.get(slow.id)
+
+    result, quick, slow = asyncio.run(scenario())
+
+    assert result == {'interrupted': 1, 'spooled': 0, 'failed': 1}
+    assert quick.status == 'completed'
+    assert slow.status == 'failed'
+
+
+def test_spool_claim_takes_the_file_once_and_skips_torn_lines(tmp_path):
+    spool = JobSpool(tmp_path / 'jobs.spool')
+    spool.write([{'id': 'j1', 'prompt': 'one'}])
+    spool.write([{'id': 'j2', 'prompt': 'two'}])
+    with spool.path.open('a', encoding='utf-8') as handle:
+        handle.write('{"id": "j3", "pro')
+
+    assert [entry['id'] for entry in spool.claim()] == ['j1', 'j2']
+    assert spool.claim() == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_fair_queue_interleaves_a_flooding_tenant_with_a_light_one(completions):
+    async def scenario():
+        store = InMemoryJobStore()
+        worker = InMemoryJobWorker(store, concurrency=1, max_queued_per_tenant=5)
+        for i in range(5):
+            await worker.submit(f'flood {i}', tenant='heavy')
+        with pytest.raises(TenantQueueFull):
+            await worker.submit('flood 5', tenant='heavy')
+        await worker.submit('light 0', tenant='light')
+        await worker.submit('light 1', tenant='light')
+        await worker.start()
+        await worker.stop()
+
+    asyncio.run(scenario())
+
+    # Both tenants start at virtual time 0, so their jobs alternate instead of queuing behind the flood.
+    assert completions['started'][:4] == ['flood 0', 'light 0', 'flood 1', 'light 1']
+
+
+def test_coordinator_cancels_streams_left_open_after_the_grace_period(completions):
+    async def scenario():
+        worker = InMemoryJobWorker(InMemoryJobStore())
+        await worker.start()
+        coordinator = DrainCoordinator(worker)
+        token = CancelToken()
+
+        async def stream():
+            with coordinator.track_stream(token):
+                while not token.is_set():
+                    await asyncio.sleep(0.01)
+
+        streaming = asyncio.create_task(stream())
+        await _settle()
+        result = await coordinator.drain(0.05, 'test')
+        await streaming
+        return coordinator, token, result
+
+    coordinator, token, result = asyncio.run(scenario())
+
+    assert result['streams_cut'] == 1
+    assert token.reason == 'server is shutting down'
+    snapshot = coordinator.snapshot()
+    assert snapshot['state'] == 'drained'
+    assert snapshot['reason'] == 'test'
+    assert snapshot['open_streams'] == 0
+
+
+def test_fair_queue_shares_workers_by_tenant_weight(completions):
+    async def scenario():
+        worker = InMemoryJobWorker(InMemoryJobStore(), concurrency=1)
+        for i in range(4):
+            await worker.submit(f'basic {i}', tenant='basic')
+            await worker.submit(f'premium {i}', tenant='premium', weight=2.0)
+        await worker.start()
+        await worker.stop()
+
+    asyncio.run(scenario())
+
+    assert completions['started'][:6] == ['premium 0', 'basic 0', 'premium 1', 'premium 2', 'basic 1', 'premium 3']
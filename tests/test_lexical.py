@@ -0,0 +1,49 @@
+from app.rag.lexical import Bm25Index
+
+
+def _docs():
+    return [(f'doc-{i}', ('alpha ' if i < 60 else '') + f'filler text number {i}') for i in range(100)]
+
+
+def test_re_adding_unchanged_records_keeps_results():
+    index = Bm25Index()
+    index.add_many(_docs())
+    before = index.search('alpha', 3)
+    assert len(before) == 3
+
+    index.add_many(_docs())
+    index.add_many(_docs())
+
+    assert index.size == 100
+    assert index.search('alpha', 3) == before
+
+
+def test_removed_records_drop_out_of_results_and_frequencies():
+    index = Bm25Index()
+    index.add_many(_docs())
+    for i in range(60):
+        if i != 7:
+            index.remove(f'doc-{i}')
+
+    hits = index.search('alpha', 5)
+    assert [record_id for record_id, _ in hits] == ['doc-7']
+    assert hits[0][1] > 0
+
+    index.remove('doc-7')
+    assert index.search('alpha', 5) == []
+    assert index.size == 40
+
+
+def test_compaction_preserves_scores():
+    index = Bm25Index()
+    docs = [(f'doc-{i}', f'alpha {i % 7} beta') for i in range(1500)]
+    index.add_many(docs)
+    for record_id, _ in docs[:1000]:
+        index.remove(record_id)
+    before = index.search('alpha 3', 5)
+
+    index.compact()
+
+    assert index.search('alpha 3', 5) == before
+    index.add_many(docs[1000:])
+    assert index.search('alpha 3', 5) == before
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from app.rag import quantization as quantization_module
+from app.rag.vector_store import JsonVectorStore, VectorRecord
+
+DIMENSION = 8
+
+
+def _record(i):
+    rng = random.Random(i)
+    embedding = [rng.uniform(-1.0, 1.0) for _ in range(DIMENSION)]
+    return VectorRecord(record_id=f'r{i}', text=f'text {i}', embedding=embedding, metadata={})
+
+
+def _pq_store(**options):
+    options.setdefault('pq_subspaces', 4)
+    options.setdefault('rerank_candidates', 4)
+    return JsonVectorStore(None, quantization='pq', **options)
+
+
+def test_search_before_training_scores_int8_codes_without_training(monkeypatch):
+    store = _pq_store()
+    records = [_record(i) for i in range(50)]
+    store.upsert_many(records)
+
+    def refuse(self, sample, batches):
+        raise AssertionError('search must not train codebooks')
+
+    monkeypatch.setattr(quantization_module.ProductQuantizer, 'fit', refuse)
+    hits = store.search(records[7].embedding, top_k=1)
+
+    assert hits[0].record_id == 'r7'
+    assert store.memory_stats()['quantized_bytes'] > 0
+
+
+def test_save_trains_the_codebooks():
+    store = _pq_store()
+    records = [_record(i) for i in range(50)]
+    store.upsert_many(records)
+
+    store.save()
+
+    assert store._quantizer._codebooks is not None
+    assert not store._quantizer.needs_training(50)
+    assert store.search(records[3].embedding, top_k=1)[0].record_id == 'r3'
+    assert store.train_quantizer() is False
+
+
+def test_rows_written_during_training_are_encoded_before_the_swap(monkeypatch):
+    store = _pq_store()
+    store.upsert_many([_record(i) for i in range(50)])
+    late = [_record(i) for i in range(50, 60)]
+    original = quantization_module.ProductQuantizer.trained
+
+    def trained(self, sample, batches):
+        # Another thread indexes while k-means runs; the store lock is free.
+        store.upsert_many(late)
+        return original(self, sample, batches)
+
+    monkeypatch.setattr(quantization_module.ProductQuantizer, 'trained', trained)
+
+    assert store.train_quantizer() is True
+    assert len(store._quantizer._codes) == 60 * store._quantizer._m
+    assert store.search(late[4].embedding, top_k=1)[0].record_id == 'r54'
+
+
+def test_compaction_during_training_discards_the_result(monkeypatch):
+    store = _pq_store()
+    store.upsert_many([_record(i) for i in range(50)])
+    original = quantization_module.ProductQuantizer.trained
+
+    def trained(self, sample, batches):
+        store.delete_many(['r0'])
+        store.compact()
+        return original(self, sample, batches)
+
+    monkeypatch.setattr(quantization_module.ProductQuantizer, 'trained', trained)
+    before = store._quantizer
+
+    assert store.train_quantizer() is False
+    assert store._quantizer is before
+    assert store.search(_record(9).embedding, top_k=1)[0].record_id == 'r9'
@@ -0,0 +1,69 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.rate_limit import rate_limited
+from app.core import rate_limit
+from app.core.config import settings
+from app.core.rate_limit import MemoryRateLimitStore, RateLimiter, RateLimitRule
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_admits_burst_then_refills_at_rate():
+    clock = _Clock()
+    limiter = RateLimiter(MemoryRateLimitStore(clock=clock), {'query': RateLimitRule(rate=2.0, burst=3.0)})
+
+    assert [limiter.check('query', 'ip:a').allowed for _ in range(4)] == [True, True, True, False]
+    rejected = limiter.check('query', 'ip:a')
+    assert rejected.retry_after == pytest.approx(0.5)
+    assert limiter.check('query', 'ip:b').allowed
+
+    clock.now = 0.5
+    assert limiter.check('query', 'ip:a').allowed
+    assert not limiter.check('query', 'ip:a').allowed
+    assert limiter.check('other', 'ip:a') is None
+    assert limiter.stats()['groups']['query']['rejected'] == 3
+
+
+@pytest.fixture
+def limited_client(monkeypatch):
+    monkeypatch.setattr(settings, 'rate_limit_enabled', True)
+    monkeypatch.setattr(settings, 'rate_limits', {'query': (0.001, 2)})
+    monkeypatch.setattr(settings, 'rate_limit_store', 'memory')
+    monkeypatch.setattr(settings, 'api_keys', ['known-key'])
+    monkeypatch.setattr(rate_limit, '_limiter', None)
+
+    app = FastAPI()
+
+    @app.get('/limited', dependencies=[rate_limited('query')])
+    async def limited():
+        return {'ok': True}
+
+    yield TestClient(app)
+    rate_limit._limiter = None
+
+
+def test_unknown_api_keys_share_the_ip_bucket(limited_client):
+    statuses = [
+        limited_client.get('/limited', headers={'X-API-Key': uuid.uuid4().hex}).status_code for _ in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+
+
+def test_configured_api_key_gets_its_own_bucket(limited_client):
+    for _ in range(2):
+        assert limited_client.get('/limited').status_code == 200
+    assert limited_client.get('/limited').status_code == 429
+
+    response = limited_client.get('/limited', headers={'X-API-Key': 'known-key'})
+    assert response.status_code == 200
+    assert int(limited_client.get('/limited').headers['Retry-After']) >= 1
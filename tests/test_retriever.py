@@ -0,0 +1,42 @@
+import pytest
+
+from app.core.config import settings
+from app.rag.embeddings import HashingEmbeddingModel
+from app.rag.lexical import Bm25Index
+from app.rag.retriever import RagRetriever
+from app.rag.vector_store import JsonVectorStore, cosine_similarity
+
+
+@pytest.fixture
+def hybrid(monkeypatch):
+    monkeypatch.setattr(settings, 'rag_fusion', 'rrf')
+    model = HashingEmbeddingModel(dimension=64)
+    retriever = RagRetriever(embedding_model=model, vector_store=JsonVectorStore(None), lexical_index=Bm25Index())
+    retriever.index_chunks(
+        {'chunk_id': f'c{i}', 'text': text, 'metadata': {'source_path': f's{i}.md', 'chunk_index': 0}}
+        for i, text in enumerate(
+            ['the quick brown fox', 'a lazy dog sleeps', 'quick thinking wins', 'brown bread recipe']
+        )
+    )
+    return retriever, model
+
+
+def test_hybrid_results_keep_cosine_score_and_expose_fused_score(hybrid):
+    retriever, model = hybrid
+    results = retriever.retrieve('quick brown fox', top_k=3)
+
+    query = model.embed_text('quick brown fox')
+    for item in results:
+        document = model.embed_text(item.text)
+        assert item.score == pytest.approx(cosine_similarity(query, document), abs=1e-5)
+        assert 0 < item.fused_score < 1
+    fused = [item.fused_score for item in results]
+    assert fused == sorted(fused, reverse=True)
+    assert results[0].record_id == 'c0'
+
+
+def test_context_blocks_follow_the_fused_order(hybrid):
+    retriever, _ = hybrid
+    packed, results = retriever.pack_context('quick brown fox', top_k=3)
+
+    assert [block.source_path for block in packed.blocks] == [item.metadata['source_path'] for item in results]
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.cancellation import CancelToken, DeadlineExceeded
+from app.core.config import settings
+from app.llm import lifecycle as lifecycle_module
+from app.llm.fake import FakeLLMProvider
+from app.llm.routing import RoutingLLMProvider
+
+
+@pytest.fixture(autouse=True)
+def routing_settings(monkeypatch):
+    monkeypatch.setattr(settings, 'llm_timeout_seconds', 2.0)
+    monkeypatch.setattr(settings, 'llm_hedge_enabled', True)
+    monkeypatch.setattr(settings, 'llm_hedge_percentile', 95.0)
+    monkeypatch.setattr(settings, 'llm_hedge_min_delay_seconds', 0.01)
+    monkeypatch.setattr(settings, 'llm_hedge_min_samples', 5)
+    monkeypatch.setattr(settings, 'llm_breaker_failure_threshold', 3)
+    monkeypatch.setattr(settings, 'llm_breaker_cooldown_seconds', 0.3)
+    monkeypatch.setattr(settings, 'llm_breaker_slow_call_seconds', 0)
+
+
+@pytest.fixture
+def make_router():
+    routers = []
+
+    def make(*providers):
+        router = RoutingLLMProvider(list(providers))
+        routers.append(router)
+        return router
+
+    yield make
+    for router in routers:
+        router.close()
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.01)
+
+
+def test_hedge_fires_after_p95_and_faster_provider_wins(make_router):
+    primary = FakeLLMProvider('primary', latency=0.05, seed=1)
+    secondary = FakeLLMProvider('secondary', latency=0.01, seed=2)
+    router = make_router(primary, secondary)
+
+    for _ in range(settings.llm_hedge_min_samples):
+        assert router.complete('warm').startswith('[PRIMARY]')
+    assert secondary.calls == 0
+    assert router.stats()['hedges'] == 0
+    p95 = router.stats()['providers'][0]['p95_seconds']
+
+    primary.latency = 1.0
+    started = time.perf_counter()
+    answer = router.complete('slow')
+    elapsed = time.perf_counter() - started
+
+    assert answer == '[SECONDARY] Completion for: slow'
+    assert p95 <= elapsed < 0.5
+    stats = router.stats()
+    assert stats['hedges'] == 1
+    assert secondary.calls == 1
+    assert stats['providers'][1]['wins'] == 1
+
+
+def test_consecutive_failures_open_breaker_and_cooldown_allows_one_trial(make_router):
+    provider = FakeLLMProvider('flaky', error_rate=1.0, seed=3)
+    router = make_router(provider)
+    threshold = settings.llm_breaker_failure_threshold
+
+    for _ in range(threshold):
+        with pytest.raises(RuntimeError, match='injected failure'):
+            router.complete('hello')
+    assert router.stats()['providers'][0]['breaker'] == 'open'
+
+    with pytest.raises(RuntimeError, match='circuit open'):
+        router.complete('hello')
+    assert provider.calls == threshold
+
+    time.sleep(settings.llm_breaker_cooldown_seconds)
+    assert router.stats()['providers'][0]['breaker'] == 'half_open'
+
+    provider.error_rate = 0.0
+    provider.latency = 0.2
+    results = []
+    trial = threading.Thread(target=lambda: results.append(router.complete('trial')))
+    trial.start()
+    _wait_until(lambda: provider.calls == threshold + 1)
+    with pytest.raises(RuntimeError, match='circuit open'):
+        router.complete('second')
+    trial.join()
+
+    assert results == ['[FLAKY] Completion for: trial']
+    assert provider.calls == threshold + 1
+    stats = router.stats()['providers'][0]
+    assert stats['breaker'] == 'closed'
+    assert stats['breaker_trips'] == 1
+
+
+def test_timeout_raises_at_llm_timeout_seconds(make_router, monkeypatch):
+    monkeypatch.setattr(settings, 'llm_timeout_seconds', 0.3)
+    router = make_router(FakeLLMProvider('stuck', latency=1.0))
+
+    started = time.perf_counter()
+    with pytest.raises(TimeoutError, match='0.3s'):
+        router.complete('hello')
+    elapsed = time.perf_counter() - started
+
+    assert 0.3 <= elapsed < 0.6
+    assert router.stats()['timeouts'] == 1
+
+
+def test_request_deadline_does_not_count_against_provider(make_router, monkeypatch):
+    monkeypatch.setattr(settings, 'llm_breaker_failure_threshold', 1)
+    provider = FakeLLMProvider('slow', latency=1.0)
+    router = make_router(provider)
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        router.complete('hello', CancelToken(timeout=0.2))
+    elapsed = time.perf_counter() - started
+    assert elapsed < 0.5
+
+    # Let the abandoned attempt notice the deadline and report back.
+    time.sleep(0.1)
+    stats = router.stats()
+    assert stats['timeouts'] == 0
+    assert stats['providers'][0]['failures'] == 0
+    assert stats['providers'][0]['breaker'] == 'closed'
+    provider.latency = 0.0
+    assert router.complete('again') == '[SLOW] Completion for: again'
+
+
+def test_provider_monitor_warms_up_then_tracks_probe_failures(monkeypatch):
+    class Flaky(FakeLLMProvider):
+        healthy = True
+        warmed = 0
+
+        def warm_up(self):
+            self.warmed += 1
+
+        def probe(self):
+            if not self.healthy:
+                raise ConnectionError('upstream unreachable')
+
+    provider = Flaky('flaky')
+    monkeypatch.setattr(lifecycle_module, 'get_provider', lambda: provider)
+    monkeypatch.setattr(settings, 'llm_health_probe_interval_seconds', 0)
+    monkeypatch.setattr(settings, 'llm_health_failure_threshold', 2)
+    monitor = lifecycle_module.ProviderMonitor()
+
+    asyncio.run(monitor.start())
+    assert provider.warmed == 1
+    assert monitor.snapshot()['status'] == 'ok'
+    assert monitor.snapshot()['warmed_up']
+    assert not monitor.is_running
+
+    provider.healthy = False
+    asyncio.run(monitor.probe())
+    assert monitor.snapshot()['status'] == 'degraded'
+    asyncio.run(monitor.probe())
+    snapshot = monitor.snapshot()
+    assert snapshot['status'] == 'down'
+    assert snapshot['last_error'] == 'ConnectionError: upstream unreachable'
+
+    provider.healthy = True
+    asyncio.run(monitor.probe())
+    assert monitor.snapshot()['status'] == 'ok'
+    assert monitor.snapshot()['consecutive_failures'] == 0
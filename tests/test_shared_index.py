@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from app.rag.embeddings import HashingEmbeddingModel
+from app.rag.lexical import Bm25Index
+from app.rag.retriever import RagRetriever
+from app.rag.shared_index import SharedVectorStore
+
+
+def _chunks(words):
+    return [{'chunk_id': word, 'text': f'{word} appears in this chunk', 'metadata': {}} for word in words]
+
+
+def _retriever(path):
+    # Two instances on one path stand in for two worker processes.
+    return RagRetriever(
+        embedding_model=HashingEmbeddingModel(dimension=32),
+        vector_store=SharedVectorStore(str(path), background_compaction=False),
+        lexical_index=Bm25Index(),
+    )
+
+
+def _lexical_ids(retriever, query):
+    return [record_id for record_id, _ in retriever._lexical.search(query, top_k=5)]
+
+
+@pytest.fixture
+def workers(tmp_path):
+    path = tmp_path / 'store.json'
+    return _retriever(path), _retriever(path)
+
+
+def test_reader_follows_published_changes_incrementally(workers, monkeypatch):
+    writer, reader = workers
+    writer.index_chunks(_chunks(['alpha', 'beta']))
+    reader.retrieve('alpha')
+    index = reader._lexical
+
+    added = []
+    add_many = index.add_many
+
+    def record(docs):
+        docs = list(docs)
+        added.extend(docs)
+        add_many(docs)
+
+    monkeypatch.setattr(index, 'add_many', record)
+    writer.index_chunks(_chunks(['gamma']))
+    writer.delete_records(['alpha'])
+    reader.retrieve('gamma')
+
+    assert reader._lexical is index
+    assert [record_id for record_id, _ in added] == ['gamma']
+    assert _lexical_ids(reader, 'gamma') == ['gamma']
+    assert _lexical_ids(reader, 'alpha') == []
+    assert _lexical_ids(reader, 'beta') == ['beta']
+
+
+def test_writer_does_not_rebuild_after_its_own_publish(workers):
+    writer, _ = workers
+    writer.index_chunks(_chunks(['alpha']))
+    writer.retrieve('alpha')
+    index = writer._lexical
+
+    writer.index_chunks(_chunks(['beta']))
+    writer.retrieve('beta')
+
+    assert writer._lexical is index
+    assert not writer._lexical_rebuilding
+    assert _lexical_ids(writer, 'beta') == ['beta']
+
+
+def test_missing_history_rebuilds_in_the_background(tmp_path, workers):
+    writer, reader = workers
+    writer.index_chunks(_chunks(['alpha']))
+    reader.retrieve('alpha')
+    index = reader._lexical
+
+    writer.index_chunks(_chunks(['beta']))
+    for path in (tmp_path / 'store.shared').glob('changes-*.json'):
+        path.unlink()
+    reader.retrieve('beta')
+
+    deadline = time.monotonic() + 5
+    while reader._lexical is index or reader._lexical_rebuilding:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert _lexical_ids(reader, 'beta') == ['beta']
+    assert _lexical_ids(reader, 'alpha') == ['alpha']
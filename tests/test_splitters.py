@@ -0,0 +1,35 @@
+import io
+
+from app.rag.splitters import PythonSplitter, iter_windows
+
+SOURCE = '''
+class Service:
+    @staticmethod
+    def first():
+        return "first method body with enough words to make the class long"
+
+    def second(self):
+        return "second method body with enough words to make the class long"
+'''
+
+
+def _split(source, chunk_size=120):
+    return list(PythonSplitter(iter_windows).split(io.StringIO(source), chunk_size, 0))
+
+
+def test_decorator_of_first_method_stays_with_the_method():
+    chunks = _split(SOURCE)
+
+    assert len(chunks) > 1
+    assert sum(chunk.count('@staticmethod') for chunk in chunks) == 1
+    decorated = next(chunk for chunk in chunks if '@staticmethod' in chunk)
+    assert decorated == 'class Service: @staticmethod def first(): ' + (
+        'return "first method body with enough words to make the class long"'
+    )
+
+
+def test_every_method_is_labelled_with_the_class_header():
+    chunks = _split(SOURCE)
+
+    assert all(chunk.startswith('class Service:') for chunk in chunks)
+    assert any('def second(self)' in chunk for chunk in chunks)
@@ -0,0 +1,66 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api.routes import stream as stream_module
+from app.background.drain import DrainCoordinator
+from app.core.cancellation import CancelToken, RequestCancelled
+
+
+def _events(body):
+    parsed = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        data = fields['data']
+        parsed.append((fields.get('event', 'message'), data if data == '[DONE]' else json.loads(data)))
+    return parsed
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(stream_module, 'drain_coordinator', DrainCoordinator(worker=None))
+    app = FastAPI()
+
+    @app.get('/pipeline')
+    async def pipeline(request: Request, fail: bool = False):
+        async def events():
+            yield 'sources', [{'record_id': 'r1'}]
+            yield 'token', 'Hello'
+            if fail:
+                raise RequestCancelled('llm', 'deadline exceeded')
+            yield 'token', ' world'
+
+        return stream_module.pipeline_stream_response(events(), request, CancelToken(), 'test.stream')
+
+    return TestClient(app)
+
+
+def test_pipeline_stream_sends_sources_first_then_tokens_and_metrics(client):
+    response = client.get('/pipeline')
+
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = _events(response.text)
+    assert [kind for kind, _ in events] == ['sources', 'metrics', 'token', 'token', 'metrics', 'done']
+    assert events[0][1] == [{'record_id': 'r1'}]
+    assert 'ttft_seconds' in events[1][1]
+    assert ''.join(data['text'] for kind, data in events if kind == 'token') == 'Hello world'
+    assert 'total_seconds' in events[4][1]
+
+
+def test_pipeline_stream_ends_with_an_error_event_when_cancelled(client):
+    events = _events(client.get('/pipeline', params={'fail': True}).text)
+
+    assert [kind for kind, _ in events] == ['sources', 'metrics', 'token', 'error']
+    assert events[-1][1] == {'detail': 'deadline exceeded', 'stage': 'llm'}
+
+
+def test_streams_are_refused_while_draining(client, monkeypatch):
+    monkeypatch.setattr(stream_module, 'drain_coordinator', SimpleNamespace(draining=True))
+
+    response = client.get('/pipeline')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
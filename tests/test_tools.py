@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import pytest
+
+from app.chains.tool_chain import ToolOrchestrator
+from app.core.config import settings
+from app.tools.calculator import calculate
+from app.tools.lookup_store import CachedLookup, MemoryLookupBackend, SqliteLookupBackend
+from app.tools.registry import ToolCall, ToolContext, ToolRegistry, ToolSpec, build_registry
+
+
+def _sleeper(name, seconds):
+    def plan(hit, context):
+        return ToolCall(name, hit.text if hit else '', 'io', time.sleep, (seconds,), lambda _: (True, f'{name} done'))
+
+    return plan
+
+
+def test_calculator_evaluates_and_memoizes():
+    first = calculate('2 * (3 + 4)')
+    again = calculate('2*(3+4)')
+
+    assert first.ok and first.result == 14.0
+    assert again.ok and again.result == 14.0
+    assert again.expression == '2*(3+4)'
+
+
+@pytest.mark.parametrize(
+    'expression, error',
+    [
+        ('9 ** 9 ** 9', 'Value out of range'),
+        ('10 ** 20', 'Value out of range'),
+        ('1 / 0', 'float division by zero'),
+        ('__import__("os")', 'Unsupported expression'),
+        ('+'.join(['1'] * 200), 'Expression too long'),
+        ('+'.join(['1'] * 40), 'Expression too complex'),
+    ],
+)
+def test_calculator_rejects_unbounded_or_unsupported_input(expression, error):
+    result = calculate(expression)
+
+    assert not result.ok
+    assert result.error == error
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryLookupBackend()
+    return SqliteLookupBackend(str(tmp_path / 'lookup.db'))
+
+
+def test_lookup_backends_answer_exact_prefix_and_fuzzy_queries(backend):
+    backend.bulk_load([('SKU 1001', 'red mug'), ('sku_1002', 'blue mug'), ('sku_2001', 'lamp'), ('order_7', 'shipped')])
+
+    assert backend.size == 4
+    assert backend.get(' Sku 1001 ') == 'red mug'
+    assert backend.get('missing') is None
+    assert backend.prefix('sku_10') == [('sku_1001', 'red mug'), ('sku_1002', 'blue mug')]
+    assert backend.prefix('sku', limit=1) == [('sku_1001', 'red mug')]
+    assert backend.fuzzy('sku_2010', limit=1)[0][:2] == ('sku_2001', 'lamp')
+
+
+def test_lookup_reload_replaces_and_counts_new_keys_once(backend):
+    backend.bulk_load([('a_key', '1'), ('b_key', '2')])
+    version = backend.version()
+    backend.bulk_load([('a_key', 'changed'), ('c_key', '3')])
+
+    assert backend.size == 3
+    assert backend.get('a_key') == 'changed'
+    assert backend.version() > version
+
+    backend.bulk_load([('z_key', '26')], replace=True)
+
+    assert backend.size == 1
+    assert backend.get('a_key') is None
+    assert [key for key, _, _ in backend.fuzzy('a_key', min_score=0.0)] == ['z_key']
+
+
+def test_sqlite_lookup_persists_across_reopen(tmp_path):
+    path = str(tmp_path / 'lookup.db')
+    SqliteLookupBackend(path, seed={'alpha': 'first'})
+
+    reopened = SqliteLookupBackend(path, seed={'beta': 'ignored once data exists'})
+
+    assert reopened.size == 1
+    assert reopened.get('alpha') == 'first'
+    assert reopened.get('beta') is None
+
+
+def test_cached_lookup_drops_entries_when_the_backend_version_moves():
+    backend = MemoryLookupBackend({'k': 'old'})
+    cache = CachedLookup(backend, max_entries=8, check_interval=0.0)
+
+    assert cache.get('k') == 'old'
+    assert cache.get('K') == 'old'
+    assert cache.get('missing') is None
+    assert cache.stats()['cache_hits'] == 1
+
+    backend.bulk_load([('k', 'new'), ('missing', 'found')])
+
+    assert cache.get('k') == 'new'
+    assert cache.get('missing') == 'found'
+
+
+def test_registry_routes_each_trigger_to_its_tool_in_one_scan():
+    registry = build_registry(['calculator', 'lookup_key'])
+    calls = registry.plan(ToolContext('lookup sku_1 and 12 * 3', top_k=3), limit=5)
+
+    assert [(call.name, call.tool_input) for call in calls] == [
+        ('calculator', '12 * 3'),
+        ('lookup_key', 'sku_1_and_12_*_3'),
+    ]
+    assert registry.plan(ToolContext('hello there', top_k=3), limit=5) == []
+    assert len(registry.plan(ToolContext('lookup 1 + 1', top_k=3), limit=1)) == 1
+
+
+def test_registry_rejects_duplicate_names_and_capturing_triggers():
+    plan = _sleeper('a', 0)
+    with pytest.raises(ValueError, match='Duplicate tool names: a'):
+        ToolRegistry([ToolSpec('a', 'io', plan), ToolSpec('a', 'io', plan)])
+    with pytest.raises(ValueError, match='capturing groups'):
+        ToolRegistry([ToolSpec('a', 'io', plan, triggers=('(x)',))])
+    with pytest.raises(ValueError, match='Unknown tool'):
+        build_registry(['no_such_tool'])
+
+
+def test_orchestrator_runs_tools_concurrently_within_per_tool_timeouts(monkeypatch):
+    monkeypatch.setattr(settings, 'tool_timeout_seconds', 2.0)
+    monkeypatch.setattr(settings, 'tool_timeouts_seconds', {'slow': 0.1})
+    monkeypatch.setattr(settings, 'tool_max_invocations_per_request', 3)
+    orchestrator = ToolOrchestrator()
+    orchestrator._registry = ToolRegistry(
+        [
+            ToolSpec('quick_a', 'io', _sleeper('quick_a', 0.2)),
+            ToolSpec('slow', 'io', _sleeper('slow', 1.0)),
+            ToolSpec('quick_b', 'io', _sleeper('quick_b', 0.2)),
+        ]
+    )
+    try:
+        started = time.perf_counter()
+        _, _, notes = asyncio.run(orchestrator._prepare('prompt', 3, False, True, None, None, None))
+        elapsed = time.perf_counter() - started
+    finally:
+        orchestrator.shutdown()
+
+    assert notes == ['quick_a done', 'slow() timed out after 0.1s', 'quick_b done']
+    assert elapsed < 0.35
+    assert [log['timed_out'] for log in orchestrator.get_logs()] == [True, False, False]
@@ -0,0 +1,165 @@
+import threading
+
+import pytest
+
+from app.rag import vector_store as vector_store_module
+from app.rag.filters import MetadataFilter, RangeCondition
+from app.rag.vector_store import JsonVectorStore, VectorRecord
+
+
+def _record(i, dimension=4):
+    embedding = [0.0] * dimension
+    embedding[i % dimension] = 1.0
+    embedding[(i + 1) % dimension] = 0.1 * (i + 1)
+    return VectorRecord(record_id=f'r{i}', text=f'text {i}', embedding=embedding, metadata={'n': i})
+
+
+def _store(path, **options):
+    options.setdefault('background_compaction', False)
+    return JsonVectorStore(str(path), **options)
+
+
+def _contents(store):
+    return sorted(store.iter_texts())
+
+
+@pytest.mark.parametrize('quantization', ['none', 'int8'])
+def test_saved_operations_replay_from_the_log(tmp_path, quantization):
+    path = tmp_path / 'store.json'
+    store = _store(path, quantization=quantization)
+    store.upsert_many([_record(i) for i in range(6)])
+    store.save()
+    store.delete_many(['r1'])
+    store.upsert_many([VectorRecord('r2', 'changed', _record(2).embedding, {'n': 2})])
+    store.save()
+
+    assert not path.exists()
+    reopened = _store(path, quantization=quantization)
+    assert _contents(reopened) == _contents(store)
+    assert ('r2', 'changed') in _contents(reopened)
+    assert reopened.search(_record(3).embedding, top_k=1)[0].record_id == 'r3'
+
+
+def test_unsaved_operations_are_not_replayed(tmp_path):
+    path = tmp_path / 'store.json'
+    store = _store(path)
+    store.upsert_many([_record(0)])
+    store.save()
+    store.upsert_many([_record(1)])
+
+    assert _contents(_store(path)) == [('r0', 'text 0')]
+
+
+def test_torn_log_tail_is_ignored_and_appends_continue(tmp_path):
+    path = tmp_path / 'store.json'
+    store = _store(path)
+    store.upsert_many([_record(i) for i in range(3)])
+    store.save()
+    with (tmp_path / 'store.wal').open('a', encoding='utf-8') as handle:
+        handle.write('{"seq": 99, "op": "upse')
+
+    reopened = _store(path)
+    assert [record_id for record_id, _ in _contents(reopened)] == ['r0', 'r1', 'r2']
+    reopened.upsert_many([_record(3)])
+    reopened.save()
+    assert [record_id for record_id, _ in _contents(_store(path))] == ['r0', 'r1', 'r2', 'r3']
+
+
+def test_compaction_folds_the_log_into_the_snapshot(tmp_path):
+    path = tmp_path / 'store.json'
+    store = _store(path, quantization='int8')
+    store.upsert_many([_record(i) for i in range(10)])
+    store.save()
+    store.delete_many(['r0', 'r5'])
+    store.save()
+
+    store.compact()
+
+    assert path.exists()
+    assert not (tmp_path / 'store.wal').exists()
+    reopened = _store(path, quantization='int8')
+    assert _contents(reopened) == _contents(store)
+    assert reopened.tombstones == 0
+    assert reopened.embeddings_of(['r3']) == store.embeddings_of(['r3'])
+
+    reopened.upsert_many([_record(20)])
+    reopened.save()
+    assert 'r20' in dict(_contents(_store(path)))
+
+
+def test_compaction_serializes_without_holding_the_store_lock(tmp_path, monkeypatch):
+    path = tmp_path / 'store.json'
+    store = _store(path)
+    store.upsert_many([_record(i) for i in range(5)])
+    store.save()
+    write = vector_store_module.atomic_write_chunks
+    concurrent = []
+
+    def write_while_serving(target, chunks):
+        worker = threading.Thread(target=lambda: store.upsert_many([_record(7)]))
+        worker.start()
+        worker.join(timeout=2)
+        concurrent.append(not worker.is_alive())
+        write(target, chunks)
+
+    monkeypatch.setattr(vector_store_module, 'atomic_write_chunks', write_while_serving)
+    store.compact()
+
+    assert concurrent == [True]
+    # The upsert made during compaction is pending, not part of the snapshot's log position.
+    store.save()
+    assert 'r7' in dict(_contents(_store(path)))
+
+
+def test_failed_log_append_keeps_operations_pending(tmp_path, monkeypatch):
+    path = tmp_path / 'store.json'
+    store = _store(path)
+    store.upsert_many([_record(0), _record(1)])
+
+    def fail(ops):
+        raise OSError('disk full')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(store._wal, 'append', fail)
+        with pytest.raises(OSError):
+            store.save()
+    assert store.pending_ops == 2
+
+    store.delete_many(['r0'])
+    store.save()
+    assert store.pending_ops == 0
+    assert _contents(_store(path)) == [('r1', 'text 1')]
+
+
+def test_filtered_search_only_returns_matching_live_records():
+    store = JsonVectorStore(None)
+    records = [
+        VectorRecord(f'r{i}', f'text {i}', _record(i).embedding, {'source_path': f'docs/{i % 2}/f.md', 'n': i})
+        for i in range(20)
+    ]
+    store.upsert_many(records)
+    store.delete_many(['r4'])
+    metadata_filter = MetadataFilter(source_path='docs/0/', ranges={'n': RangeCondition(gte=2, lt=12)})
+
+    hits = store.search(_record(4).embedding, top_k=10, metadata_filter=metadata_filter)
+
+    assert sorted(hit.record_id for hit in hits) == ['r10', 'r2', 'r6', 'r8']
+    assert store.filter_ids(MetadataFilter(equals={'n': 4})) == set()
+    assert store.filter_ids(MetadataFilter(source_path='docs/*/f.md', equals={'n': 5})) == {'r5'}
+
+
+def test_sharded_scan_ranks_like_a_single_scan():
+    pytest.importorskip('numpy')
+    records = [_record(i, dimension=8) for i in range(200)]
+    single = JsonVectorStore(None, search_shards=1)
+    sharded = JsonVectorStore(None, search_shards=4, shard_min_rows=16)
+    for store in (single, sharded):
+        store.upsert_many(records)
+        store.delete_many(['r3', 'r150'])
+    queries = [records[i].embedding for i in (0, 3, 77, 199)]
+
+    expected = [[(hit.record_id, round(hit.score, 6)) for hit in hits] for hits in single.search_many(queries, 5)]
+    actual = [[(hit.record_id, round(hit.score, 6)) for hit in hits] for hits in sharded.search_many(queries, 5)]
+
+    assert actual == expected
+    assert all('r3' not in [record_id for record_id, _ in hits] for hits in actual)